@@ -0,0 +1,135 @@
+import io
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+class DeadlineExceeded(BaseException):
+    '''
+    Raised when a request runs out of time. Derives from BaseException, like
+    KeyboardInterrupt, so the persisters' `except Exception` fallbacks do not turn it into
+    an empty members list or a closed session; it goes up to the handler instead.
+    '''
+    pass
+
+class Deadline:
+    '''
+    The time a request has left. lambda_handler makes one from the Lambda context and
+    activates it for the thread handling the request; PersisterS3 and S3VoteLoggingClass
+    then run each S3 request under it, so a slow S3 costs at most what is left rather than
+    running into the function's hard timeout.
+    '''
+
+    local = threading.local()
+    stats = Counter()
+    stats_lock = threading.Lock()
+    executor = None
+    executor_lock = threading.Lock()
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_context(cls, context, reserve_ms=None):
+        # Keeps reserve_ms back for building a degraded reply after the deadline passes
+        if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+            return None
+        if reserve_ms is None:
+            reserve_ms = int(os.environ.get('DEADLINE_RESERVE_MS', '1000'))
+        return cls(max(context.get_remaining_time_in_millis() - reserve_ms, 0) / 1000.0)
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    @classmethod
+    def current(cls):
+        return getattr(cls.local, 'deadline', None)
+
+    @classmethod
+    @contextmanager
+    def activate(cls, deadline):
+        previous = cls.current()
+        cls.local.deadline = deadline
+        try:
+            yield deadline
+        finally:
+            cls.local.deadline = previous
+
+    @classmethod
+    def bind(cls, fn):
+        # For work handed to another thread, e.g. a pool of concurrent GETs
+        deadline = cls.current()
+        if deadline is None:
+            return fn
+        def run_with_deadline(*args, **kwargs):
+            with cls.activate(deadline):
+                return fn(*args, **kwargs)
+        return run_with_deadline
+
+    @classmethod
+    def count(cls, counter):
+        with cls.stats_lock:
+            cls.stats[counter] += 1
+
+    @classmethod
+    def get_executor(cls):
+        with cls.executor_lock:
+            if cls.executor is None:
+                cls.executor = ThreadPoolExecutor(max_workers=int(os.environ.get('DEADLINE_MAX_WORKERS', '32')),
+                                                  thread_name_prefix='deadline')
+            return cls.executor
+
+    def call(self, fn, *args, **kwargs):
+        '''
+        Runs fn and returns its result, or raises DeadlineExceeded once the deadline passes.
+        A call that times out is left to finish in the background.
+        '''
+        remaining = self.remaining()
+        if remaining <= 0:
+            self.count('rejected')
+            raise DeadlineExceeded('No time left to start the call')
+        self.count('calls')
+        future = self.get_executor().submit(read_body, fn, *args, **kwargs)
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeoutError:
+            self.count('timeouts')
+            raise DeadlineExceeded(f'Call did not finish within {remaining:.3f}s')
+
+def read_body(fn, *args, **kwargs):
+    # A GET's body is streamed, read it here so the transfer counts against the deadline too
+    response = fn(*args, **kwargs)
+    if isinstance(response, dict) and hasattr(response.get('Body'), 'read'):
+        response['Body'] = io.BytesIO(response['Body'].read())
+    return response
+
+class DeadlineBoundS3:
+    '''
+    Wraps an S3 client or resource so every request made through it runs under a deadline
+    '''
+
+    def __init__(self, target, deadline: Deadline):
+        self.target = target
+        self.deadline = deadline
+
+    @classmethod
+    def wrap(cls, target):
+        deadline = Deadline.current()
+        return target if deadline is None else cls(target, deadline)
+
+    def Object(self, bucket_name, key):
+        # Building a resource object is local, only its get() and put() go to S3
+        return DeadlineBoundS3(self.target.Object(bucket_name, key), self.deadline)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+        def call(*args, **kwargs):
+            return self.deadline.call(attribute, *args, **kwargs)
+        return call
@@ -0,0 +1,88 @@
+import json
+import queue
+import threading
+from collections import Counter
+
+class EventBroadcaster:
+    '''
+    Fans board state changes out to Server-Sent Events subscribers. Each event is built
+    and encoded once and the same message is queued for every subscriber of the board, so
+    open dashboards do not each cost a persister read. In-process only, which suits a
+    single self-hosted Flask server.
+    '''
+
+    def __init__(self, heartbeat_interval=15.0, max_queued_events=100):
+        # Seconds of silence before a keepalive is sent, so proxies do not drop the connection
+        self.heartbeat_interval = heartbeat_interval
+        # A subscriber this far behind is disconnected, its browser reconnects and resyncs
+        self.max_queued_events = max_queued_events
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    @staticmethod
+    def encode(event, data) -> str:
+        return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+    def has_subscribers(self, community_board) -> bool:
+        with self.lock:
+            return bool(self.subscribers.get(community_board))
+
+    def subscribe(self, community_board) -> queue.Queue:
+        subscription = queue.Queue(maxsize=self.max_queued_events)
+        with self.lock:
+            self.subscribers.setdefault(community_board, set()).add(subscription)
+            self.stats['subscribed'] += 1
+        return subscription
+
+    def unsubscribe(self, community_board, subscription):
+        with self.lock:
+            board_subscribers = self.subscribers.get(community_board)
+            if board_subscribers is not None and subscription in board_subscribers:
+                board_subscribers.discard(subscription)
+                if not board_subscribers:
+                    del self.subscribers[community_board]
+                self.stats['unsubscribed'] += 1
+
+    def publish(self, community_board, event, data) -> int:
+        message = self.encode(event, data)
+        with self.lock:
+            board_subscribers = list(self.subscribers.get(community_board, ()))
+            self.stats['published'] += 1
+        for subscription in board_subscribers:
+            try:
+                subscription.put_nowait(message)
+            except queue.Full:
+                self.disconnect(community_board, subscription)
+        return len(board_subscribers)
+
+    def disconnect(self, community_board, subscription):
+        self.unsubscribe(community_board, subscription)
+        with self.lock:
+            self.stats['dropped'] += 1
+        # Make room for the None that tells the stream to end
+        try:
+            while True:
+                subscription.get_nowait()
+        except queue.Empty:
+            pass
+        subscription.put_nowait(None)
+
+    def stream(self, community_board, subscription):
+        '''
+        Yields the SSE messages for one subscriber, with a heartbeat whenever nothing has
+        happened for heartbeat_interval seconds. Unsubscribes when the client goes away.
+        '''
+        try:
+            # Ask browsers to reconnect quickly if the connection drops
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    message = subscription.get(timeout=self.heartbeat_interval)
+                except queue.Empty:
+                    message = self.encode('heartbeat', {})
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(community_board, subscription)
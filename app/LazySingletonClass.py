@@ -0,0 +1,36 @@
+import threading
+
+class LazySingleton:
+    '''
+    Stands in for a module-level instance that is expensive to build. The instance is created
+    by factory() the first time one of its attributes is used, so importing the module costs
+    nothing and a request that never touches it never pays for it.
+    '''
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def peek(self):
+        # The instance if it has been created, without creating it
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.get(), name, value)
+
+    def __repr__(self):
+        return f'LazySingleton({self._instance!r})' if self._instance is not None else f'LazySingleton({self._factory!r}, not created)'
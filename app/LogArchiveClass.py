@@ -0,0 +1,64 @@
+import gzip
+import json
+from typing import Dict, List
+
+class LogArchive:
+  '''
+  One board's log objects for one day, compacted into a single gzip-compressed NDJSON
+  object. The first line is a small index header, every following line is one of the
+  original objects as {"key": ..., "body": ...}, so the originals can be read back exactly.
+  '''
+  VERSION = 1
+  SUFFIX = '.ndjson.gz'
+
+  def __init__(self, community_board: str, day: str, entries: Dict[str, str] = None):
+    self.community_board = community_board
+    self.day = day
+    # original object key -> original object body
+    self.entries = dict(entries) if entries else {}
+
+  def __str__(self):
+    return f"LogArchive {self.community_board} {self.day}: {len(self.entries)} objects"
+
+  @classmethod
+  def key_for(cls, folder: str, community_board: str, day: str) -> str:
+    # Named after the day, so a listing of the day's prefix finds it next to any
+    # objects written after it was compacted
+    return folder + community_board + '/' + day + cls.SUFFIX
+
+  @classmethod
+  def is_archive_key(cls, key: str) -> bool:
+    return key.endswith(cls.SUFFIX)
+
+  def add(self, key: str, body: str):
+    self.entries[key] = body
+
+  def index(self) -> dict:
+    keys = sorted(self.entries)
+    return {
+        'version': self.VERSION,
+        'community_board': self.community_board,
+        'day': self.day,
+        'object_count': len(keys),
+        'first_key': keys[0] if keys else None,
+        'last_key': keys[-1] if keys else None
+    }
+
+  def toBytes(self) -> bytes:
+    lines = [json.dumps({'index': self.index()})]
+    lines.extend(json.dumps({'key': key, 'body': self.entries[key]}) for key in sorted(self.entries))
+    return gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+
+  @classmethod
+  def fromBytes(cls, data: bytes):
+    lines = gzip.decompress(data).decode('utf-8').splitlines()
+    index = json.loads(lines[0])['index']
+    archive = cls(community_board=index['community_board'], day=index['day'])
+    for line in lines[1:]:
+      if line:
+        entry = json.loads(line)
+        archive.add(entry['key'], entry['body'])
+    return archive
+
+  def items(self) -> List[tuple]:
+    return [(key, self.entries[key]) for key in sorted(self.entries)]
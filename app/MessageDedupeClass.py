@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import Counter, OrderedDict
+
+class MessageDedupe:
+    '''
+    Answers each incoming text once. Twilio retries a webhook it timed out on with the same
+    MessageSid, and running the text again would log it and record the vote twice and send
+    a second reply. The replies to recent texts are kept in a bounded LRU, which catches
+    retries to the same warm container. With durable on, the persister also keeps a marker
+    per text so a retry landing on another Lambda or worker is caught too, at the cost of
+    two writes per text. A retry gets the reply the first delivery got, or an empty
+    response while the first delivery is still being answered elsewhere.
+    '''
+
+    def __init__(self, max_size=None, wait_for_first=None, durable=None):
+        self.max_size = max_size or int(os.environ.get('MESSAGE_DEDUPE_SIZE', '4096'))
+        self.durable = durable if durable is not None else os.environ.get('MESSAGE_DEDUPE_DURABLE', '').lower() in ('1', 'true', 'yes')
+        # Seconds a retry waits for the first delivery in this process before giving up on its reply
+        self.wait_for_first = wait_for_first if wait_for_first is not None else float(os.environ.get('MESSAGE_DEDUPE_WAIT_SECONDS', '5'))
+        # (community board, MessageSid) -> reply, least recently used first
+        self.replies = OrderedDict()
+        # (community board, MessageSid) -> set once the text being answered in this process has its reply
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def get_reply(self, key):
+        with self.lock:
+            reply = self.replies.get(key)
+            if reply is not None:
+                self.replies.move_to_end(key)
+            return reply
+
+    def remember(self, key, reply):
+        with self.lock:
+            self.replies[key] = reply
+            self.replies.move_to_end(key)
+            while len(self.replies) > self.max_size:
+                self.replies.popitem(last=False)
+
+    def count(self, counter):
+        with self.lock:
+            self.stats[counter] += 1
+
+    def answer(self, message_sid, community_board, persister, answer_text, pending_reply) -> str:
+        '''
+        The reply to the text with this MessageSid, from answer_text() the first time it is seen
+        '''
+        if not message_sid:
+            self.count('without_sid')
+            return answer_text()
+        key = (community_board, message_sid)
+        reply = self.get_reply(key)
+        if reply is not None:
+            self.count('memory_hits')
+            return reply
+
+        with self.lock:
+            first = self.in_flight.get(key)
+            if first is None:
+                self.in_flight[key] = threading.Event()
+        if first is not None:
+            first.wait(self.wait_for_first)
+            reply = self.get_reply(key)
+            self.count('in_flight_hits')
+            return reply if reply is not None else pending_reply
+
+        try:
+            try:
+                reply = persister.claim_message(message_sid, community_board) if self.durable else None
+            except Exception as e:
+                # Better a possible duplicate than a text nobody answers, but counted, since a
+                # store that keeps failing (e.g. a botocore without conditional PUTs) means no dedupe at all
+                self.count('claim_errors')
+                print(f"ERROR claiming message {message_sid}, answering it without dedupe: {type(e).__name__}: {str(e)}")
+                reply = None
+            if reply is not None:
+                self.count('durable_hits')
+                if not reply:
+                    return pending_reply
+                self.remember(key, reply)
+                return reply
+
+            self.count('answered')
+            reply = answer_text()
+            self.remember(key, reply)
+            if not self.durable:
+                return reply
+            try:
+                persister.set_message_reply(message_sid, reply, community_board)
+            except Exception as e:
+                print(f"Error recording reply to message {message_sid}: {str(e)}")
+            return reply
+        finally:
+            with self.lock:
+                self.in_flight.pop(key).set()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, cached=len(self.replies))
+
+    def clear(self):
+        with self.lock:
+            self.replies.clear()
+            self.stats.clear()
@@ -2,10 +2,24 @@ import csv
 from VoterClass import Voter
 from VoteClass import Vote
 from VoteOptionsEnum import VoteOptions
-import boto3
+from SessionStateClass import SessionState
+from TallyClass import Tally
+from LogArchiveClass import LogArchive
+from S3ClientsClass import S3Clients
+from DeadlineClass import Deadline, DeadlineBoundS3, read_body
+from botocore.exceptions import ClientError
 import json
-from typing import Dict, List
+import hashlib
+from typing import Dict, List, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain, islice
 import os
+import struct
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+import sqlite3
 
 class Persister:
     '''
@@ -15,7 +29,7 @@ class Persister:
     def __init__(self, use_db=False):
         pass
 
-    def get_vote_log(self,community_board):
+    def get_vote_log(self,community_board, vote_type=None):
         pass
 
     def add_to_vote_log(self,key,value,community_board):
@@ -45,6 +59,15 @@ class Persister:
     def set_members(self, value: Dict[str, Voter],community_board):
         pass
 
+    def get_members_version(self, community_board: str, members: Dict[str, Voter] = None) -> str:
+        '''
+        Changes whenever the members list does, so responses built from it can be validated.
+        Pass the members if they have already been read.
+        '''
+        if members is None:
+            members = self.get_members(community_board) or {}
+        return hashlib.sha1(json.dumps(sorted((number, voter.name) for number, voter in members.items())).encode('utf-8')).hexdigest()
+
     def get_vote_type(self, community_board: str) -> str:
         pass
 
@@ -57,8 +80,62 @@ class Persister:
     def set_election_candidates(self, value: List[str], community_board: str):
         pass
 
+    def get_session_state(self, community_board: str) -> SessionState:
+        return SessionState(
+            current_vote_name=self.get_current_vote_name(community_board),
+            currently_in_a_voting_session=self.get_currently_in_a_voting_session(community_board),
+            vote_type=self.get_vote_type(community_board),
+            election_candidates=self.get_election_candidates(community_board)
+        )
+
+    def set_session_state(self, value: SessionState, community_board: str):
+        self.set_current_vote_name(value.current_vote_name, community_board)
+        self.set_vote_type(value.vote_type, community_board)
+        self.set_election_candidates(value.election_candidates, community_board)
+        self.set_currently_in_a_voting_session(value.currently_in_a_voting_session, community_board)
+
+    def get_tally(self, community_board: str) -> Tally:
+        pass
+
+    def set_tally(self, value: Tally, community_board: str):
+        pass
+
+    def claim_message(self, message_sid: str, community_board: str) -> Optional[str]:
+        '''
+        Marks an incoming text as being answered. Returns None if it had not been seen, otherwise
+        the reply it got, which is '' while its first delivery is still being answered.
+        Persisters without durable markers leave it to MessageDedupe's in-process cache.
+        '''
+        return None
+
+    def set_message_reply(self, message_sid: str, reply: str, community_board: str):
+        pass
+
+    def rebuild_tally(self, community_board: str) -> Tally:
+        '''
+        Rebuilds the tally from the vote log and saves it
+        '''
+        current_tally = self.get_tally(community_board)
+        version = current_tally.version + 1 if current_tally is not None else 1
+        tally = Tally.fromVoteLog(self.get_vote_log(community_board), version=version)
+        self.set_tally(tally, community_board)
+        return tally
+
+    def check_tally(self, community_board: str) -> bool:
+        '''
+        Compares the tally with the vote log and replaces it with one rebuilt from the
+        log if they disagree. Returns True if the tally was already consistent.
+        '''
+        current_tally = self.get_tally(community_board)
+        expected_tally = Tally.fromVoteLog(self.get_vote_log(community_board))
+        if current_tally is not None and current_tally.voters == expected_tally.voters and current_tally.names == expected_tally.names:
+            return True
+        expected_tally.version = current_tally.version + 1 if current_tally is not None else 1
+        self.set_tally(expected_tally, community_board)
+        return False
+
 class PersisterBase:
-    def list_objects(self, prefix,community_board):
+    def list_objects(self, prefix):
         """
         Lists objects with the given prefix
         Args:
@@ -68,7 +145,17 @@ class PersisterBase:
         """
         raise NotImplementedError("Subclass must implement list_objects")
 
-    def get_object(self, key,community_board):
+    def iter_objects(self, prefix):
+        """
+        Lazily yields object keys with the given prefix
+        Args:
+            prefix (str): The prefix to filter objects by
+        Returns:
+            iterator: Object keys matching the prefix
+        """
+        return iter(self.list_objects(prefix))
+
+    def get_object(self, key):
         """
         Gets the content of an object by key
         Args:
@@ -78,6 +165,23 @@ class PersisterBase:
         """
         raise NotImplementedError("Subclass must implement get_object")
 
+    def iter_object_contents(self, prefix):
+        """
+        Yields (key, content) for every object with the given prefix. Persisters whose
+        logs get compacted into LogArchives read the archived objects back here as if
+        they were still stored on their own
+        Args:
+            prefix (str): The prefix to filter objects by
+        Returns:
+            iterator: (key, content) pairs
+        """
+        for key in self.iter_objects(prefix):
+            content = self.get_object(key)
+            if content is None:
+                # Listed but unreadable, leaving it out would hand back an incomplete export
+                raise RuntimeError(f"Could not read {key}")
+            yield key, content
+
 class PersisterS3(Persister, PersisterBase):
     '''
     Persister implementation using Amazon S3
@@ -85,10 +189,22 @@ class PersisterS3(Persister, PersisterBase):
 
     file_path = '../members.csv'  # TODO this is just for the first launch, remove this
 
+    # members.json per (bucket, board), kept at class level so it survives warm Lambda invocations
+    members_cache = {}
+    members_cache_stats = Counter()
+    members_cache_lock = threading.Lock()
+
+    # Durations of recent hot reads, the hedge delay is a percentile of these
+    read_latencies = deque(maxlen=256)
+    hedge_stats = Counter()
+    hedge_lock = threading.Lock()
+    hedge_executor = None
+
     def __init__(self):
         super().__init__()
-        self.s3_resource = boto3.resource('s3')
-        self.s3 =  boto3.client('s3')
+        # Created on first use from the shared S3Clients, see the s3 and s3_resource properties
+        self._s3 = None
+        self._s3_resource = None
         self.bucket_name = 'cb-dashboard-data-store'
         self.vote_log_key = 'vote_log.json'
         self.current_vote_name_key = 'current_vote_name.json'
@@ -96,70 +212,161 @@ class PersisterS3(Persister, PersisterBase):
         self.members_key = 'members.json'
         self.vote_type_key = 'vote_type.json'
         self.election_candidates_key = 'election_candidates.json'
+        self.session_key = 'session.json'
+        self.tally_key = 'tally.json'
+        # One marker per incoming text, so a retried webhook is answered once
+        self.messages_folder = 'messages'
+        # A claim older than this belongs to a request that died, and the text is answered again
+        self.message_claim_timeout = float(os.environ.get('MESSAGE_CLAIM_TIMEOUT_SECONDS', '15'))
+        # Token bucket state per texting number, shared by every Lambda
+        self.rate_limits_folder = 'ratelimit'
+        # Attempts at the read-modify-write of the tally before giving up on a contended update
+        self.tally_update_attempts = 5
         self.vote_log_folder = 'vote_log'
+        # Upper bound on concurrent GETs when loading the vote log
+        self.vote_log_max_workers = int(os.environ.get('VOTE_LOG_MAX_WORKERS', '16'))
+        # How long a cached members.json is trusted before it is revalidated against its ETag
+        self.members_cache_ttl = float(os.environ.get('MEMBERS_CACHE_TTL_SECONDS', '60'))
+        # Upper bound on concurrent GETs when reading a prefix of log objects, e.g. for exports
+        self.object_fetch_max_workers = int(os.environ.get('OBJECT_FETCH_MAX_WORKERS', '16'))
+        # Opt-in: when a hot read (session, members, tally) is slower than usual, send a second
+        # identical GET and take whichever answers first
+        self.hedge_reads = os.environ.get('S3_HEDGE_READS', '').lower() in ('1', 'true', 'yes')
+        # A read is hedged once it has taken longer than this percentile of recent reads,
+        self.hedge_percentile = float(os.environ.get('S3_HEDGE_PERCENTILE', '95'))
+        # or than this many seconds until there are enough recent reads to go on
+        self.hedge_after = float(os.environ.get('S3_HEDGE_AFTER_MS', '50')) / 1000.0
+        self.hedge_min_samples = 20
 
-    def get_vote_type(self, community_board: str) -> str:
+    @property
+    def s3(self):
+        if self._s3 is None:
+            self._s3 = S3Clients.client()
+        # Under an active request deadline each S3 call is cut off when the time runs out
+        return DeadlineBoundS3.wrap(self._s3)
+
+    @s3.setter
+    def s3(self, value):
+        self._s3 = value
+
+    @property
+    def s3_resource(self):
+        if self._s3_resource is None:
+            self._s3_resource = S3Clients.resource()
+        return DeadlineBoundS3.wrap(self._s3_resource)
+
+    @s3_resource.setter
+    def s3_resource(self, value):
+        self._s3_resource = value
+
+    def get_session_state(self, community_board: str) -> SessionState:
+        # The whole session lives in one document so callers learn it with a single GET
         try:
-            obj = self.s3_resource.Object(self.bucket_name, f'/{community_board}/{self.vote_type_key}')
-            vote_type_json = obj.get()['Body'].read().decode('utf-8')
-            return json.loads(vote_type_json)
+            obj = self.s3_resource.Object(self.bucket_name, f'/{community_board}/{self.session_key}')
+            session_json = self.hedged_read(obj.get)['Body'].read().decode('utf-8')
+            return SessionState.fromJSON(json.loads(session_json))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return self.migrate_session_state(community_board)
+            return SessionState()
         except Exception as e:
-            return "RESOLUTION"
+            return SessionState()
 
-    def set_vote_type(self, value: str, community_board: str):
+    def set_session_state(self, value: SessionState, community_board: str):
+        # A single PUT replaces the document, so readers never see a half-started session
         try:
-            obj = self.s3_resource.Object(self.bucket_name, f'/{community_board}/{self.vote_type_key}')
-            obj.put(Body=json.dumps(value))
+            obj = self.s3_resource.Object(self.bucket_name, f'/{community_board}/{self.session_key}')
+            obj.put(Body=json.dumps(value.toJSON()))
         except Exception as e:
             pass
 
-    def get_election_candidates(self, community_board: str) -> List[str]:
+    def migrate_session_state(self, community_board: str) -> SessionState:
+        '''
+        Builds the session document for a board that still has the pre-session-document
+        keys (current_vote_name.json, currently_in_a_voting_session.json, vote_type.json,
+        election_candidates.json) and saves it, so later reads are a single GET.
+        '''
+        session_state = SessionState(
+            current_vote_name=self.get_legacy_value(self.current_vote_name_key, '', community_board),
+            currently_in_a_voting_session=self.get_legacy_value(self.currently_in_a_voting_session_key, False, community_board),
+            vote_type=self.get_legacy_value(self.vote_type_key, "RESOLUTION", community_board),
+            election_candidates=self.get_legacy_value(self.election_candidates_key, [], community_board)
+        )
+        self.set_session_state(session_state, community_board)
+        return session_state
+
+    def get_legacy_value(self, key, default, community_board):
         try:
-            obj = self.s3_resource.Object(self.bucket_name, f'/{community_board}/{self.election_candidates_key}')
-            election_candidates_json = obj.get()['Body'].read().decode('utf-8')
-            return json.loads(election_candidates_json)
+            obj = self.s3_resource.Object(self.bucket_name, f'/{community_board}/{key}')
+            return json.loads(obj.get()['Body'].read().decode('utf-8'))
         except Exception as e:
-            return []
+            return default
+
+    def update_session_state(self, community_board: str, **changes):
+        session_state = self.get_session_state(community_board)
+        for attribute, value in changes.items():
+            setattr(session_state, attribute, value)
+        self.set_session_state(session_state, community_board)
+
+    def get_vote_type(self, community_board: str) -> str:
+        return self.get_session_state(community_board).vote_type
+
+    def set_vote_type(self, value: str, community_board: str):
+        self.update_session_state(community_board, vote_type=value)
+
+    def get_election_candidates(self, community_board: str) -> List[str]:
+        return self.get_session_state(community_board).election_candidates
 
     def set_election_candidates(self, value: List[str], community_board: str):
-        try:
-            obj = self.s3_resource.Object(self.bucket_name, f'/{community_board}/{self.election_candidates_key}')
-            obj.put(Body=json.dumps(value))
-        except Exception as e:
-            pass
+        self.update_session_state(community_board, election_candidates=value)
 
-    def get_vote_log(self,community_board) -> Dict[str, Vote]:
+    def get_vote_log(self,community_board, vote_type=None) -> Dict[str, Vote]:
 
         vote_logs = {}
 
-        response = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=self.vote_log_folder+'/'+community_board+'/+')
-        for obj in response.get('Contents', []):
-            # Get the object key (file path)
-            object_key = obj['Key']
+        object_keys = self.iter_object_keys(self.vote_log_folder+'/'+community_board+'/+')
+        first_key = next(object_keys, None)
+        if first_key is None:
+            return vote_logs
+
+        # The vote type is the same for every object in the log, so resolve it once up front
+        # (callers that already know it, like the request context, pass it in)
+        current_vote_type = vote_type if vote_type is not None else self.get_vote_type(community_board)
+
+        # Fetch the per-voter objects concurrently while later pages are still being listed;
+        # the boto3 client is thread safe
+        with ThreadPoolExecutor(max_workers=self.vote_log_max_workers) as executor:
+            load_vote_log_object = Deadline.bind(self.load_vote_log_object)
+            futures = [executor.submit(load_vote_log_object, object_key, current_vote_type)
+                       for object_key in chain([first_key], object_keys)]
+            for future in futures:
+                vote = future.result()
+                if vote is not None:
+                    vote_logs[vote.voter.sms_number] = vote
 
-            # Fetch the object's data
-            response = self.s3.get_object(Bucket=self.bucket_name, Key=object_key)
-            object_data = response['Body'].read().decode('utf-8')
-            # Load the object data as JSON
-            try:
-                data = json.loads(object_data)
-            except json.JSONDecodeError:
-                print(f"Error loading JSON for object: {object_key}")
-                continue
-            
-            # Extract data and create the desired object structure
-            sms_number = object_key.split('/')[2]
-            name_to_set = data['voter']
-            vote_data = data['votes_vote']
-            if vote_data:
-                current_vote_type = self.get_vote_type(community_board)
-                if current_vote_type == "ELECTION":
-                    vote_logs[sms_number] = Vote(voter=Voter(name=name_to_set, sms_number=sms_number), voters_vote=vote_data)
-                else:
-                    vote_logs[sms_number] = Vote(voter=Voter(name=name_to_set,sms_number=sms_number), voters_vote=VoteOptions(vote_data))
-        
         return vote_logs
-        
+
+    def load_vote_log_object(self, object_key, current_vote_type) -> Optional[Vote]:
+        # Fetch the object's data
+        response = self.s3.get_object(Bucket=self.bucket_name, Key=object_key)
+        object_data = response['Body'].read().decode('utf-8')
+        # Load the object data as JSON
+        try:
+            data = json.loads(object_data)
+        except json.JSONDecodeError:
+            print(f"Error loading JSON for object: {object_key}")
+            return None
+
+        # Extract data and create the desired object structure
+        sms_number = object_key.split('/')[2]
+        name_to_set = data['voter']
+        vote_data = data['votes_vote']
+        if not vote_data:
+            return None
+        if current_vote_type == "ELECTION":
+            return Vote(voter=Voter(name=name_to_set, sms_number=sms_number), voters_vote=vote_data)
+        return Vote(voter=Voter(name=name_to_set,sms_number=sms_number), voters_vote=VoteOptions(vote_data))
+
     def add_to_vote_log(self,key,value,community_board):
         try:
             obj = self.s3_resource.Object(self.bucket_name, self.vote_log_folder+'/'+community_board+'/'+value.voter.sms_number)
@@ -167,90 +374,320 @@ class PersisterS3(Persister, PersisterBase):
             obj.put(Body=json.dumps(to_save))
         except Exception as e:
             # Handle any exceptions
-            pass
+            return
+        try:
+            self.update_tally(value, community_board)
+        except Exception as e:
+            # The vote is stored, so the text is answered either way
+            print(f"ERROR updating tally for {community_board}: {str(e)}")
+            self.drop_tally(community_board)
 
-    def clear_vote_log(self,community_board):
-        # List all objects with the specified prefix
-        objects = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=self.vote_log_folder+'/'+community_board+'/')
-
-        # Check if the bucket has any objects
-        if 'Contents' in objects:
-            # Extract the object keys to be deleted
-            keys = [{'Key': obj['Key']} for obj in objects['Contents']]
-
-            # Delete the objects in batches for efficiency
-            chunk_size = 1000  # You can adjust the chunk size as needed
-            for i in range(0, len(keys), chunk_size):
-                response = self.s3.delete_objects(
-                    Bucket=self.bucket_name,
-                    Delete={'Objects': keys[i:i + chunk_size]}
-                )
-
-                # Check if any objects failed to delete
-                if 'Errors' in response:
-                    for error in response['Errors']:
-                        print(f"Error deleting object: {error['Key']} - {error['Message']}")
+    def update_tally(self, value: Vote, community_board):
+        # Several Lambdas can record votes at once, so update the tally with a conditional PUT
+        # on the ETag we read and start again if someone else got there first
+        tally_key = '/'+community_board+'/'+self.tally_key
+        for attempt in range(self.tally_update_attempts):
+            try:
+                try:
+                    response = self.hedged_read(lambda: self.s3.get_object(Bucket=self.bucket_name, Key=tally_key))
+                    tally = Tally.fromJSON(json.loads(response['Body'].read().decode('utf-8')))
+                    condition = {'IfMatch': response['ETag']}
+                except ClientError as e:
+                    if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                        raise
+                    # No tally yet, e.g. the first vote after a deploy in the middle of a session:
+                    # start from the log so the votes already in it are counted too. The vote being
+                    # recorded says which kind the log holds, so the session need not be read again
+                    vote_type = 'RESOLUTION' if isinstance(value.voters_vote, VoteOptions) else 'ELECTION'
+                    tally = Tally.fromVoteLog(self.get_vote_log(community_board, vote_type=vote_type))
+                    condition = {'IfNoneMatch': '*'}
+                tally.record_vote(value)
+                self.s3.put_object(Bucket=self.bucket_name, Key=tally_key, Body=json.dumps(tally.toJSON()), **condition)
+                return
+            except ClientError as e:
+                if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') in (409, 412):
+                    continue
+                print(f"Error updating tally: {str(e)}")
+                self.drop_tally(community_board)
+                return
+            # Anything else, e.g. a botocore too old for conditional PUTs rejecting IfMatch, is
+            # raised for the caller to see
+        print(f"Gave up updating tally for {community_board} after {self.tally_update_attempts} attempts")
+        self.drop_tally(community_board)
 
-    def get_current_vote_name(self,community_board):
-        # Implement S3-based getter for current_vote_name
+    def drop_tally(self, community_board):
+        # The tally may now be behind the vote log. get_tally rebuilds a missing one from the
+        # log, so deleting it puts it right on the next read instead of for the rest of the session
         try:
-            obj = self.s3_resource.Object(self.bucket_name, '/'+community_board+'/'+self.current_vote_name_key)
-            current_vote_name_json = obj.get()['Body'].read().decode('utf-8')
-            return json.loads(current_vote_name_json)
+            self.s3.delete_object(Bucket=self.bucket_name, Key='/'+community_board+'/'+self.tally_key)
         except Exception as e:
-            # Handle any exceptions
-            return ''
+            print(f"ERROR dropping tally for {community_board}, it may be behind the vote log: {str(e)}")
 
-    def set_current_vote_name(self, value,community_board):
-        # Implement S3-based setter for current_vote_name
+    def get_tally(self, community_board) -> Tally:
         try:
-            obj = self.s3_resource.Object(self.bucket_name, '/'+community_board+'/'+self.current_vote_name_key)
-            obj.put(Body=json.dumps(value))
+            obj = self.s3_resource.Object(self.bucket_name, '/'+community_board+'/'+self.tally_key)
+            return Tally.fromJSON(json.loads(self.hedged_read(obj.get)['Body'].read().decode('utf-8')))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                # Sessions started before the tally existed, build it once from the log
+                return self.rebuild_tally(community_board)
+            return Tally()
         except Exception as e:
-            # Handle any exceptions
-            pass
+            return Tally()
 
-    def get_currently_in_a_voting_session(self,community_board):
-        # Implement S3-based getter for currently_in_a_voting_session
+    def set_tally(self, value: Tally, community_board):
         try:
-            obj = self.s3_resource.Object(self.bucket_name, '/'+community_board+'/'+self.currently_in_a_voting_session_key)
-            currently_in_a_voting_session_json = obj.get()['Body'].read().decode('utf-8')
-            return json.loads(currently_in_a_voting_session_json)
+            obj = self.s3_resource.Object(self.bucket_name, '/'+community_board+'/'+self.tally_key)
+            obj.put(Body=json.dumps(value.toJSON()))
         except Exception as e:
-            # Handle any exceptions
-            return False
+            pass
+
+    def rebuild_tally(self, community_board) -> Tally:
+        tally = Tally.fromVoteLog(self.get_vote_log(community_board), version=1)
+        self.set_tally(tally, community_board)
+        return tally
+
+    def claim_message(self, message_sid, community_board) -> Optional[str]:
+        # Whoever creates the marker answers the text, a conditional PUT decides who that is
+        key = f'{self.messages_folder}/{community_board}/{message_sid}'
+        condition = {'IfNoneMatch': '*'}
+        for attempt in range(2):
+            try:
+                self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=json.dumps({'claimed_at': time.time(), 'reply': None}),
+                                   **condition)
+                return None
+            except ClientError as e:
+                if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') not in (409, 412):
+                    raise
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
+            marker = json.loads(response['Body'].read().decode('utf-8'))
+            if marker.get('reply') is not None:
+                return marker['reply']
+            if time.time() - marker.get('claimed_at', 0) < self.message_claim_timeout:
+                return ''
+            # Take over from the request that died, unless another retry gets there first
+            condition = {'IfMatch': response['ETag']}
+        return ''
+
+    def set_message_reply(self, message_sid, reply, community_board):
+        key = f'{self.messages_folder}/{community_board}/{message_sid}'
+        self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=json.dumps({'claimed_at': time.time(), 'reply': reply}))
+
+    def get_rate_limit(self, community_board, sms_number) -> dict:
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=f'{self.rate_limits_folder}/{community_board}/{sms_number}')
+            return json.loads(response['Body'].read().decode('utf-8'))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return {}
+            raise
+
+    def update_rate_limit(self, community_board, sms_number, update):
+        # Same conditional PUT loop as the tally, update(state) may run again if another Lambda got there first
+        key = f'{self.rate_limits_folder}/{community_board}/{sms_number}'
+        for attempt in range(self.tally_update_attempts):
+            try:
+                response = self.s3.get_object(Bucket=self.bucket_name, Key=key)
+                state = json.loads(response['Body'].read().decode('utf-8'))
+                condition = {'IfMatch': response['ETag']}
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+                    raise
+                state = {}
+                condition = {'IfNoneMatch': '*'}
+            result = update(state)
+            try:
+                self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=json.dumps(state), **condition)
+                return result
+            except ClientError as e:
+                if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') not in (409, 412):
+                    raise
+        raise RuntimeError(f"Gave up updating the rate limit for {sms_number} after {self.tally_update_attempts} attempts")
+
+    def clear_vote_log(self,community_board):
+        # Leave an empty tally behind rather than none, so the next session does not rebuild it from the log.
+        # Its version keeps counting up so it still identifies the board's state across sessions
+        self.set_tally(Tally(version=self.get_tally(community_board).version + 1), community_board)
+
+        # Stream every object with the specified prefix and delete them in batches as they are listed
+        prefix = self.vote_log_folder+'/'+community_board+'/'
+        self.delete_keys(self.iter_object_keys(prefix))
+
+    def delete_keys(self, keys):
+        chunk_size = 1000  # delete_objects accepts at most 1000 keys per call
+        keys = ({'Key': key} for key in keys)
+        while True:
+            chunk = list(islice(keys, chunk_size))
+            if not chunk:
+                break
+            response = self.s3.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': chunk}
+            )
+
+            # Check if any objects failed to delete
+            if 'Errors' in response:
+                for error in response['Errors']:
+                    print(f"Error deleting object: {error['Key']} - {error['Message']}")
+
+    def tag_keys(self, keys, tags: Dict[str, str]):
+        tag_set = [{'Key': name, 'Value': value} for name, value in tags.items()]
+        for key in keys:
+            self.s3.put_object_tagging(Bucket=self.bucket_name, Key=key, Tagging={'TagSet': tag_set})
+
+    def get_current_vote_name(self,community_board):
+        return self.get_session_state(community_board).current_vote_name
+
+    def set_current_vote_name(self, value,community_board):
+        self.update_session_state(community_board, current_vote_name=value)
+
+    def get_currently_in_a_voting_session(self,community_board):
+        return self.get_session_state(community_board).currently_in_a_voting_session
 
     def set_currently_in_a_voting_session(self, value,community_board):
-        # Implement S3-based setter for currently_in_a_voting_session
+        self.update_session_state(community_board, currently_in_a_voting_session=value)
+
+    def get_members(self,community_board)-> Dict[str, Voter]:
+        # The roster rarely changes, so serve it from the process-level cache and only
+        # revalidate it with a conditional GET once the TTL has passed
+        cache_key = (self.bucket_name, community_board)
+        with PersisterS3.members_cache_lock:
+            cached = PersisterS3.members_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached['fetched_at'] < self.members_cache_ttl:
+            self.count_members_cache('hits')
+            return dict(cached['members'])
+
+        request = {'Bucket': self.bucket_name, 'Key': '/'+community_board+'/'+self.members_key}
+        if cached is not None:
+            request['IfNoneMatch'] = cached['etag']
+            self.count_members_cache('revalidations')
         try:
-            obj = self.s3_resource.Object(self.bucket_name, '/'+community_board+'/'+self.currently_in_a_voting_session_key)
-            obj.put(Body=json.dumps(value))
+            response = self.hedged_read(lambda: self.s3.get_object(**request))
+        except ClientError as e:
+            if cached is not None and e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304:
+                # Unchanged since we last downloaded it, just restart the TTL
+                self.count_members_cache('not_modified')
+                with PersisterS3.members_cache_lock:
+                    cached['fetched_at'] = time.monotonic()
+                return dict(cached['members'])
+            # A roster that is a little old beats treating every member as a stranger
+            return dict(cached['members']) if cached is not None else {}
         except Exception as e:
             # Handle any exceptions
-            pass
+            return dict(cached['members']) if cached is not None else {}
 
-    def get_members(self,community_board)-> Dict[str, Voter]:
-        # Implement S3-based getter for members
         try:
-            obj = self.s3_resource.Object(self.bucket_name, '/'+community_board+'/'+self.members_key)
-            members_json = obj.get()['Body'].read().decode('utf-8')
-            members_data = json.loads(members_json)
+            members_data = json.loads(response['Body'].read().decode('utf-8'))
             # Deserialize members_data into a Dict[str, Voter]
             members = {key: Voter(name=voter['name'], sms_number=key) for key, voter in members_data.items()}
-            return members
         except Exception as e:
-            # Handle any exceptions
-            return {}
+            return dict(cached['members']) if cached is not None else {}
+        self.count_members_cache('misses')
+        with PersisterS3.members_cache_lock:
+            # Unless set_members cached a newer roster while this one was being downloaded
+            if PersisterS3.members_cache.get(cache_key) is cached:
+                PersisterS3.members_cache[cache_key] = {'etag': response.get('ETag'), 'fetched_at': time.monotonic(), 'members': members}
+        return dict(members)
 
     def set_members(self, value,community_board):
         # Implement S3-based setter for members
         try:
             obj = self.s3_resource.Object(self.bucket_name, '/'+community_board+'/'+self.members_key)
-            value = {key: voter.toJSON() for key, voter in value.items()}
-            obj.put(Body=json.dumps(value))
+            response = obj.put(Body=json.dumps({key: voter.toJSON() for key, voter in value.items()}))
         except Exception as e:
             # Handle any exceptions
-            pass
+            return
+        # Cache what was written, under the ETag S3 gave it, once it is stored; a get_members
+        # still downloading the old roster sees the entry changed and leaves it alone
+        with PersisterS3.members_cache_lock:
+            PersisterS3.members_cache[(self.bucket_name, community_board)] = {
+                'etag': response.get('ETag'), 'fetched_at': time.monotonic(), 'members': dict(value)}
+
+    def get_members_version(self, community_board, members: Dict[str, Voter] = None) -> str:
+        # The ETag of members.json, which get_members keeps fresh in the cache
+        if members is None:
+            self.get_members(community_board)
+        with PersisterS3.members_cache_lock:
+            cached = PersisterS3.members_cache.get((self.bucket_name, community_board))
+        return cached['etag'] if cached is not None else ''
+
+    @classmethod
+    def count_members_cache(cls, counter):
+        with cls.members_cache_lock:
+            cls.members_cache_stats[counter] += 1
+
+    @classmethod
+    def get_members_cache_stats(cls) -> Dict[str, int]:
+        with cls.members_cache_lock:
+            return {counter: cls.members_cache_stats[counter] for counter in ('hits', 'misses', 'revalidations', 'not_modified')}
+
+    @classmethod
+    def clear_members_cache(cls):
+        with cls.members_cache_lock:
+            cls.members_cache.clear()
+            cls.members_cache_stats.clear()
+
+    def hedged_read(self, read):
+        '''
+        Returns read(), an idempotent S3 GET. With hedge_reads on, a second identical GET is
+        sent if the first has not answered within the hedge delay, and whichever answers
+        first (with a response or an error) is used. The other is left to finish unseen.
+        '''
+        if not self.hedge_reads:
+            return read()
+        read = Deadline.bind(read)
+        executor = self.get_hedge_executor()
+        self.count_hedge('reads')
+        first = executor.submit(self.timed_read, read)
+        done, _ = wait([first], timeout=self.get_hedge_delay())
+        if done:
+            return first.result()
+        self.count_hedge('hedges_issued')
+        second = executor.submit(self.timed_read, read)
+        done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+        if first not in done:
+            self.count_hedge('hedges_won')
+            return second.result()
+        return first.result()
+
+    def timed_read(self, read):
+        start = time.monotonic()
+        # Read the body here too, a slow transfer is as much a straggler as a slow first byte
+        response = read_body(read)
+        with PersisterS3.hedge_lock:
+            PersisterS3.read_latencies.append(time.monotonic() - start)
+        return response
+
+    def get_hedge_delay(self) -> float:
+        with PersisterS3.hedge_lock:
+            latencies = sorted(PersisterS3.read_latencies)
+        if len(latencies) < self.hedge_min_samples:
+            return self.hedge_after
+        return latencies[min(int(len(latencies) * self.hedge_percentile / 100), len(latencies) - 1)]
+
+    @classmethod
+    def get_hedge_executor(cls):
+        with cls.hedge_lock:
+            if cls.hedge_executor is None:
+                cls.hedge_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('S3_HEDGE_MAX_WORKERS', '32')),
+                                                        thread_name_prefix='hedged-read')
+            return cls.hedge_executor
+
+    @classmethod
+    def count_hedge(cls, counter):
+        with cls.hedge_lock:
+            cls.hedge_stats[counter] += 1
+
+    @classmethod
+    def get_hedge_stats(cls) -> Dict[str, int]:
+        with cls.hedge_lock:
+            return {counter: cls.hedge_stats[counter] for counter in ('reads', 'hedges_issued', 'hedges_won')}
+
+    @classmethod
+    def clear_hedge_stats(cls):
+        with cls.hedge_lock:
+            cls.read_latencies.clear()
+            cls.hedge_stats.clear()
 
     def load_members(self,community_board):
         self.members = {}
@@ -262,15 +699,38 @@ class PersisterS3(Persister, PersisterBase):
                 self.members[number] = Voter(name, number)
         self.set_members(self.members,community_board)
 
+    def iter_object_keys(self, prefix):
+        """
+        Lazily walks every page of a prefix listing, following continuation tokens
+        only as the caller consumes keys, so listings past 1000 keys are complete
+        without materialising them.
+        """
+        kwargs = {'Bucket': self.bucket_name, 'Prefix': prefix}
+        while True:
+            response = self.s3.list_objects_v2(**kwargs)
+            for obj in response.get('Contents', []):
+                yield obj['Key']
+            if not response.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def iter_objects(self, prefix):
+        # A listing that fails on its first page reads as empty, as it always has. Once keys
+        # have been handed out the error is raised, or the caller would take a partial listing
+        # for the whole prefix
+        yielded = False
+        try:
+            for key in self.iter_object_keys(prefix):
+                yielded = True
+                yield key
+        except Exception as e:
+            print(f"Error listing objects: {str(e)}")
+            if yielded:
+                raise
+
     def list_objects(self, prefix):
         try:
-            response = self.s3.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
-            if 'Contents' in response:
-                return [obj['Key'] for obj in response['Contents']]
-            return []
+            return list(self.iter_object_keys(prefix))
         except Exception as e:
             print(f"Error listing objects: {str(e)}")
             return []
@@ -287,6 +747,78 @@ class PersisterS3(Persister, PersisterBase):
             print(f"Error getting object: {str(e)}")
             return None
 
+    def get_object_bytes(self, key) -> Optional[bytes]:
+        try:
+            return self.s3.get_object(Bucket=self.bucket_name, Key=key)['Body'].read()
+        except Exception as e:
+            print(f"Error getting object: {str(e)}")
+            return None
+
+    def put_object(self, key, body, **kwargs):
+        self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=body, **kwargs)
+
+    def iter_common_prefixes(self, prefix):
+        # The "directories" directly under prefix, e.g. each board under rawvotelog/
+        kwargs = {'Bucket': self.bucket_name, 'Prefix': prefix, 'Delimiter': '/'}
+        while True:
+            response = self.s3.list_objects_v2(**kwargs)
+            for common_prefix in response.get('CommonPrefixes', []):
+                yield common_prefix['Prefix']
+            if not response.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def iter_object_contents(self, prefix):
+        live_keys = []
+        archived = {}
+        for key in self.iter_objects(prefix):
+            if not LogArchive.is_archive_key(key):
+                live_keys.append(key)
+                continue
+            # Everything in an archive is gone from the live keys, so skipping one would
+            # silently drop the whole day
+            data = self.get_object_bytes(key)
+            if data is None:
+                raise RuntimeError(f"Could not read archive {key}")
+            try:
+                archive = LogArchive.fromBytes(data)
+            except Exception as e:
+                raise RuntimeError(f"Could not parse archive {key}: {str(e)}") from e
+            for archived_key, body in archive.items():
+                if archived_key.startswith(prefix):
+                    archived[archived_key] = body
+
+        # Stream the objects still stored on their own in key order, merged with the archived
+        # ones. Anything stored on its own wins over its archived copy, e.g. originals that
+        # were tagged rather than deleted when the day was compacted
+        live_contents = self.map_in_order(self.get_object, live_keys)
+        live_key_set = set(live_keys)
+        for key in sorted(live_key_set.union(archived)):
+            content = next(live_contents) if key in live_key_set else None
+            if content is None:
+                content = archived.get(key)
+            if content is None:
+                # Listed but unreadable, leaving it out would hand back an incomplete export
+                raise RuntimeError(f"Could not read {key}")
+            yield key, content
+
+    def map_in_order(self, loader, keys):
+        """
+        Yields loader(key) for each key, in order, running up to object_fetch_max_workers
+        loads at once. Results are handed over as soon as they and everything before them
+        are ready, so only a bounded window of objects is held in memory.
+        """
+        max_workers = self.object_fetch_max_workers
+        loader = Deadline.bind(loader)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            for key in keys:
+                if len(pending) >= max_workers * 2:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(loader, key))
+            while pending:
+                yield pending.popleft().result()
+
 class PersisterGlobalVariables(Persister, PersisterBase):
     '''
     Persister implementation using Global Variables
@@ -300,6 +832,7 @@ class PersisterGlobalVariables(Persister, PersisterBase):
         self.currently_in_a_voting_session = False
         self.current_vote_name = ''
         self.vote_log = {}
+        self.tally = Tally()
         self.members = {}
         self.vote_type: str = "RESOLUTION"
         self.election_candidates: List[str] = []
@@ -316,14 +849,22 @@ class PersisterGlobalVariables(Persister, PersisterBase):
     def set_election_candidates(self, value: List[str], community_board: str):
         self.election_candidates = value
 
-    def get_vote_log(self,community_board)-> Dict[str,Vote]:
+    def get_vote_log(self,community_board, vote_type=None)-> Dict[str,Vote]:
         return self.vote_log
 
     def add_to_vote_log(self,key,value,community_board):
         self.vote_log[key] = value
+        self.tally.record_vote(value)
 
     def clear_vote_log(self,community_board):
         self.vote_log = {}
+        self.tally = Tally(version=self.tally.version + 1)
+
+    def get_tally(self, community_board) -> Tally:
+        return self.tally
+
+    def set_tally(self, value: Tally, community_board):
+        self.tally = value
 
     def get_current_vote_name(self,community_board):
         return self.current_vote_name
@@ -382,4 +923,772 @@ class PersisterGlobalVariables(Persister, PersisterBase):
                 return f.read()
         except Exception as e:
             print(f"Error getting object: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+class BoardState:
+    '''
+    One board's share of a PersisterInMemory, with its own lock
+    '''
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.session_state = SessionState()
+        self.vote_log: Dict[str, Vote] = {}
+        self.tally = Tally()
+        # Replaced rather than changed, so it can be handed out without a copy
+        self.members: Dict[str, Voter] = {}
+
+class PersisterInMemory(Persister, PersisterBase):
+    '''
+    Keeps everything in this process's memory, with one BoardState per community board,
+    for local and test runs under a threaded server. Boards are spread over shards, each
+    with a lock only held to add a board, and every board has a lock of its own, so
+    requests for different boards never wait on each other. Anything handed out is a
+    copy, so it cannot change under the caller or be changed behind the lock's back,
+    except the members, which are only ever replaced.
+    '''
+
+    file_path = '../members.csv'
+
+    def __init__(self, shards=None):
+        shard_count = shards or int(os.environ.get('PERSISTER_SHARDS', '16'))
+        self.shard_locks = [threading.Lock() for _ in range(shard_count)]
+        self.shards: List[Dict[str, BoardState]] = [{} for _ in range(shard_count)]
+        # Raw and summary logs by key, written by SQLiteVoteLoggingClass and read back by api_export_votes
+        self.objects: Dict[str, str] = {}
+        self.objects_lock = threading.Lock()
+
+    def board(self, community_board) -> BoardState:
+        shard = hash(community_board) % len(self.shards)
+        state = self.shards[shard].get(community_board)
+        if state is None:
+            with self.shard_locks[shard]:
+                state = self.shards[shard].setdefault(community_board, BoardState())
+        return state
+
+    @contextmanager
+    def transaction(self, community_board):
+        # For changes that read before they write, nothing else touches the board meanwhile
+        state = self.board(community_board)
+        with state.lock:
+            yield state
+
+    def get_boards(self) -> List[str]:
+        return [community_board for shard in self.shards for community_board in list(shard)]
+
+    def get_session_state(self, community_board: str) -> SessionState:
+        with self.transaction(community_board) as state:
+            return self.copy_session_state(state.session_state)
+
+    def set_session_state(self, value: SessionState, community_board: str):
+        value = self.copy_session_state(value)
+        with self.transaction(community_board) as state:
+            state.session_state = value
+
+    @staticmethod
+    def copy_session_state(value: SessionState) -> SessionState:
+        return SessionState(value.current_vote_name, value.currently_in_a_voting_session, value.vote_type,
+                            list(value.election_candidates))
+
+    def update_session_state(self, community_board: str, **changes):
+        with self.transaction(community_board) as state:
+            for attribute, value in changes.items():
+                setattr(state.session_state, attribute, value)
+
+    def get_vote_type(self, community_board: str) -> str:
+        return self.board(community_board).session_state.vote_type
+
+    def set_vote_type(self, value: str, community_board: str):
+        self.update_session_state(community_board, vote_type=value)
+
+    def get_election_candidates(self, community_board: str) -> List[str]:
+        return list(self.get_session_state(community_board).election_candidates)
+
+    def set_election_candidates(self, value: List[str], community_board: str):
+        self.update_session_state(community_board, election_candidates=list(value))
+
+    def get_current_vote_name(self, community_board):
+        return self.board(community_board).session_state.current_vote_name
+
+    def set_current_vote_name(self, value, community_board):
+        self.update_session_state(community_board, current_vote_name=value)
+
+    def get_currently_in_a_voting_session(self, community_board):
+        return self.board(community_board).session_state.currently_in_a_voting_session
+
+    def set_currently_in_a_voting_session(self, value, community_board):
+        self.update_session_state(community_board, currently_in_a_voting_session=value)
+
+    def get_vote_log(self, community_board, vote_type=None) -> Dict[str, Vote]:
+        with self.transaction(community_board) as state:
+            return dict(state.vote_log)
+
+    def add_to_vote_log(self, key, value, community_board):
+        # The vote and the tally change together so they can never disagree
+        with self.transaction(community_board) as state:
+            state.vote_log[key] = value
+            state.tally.record_vote(value)
+
+    def clear_vote_log(self, community_board):
+        with self.transaction(community_board) as state:
+            state.vote_log = {}
+            state.tally = Tally(version=state.tally.version + 1)
+
+    def get_tally(self, community_board) -> Tally:
+        with self.transaction(community_board) as state:
+            return Tally.fromJSON(state.tally.toJSON())
+
+    def set_tally(self, value: Tally, community_board):
+        value = Tally.fromJSON(value.toJSON())
+        with self.transaction(community_board) as state:
+            state.tally = value
+
+    def get_members(self, community_board) -> Dict[str, Voter]:
+        return self.board(community_board).members
+
+    def set_members(self, value: Dict[str, Voter], community_board):
+        value = dict(value)
+        with self.transaction(community_board) as state:
+            state.members = value
+
+    def load_members(self, community_board):
+        members = {}
+        with open(self.file_path, 'r') as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                members[row['number']] = Voter(row['name'], row['number'])
+        self.set_members(members, community_board)
+        return members
+
+    def iter_objects(self, prefix):
+        with self.objects_lock:
+            keys = sorted(key for key in self.objects if key.startswith(prefix))
+        return iter(keys)
+
+    def list_objects(self, prefix):
+        return list(self.iter_objects(prefix))
+
+    def get_object(self, key):
+        with self.objects_lock:
+            return self.objects.get(key)
+
+    def put_object(self, key, body):
+        with self.objects_lock:
+            self.objects[key] = body
+
+    def append_object(self, key, body):
+        with self.objects_lock:
+            self.objects[key] = self.objects.get(key, '') + body
+
+class PersisterSharedMemory(Persister, PersisterBase):
+    '''
+    Keeps the live voting state in a multiprocessing.shared_memory region, so several
+    gunicorn workers on one box share one vote log without a network service. The
+    region has a fixed layout: a header with its dimensions, then one slot per board
+    holding a session header, the session and members as JSON, a vote code per member
+    (by their index in the members list) with the sequence number it was cast at, and
+    a count per vote code.
+
+    Each board's slot is guarded by a byte-range lock on a lock file, so workers voting
+    on different boards never wait on each other, together with a thread lock per slot
+    since record locks are held by the process rather than the thread. Parsed sessions
+    and members are cached per process and only read again when their generation in
+    the slot changes.
+
+    Votes can only be recorded for members, and a member removed from the list loses
+    their vote, as does everyone when a session with another vote type or other
+    candidates is set. The region outlives the workers; call unlink() to remove it.
+    '''
+
+    file_path = '../members.csv'
+
+    MAGIC = b'CBSM'
+    LAYOUT_VERSION = 1
+    HEADER = struct.Struct('<4sIIIIII')
+    # Board name, session and members generations, tally version and first version,
+    # session and members JSON lengths, number of members
+    BOARD_HEADER = struct.Struct('<64sQQQQIII')
+    # Codes below this are VoteOptions, candidates are numbered from it in the order given
+    CANDIDATE_CODE_BASE = 16
+    OPTION_CODES = {option: code for code, option in enumerate(VoteOptions, start=1)}
+    OPTIONS_BY_CODE = {code: option for option, code in OPTION_CODES.items()}
+
+    def __init__(self, name=None, boards=None, max_members=None, max_candidates=None, session_bytes=None,
+                 members_bytes=None, lock_path=None):
+        from multiprocessing import resource_tracker, shared_memory
+        self.name = name or os.environ.get('SHM_NAME', 'cb_dashboard')
+        self.boards = boards or int(os.environ.get('SHM_BOARDS', '16'))
+        self.max_members = max_members or int(os.environ.get('SHM_MAX_MEMBERS', '5000'))
+        self.max_candidates = max_candidates or int(os.environ.get('SHM_MAX_CANDIDATES', '256'))
+        self.session_bytes = session_bytes or int(os.environ.get('SHM_SESSION_BYTES', '16384'))
+        self.members_bytes = members_bytes or int(os.environ.get('SHM_MEMBERS_BYTES', str(self.max_members * 128)))
+        self.lock_path = lock_path or os.environ.get('SHM_LOCK_PATH') or os.path.join('/tmp', f'{self.name}.lock')
+
+        # Offsets within a board's slot, every section starts 8 byte aligned
+        align = lambda size: (size + 7) // 8 * 8
+        self.session_offset = align(self.BOARD_HEADER.size)
+        self.members_offset = self.session_offset + align(self.session_bytes)
+        self.codes_offset = self.members_offset + align(self.members_bytes)
+        self.sequences_offset = self.codes_offset + align(self.max_members * 2)
+        self.counts_offset = self.sequences_offset + align(self.max_members * 4)
+        self.slot_size = self.counts_offset + align((self.CANDIDATE_CODE_BASE + self.max_candidates) * 4)
+        self.slots_offset = align(self.HEADER.size)
+        size = self.slots_offset + self.boards * self.slot_size
+
+        self.lock_file = open(self.lock_path, 'a+b')
+        self.thread_locks = [threading.Lock() for _ in range(self.boards + 1)]
+        # Board name -> slot, sessions and members by slot with the generation they were read at
+        self.slots: Dict[str, int] = {}
+        self.sessions: Dict[int, tuple] = {}
+        self.members: Dict[int, tuple] = {}
+
+        # Whoever gets here first creates and lays out the region, the others attach to it
+        with self.locked(-1):
+            try:
+                self.shm = shared_memory.SharedMemory(name=self.name)
+            except FileNotFoundError:
+                self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+                self.HEADER.pack_into(self.shm.buf, 0, self.MAGIC, self.LAYOUT_VERSION, self.boards, self.max_members,
+                                      self.max_candidates, self.session_bytes, self.members_bytes)
+        # Otherwise the first worker to exit would take the region with it
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+        layout = self.HEADER.unpack_from(self.shm.buf, 0)
+        expected = (self.MAGIC, self.LAYOUT_VERSION, self.boards, self.max_members, self.max_candidates,
+                    self.session_bytes, self.members_bytes)
+        if layout != expected:
+            self.close()
+            raise ValueError(f'Shared memory {self.name} was laid out as {layout[2:]}, not {expected[2:]}; unlink it first')
+
+    def close(self):
+        self.shm.close()
+        self.lock_file.close()
+
+    def unlink(self):
+        from multiprocessing import resource_tracker
+        # unlink() tells the resource tracker it is gone, so it has to know about it first
+        resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+
+    @contextmanager
+    def locked(self, slot):
+        # Slot -1 guards the header and handing out slots, every board slot has a byte of its own
+        import fcntl
+        with self.thread_locks[slot]:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_EX, 1, slot + 1)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.lock_file, fcntl.LOCK_UN, 1, slot + 1)
+
+    def slot_base(self, slot) -> int:
+        return self.slots_offset + slot * self.slot_size
+
+    def read_board_header(self, slot) -> list:
+        return list(self.BOARD_HEADER.unpack_from(self.shm.buf, self.slot_base(slot)))
+
+    def write_board_header(self, slot, header):
+        self.BOARD_HEADER.pack_into(self.shm.buf, self.slot_base(slot), *header)
+
+    def array(self, slot, offset, length, format) -> memoryview:
+        start = self.slot_base(slot) + offset
+        return self.shm.buf[start:start + length * (2 if format == 'H' else 4)].cast(format)
+
+    def codes(self, slot) -> memoryview:
+        return self.array(slot, self.codes_offset, self.max_members, 'H')
+
+    def sequences(self, slot) -> memoryview:
+        return self.array(slot, self.sequences_offset, self.max_members, 'I')
+
+    def counts(self, slot) -> memoryview:
+        return self.array(slot, self.counts_offset, self.CANDIDATE_CODE_BASE + self.max_candidates, 'I')
+
+    def clear_votes(self, slot):
+        # The codes, sequences and counts are laid out one after another
+        start = self.slot_base(slot)
+        self.shm.buf[start + self.codes_offset:start + self.slot_size] = bytes(self.slot_size - self.codes_offset)
+
+    def board_slot(self, community_board) -> int:
+        slot = self.slots.get(community_board)
+        if slot is not None:
+            return slot
+        name = str(community_board).encode('utf-8')
+        if len(name) > 64:
+            raise ValueError(f'Board name {community_board} is longer than 64 bytes')
+        with self.locked(-1):
+            free_slot = None
+            for slot in range(self.boards):
+                slot_name = self.read_board_header(slot)[0].rstrip(b'\0')
+                if slot_name == name:
+                    break
+                if not slot_name and free_slot is None:
+                    free_slot = slot
+            else:
+                if free_slot is None:
+                    raise ValueError(f'Shared memory {self.name} already holds {self.boards} boards')
+                slot = free_slot
+                self.write_board_header(slot, [name, 0, 0, 0, 0, 0, 0, 0])
+        self.slots[community_board] = slot
+        return slot
+
+    def get_boards(self) -> List[str]:
+        names = (self.read_board_header(slot)[0].rstrip(b'\0') for slot in range(self.boards))
+        return [name.decode('utf-8') for name in names if name]
+
+    def read_blob(self, slot, offset, length) -> bytes:
+        start = self.slot_base(slot) + offset
+        return bytes(self.shm.buf[start:start + length])
+
+    def write_blob(self, slot, offset, capacity, value) -> int:
+        data = json.dumps(value).encode('utf-8')
+        if len(data) > capacity:
+            raise ValueError(f'{len(data)} bytes do not fit in the {capacity} set aside for them')
+        start = self.slot_base(slot) + offset
+        self.shm.buf[start:start + len(data)] = data
+        return len(data)
+
+    def read_session(self, slot) -> SessionState:
+        # Only parsed again when another write has bumped the generation
+        header = self.read_board_header(slot)
+        cached = self.sessions.get(slot)
+        if cached is not None and cached[0] == header[1]:
+            return cached[1]
+        session = SessionState.fromJSON(json.loads(self.read_blob(slot, self.session_offset, header[5]))) if header[5] else SessionState()
+        self.sessions[slot] = (header[1], session)
+        return session
+
+    def read_members(self, slot) -> tuple:
+        # (members by number, index by number, numbers in index order)
+        header = self.read_board_header(slot)
+        cached = self.members.get(slot)
+        if cached is not None and cached[0] == header[2]:
+            return cached[1]
+        rows = json.loads(self.read_blob(slot, self.members_offset, header[6])) if header[6] else []
+        members = {number: Voter(name, number) for number, name in rows}
+        numbers = [number for number, _ in rows]
+        parsed = (members, {number: index for index, number in enumerate(numbers)}, numbers)
+        self.members[slot] = (header[2], parsed)
+        return parsed
+
+    def get_session_state(self, community_board: str) -> SessionState:
+        slot = self.board_slot(community_board)
+        cached = self.sessions.get(slot)
+        # Unchanged since it was last read, so no need to wait for the lock
+        if cached is None or cached[0] != self.read_board_header(slot)[1]:
+            with self.locked(slot):
+                self.read_session(slot)
+            cached = self.sessions[slot]
+        return PersisterInMemory.copy_session_state(cached[1])
+
+    def write_session(self, slot, value: SessionState):
+        # Election votes are stored as candidate indexes, which only mean something under the
+        # candidates they were cast for, so a new vote type or candidate list drops them. The
+        # caller holds the slot's lock, so nobody reads the old codes against the new session
+        session = self.read_session(slot)
+        if session.vote_type != value.vote_type or list(session.election_candidates) != list(value.election_candidates):
+            self.reset_votes(slot)
+        header = self.read_board_header(slot)
+        header[5] = self.write_blob(slot, self.session_offset, self.session_bytes, value.toJSON())
+        header[1] += 1
+        self.write_board_header(slot, header)
+
+    def set_session_state(self, value: SessionState, community_board: str):
+        slot = self.board_slot(community_board)
+        with self.locked(slot):
+            self.write_session(slot, value)
+
+    def update_session_state(self, community_board: str, **changes):
+        slot = self.board_slot(community_board)
+        with self.locked(slot):
+            session = PersisterInMemory.copy_session_state(self.read_session(slot))
+            for attribute, value in changes.items():
+                setattr(session, attribute, value)
+            self.write_session(slot, session)
+
+    def get_vote_type(self, community_board: str) -> str:
+        return self.get_session_state(community_board).vote_type
+
+    def set_vote_type(self, value: str, community_board: str):
+        self.update_session_state(community_board, vote_type=value)
+
+    def get_election_candidates(self, community_board: str) -> List[str]:
+        return self.get_session_state(community_board).election_candidates
+
+    def set_election_candidates(self, value: List[str], community_board: str):
+        self.update_session_state(community_board, election_candidates=list(value))
+
+    def get_current_vote_name(self, community_board):
+        return self.get_session_state(community_board).current_vote_name
+
+    def set_current_vote_name(self, value, community_board):
+        self.update_session_state(community_board, current_vote_name=value)
+
+    def get_currently_in_a_voting_session(self, community_board):
+        return self.get_session_state(community_board).currently_in_a_voting_session
+
+    def set_currently_in_a_voting_session(self, value, community_board):
+        self.update_session_state(community_board, currently_in_a_voting_session=value)
+
+    def get_members(self, community_board) -> Dict[str, Voter]:
+        slot = self.board_slot(community_board)
+        cached = self.members.get(slot)
+        if cached is None or cached[0] != self.read_board_header(slot)[2]:
+            with self.locked(slot):
+                self.read_members(slot)
+            cached = self.members[slot]
+        return cached[1][0]
+
+    def set_members(self, value: Dict[str, Voter], community_board):
+        if len(value) > self.max_members:
+            raise ValueError(f'{len(value)} members do not fit in the {self.max_members} set aside for them')
+        slot = self.board_slot(community_board)
+        numbers = list(value)
+        with self.locked(slot):
+            # Votes follow their members to their new places, the votes of anyone removed are dropped
+            _, _, old_numbers = self.read_members(slot)
+            codes, sequences = self.codes(slot), self.sequences(slot)
+            old_votes = {number: (codes[index], sequences[index]) for index, number in enumerate(old_numbers) if codes[index]}
+            header = self.read_board_header(slot)
+            header[6] = self.write_blob(slot, self.members_offset, self.members_bytes,
+                                        [[number, value[number].name] for number in numbers])
+            self.clear_votes(slot)
+            counts = self.counts(slot)
+            for index, number in enumerate(numbers):
+                code, sequence = old_votes.get(number, (0, 0))
+                if code:
+                    codes[index], sequences[index] = code, sequence
+                    counts[code] += 1
+            header[2] += 1
+            header[7] = len(numbers)
+            self.write_board_header(slot, header)
+
+    def load_members(self, community_board):
+        members = {}
+        with open(self.file_path, 'r') as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                members[row['number']] = Voter(row['name'], row['number'])
+        self.set_members(members, community_board)
+        return members
+
+    def vote_code(self, voters_vote, session: SessionState) -> int:
+        code = self.OPTION_CODES.get(voters_vote)
+        if code is not None:
+            return code
+        try:
+            index = session.election_candidates.index(voters_vote)
+        except ValueError:
+            raise ValueError(f'{voters_vote} is not a candidate in {session.current_vote_name}')
+        if index >= self.max_candidates:
+            raise ValueError(f'Only the first {self.max_candidates} candidates can be voted for')
+        return self.CANDIDATE_CODE_BASE + index
+
+    def vote_option(self, code, session: SessionState):
+        # The VoteOptions member, the candidate's name, or None for a code this session has no option for
+        if code < self.CANDIDATE_CODE_BASE:
+            return self.OPTIONS_BY_CODE.get(code)
+        index = code - self.CANDIDATE_CODE_BASE
+        return session.election_candidates[index] if index < len(session.election_candidates) else None
+
+    def add_to_vote_log(self, key, value, community_board):
+        slot = self.board_slot(community_board)
+        with self.locked(slot):
+            _, index_by_number, _ = self.read_members(slot)
+            index = index_by_number.get(value.voter.sms_number)
+            if index is None:
+                raise KeyError(f'{value.voter.sms_number} is not a member of board {community_board}')
+            code = self.vote_code(value.voters_vote, self.read_session(slot))
+            codes, counts = self.codes(slot), self.counts(slot)
+            if codes[index]:
+                counts[codes[index]] -= 1
+            codes[index] = code
+            counts[code] += 1
+            header = self.read_board_header(slot)
+            header[3] += 1
+            self.sequences(slot)[index] = header[3]
+            self.write_board_header(slot, header)
+
+    def get_vote_log(self, community_board, vote_type=None) -> Dict[str, Vote]:
+        slot = self.board_slot(community_board)
+        with self.locked(slot):
+            session = self.read_session(slot)
+            members, _, numbers = self.read_members(slot)
+            codes = self.codes(slot)[:len(numbers)].tolist()
+        votes = ((number, self.vote_option(code, session)) for number, code in zip(numbers, codes) if code)
+        return {number: Vote(voter=members[number], voters_vote=option) for number, option in votes if option is not None}
+
+    def reset_votes(self, slot):
+        # No votes, and a tally version that moves on so cached results are not reused
+        self.clear_votes(slot)
+        header = self.read_board_header(slot)
+        header[3] += 1
+        header[4] = header[3]
+        self.write_board_header(slot, header)
+
+    def clear_vote_log(self, community_board):
+        slot = self.board_slot(community_board)
+        with self.locked(slot):
+            self.reset_votes(slot)
+
+    def get_counts(self, community_board) -> Dict[str, int]:
+        '''
+        Votes per option straight from the counters, without building a Tally
+        '''
+        slot = self.board_slot(community_board)
+        with self.locked(slot):
+            session = self.read_session(slot)
+            counts = self.counts(slot).tolist()
+        return {getattr(option, 'value', option): count for option, count in
+                ((self.vote_option(code, session), count) for code, count in enumerate(counts) if count) if option is not None}
+
+    def get_tally(self, community_board) -> Tally:
+        slot = self.board_slot(community_board)
+        with self.locked(slot):
+            session = self.read_session(slot)
+            members, _, numbers = self.read_members(slot)
+            codes = self.codes(slot)[:len(numbers)].tolist()
+            sequences = self.sequences(slot)[:len(numbers)].tolist()
+            header = self.read_board_header(slot)
+        voters, names, sequence_by_number = {}, {}, {}
+        for number, code, sequence in zip(numbers, codes, sequences):
+            option = self.vote_option(code, session) if code else None
+            if option is not None:
+                voters[number] = getattr(option, 'value', option)
+                names[number] = members[number].name
+                sequence_by_number[number] = sequence
+        return Tally(voters=voters, names=names, version=header[3], sequences=sequence_by_number, first_version=header[4])
+
+    def set_tally(self, value: Tally, community_board):
+        slot = self.board_slot(community_board)
+        with self.locked(slot):
+            session = self.read_session(slot)
+            _, index_by_number, _ = self.read_members(slot)
+            self.clear_votes(slot)
+            codes, sequences, counts = self.codes(slot), self.sequences(slot), self.counts(slot)
+            options = {getattr(option, 'value', option): option for option in chain(VoteOptions, session.election_candidates)}
+            for number, option in value.voters.items():
+                index = index_by_number.get(number)
+                if index is None or option not in options:
+                    continue
+                code = self.vote_code(options[option], session)
+                codes[index] = code
+                sequences[index] = value.sequences.get(number, value.version)
+                counts[code] += 1
+            header = self.read_board_header(slot)
+            header[3], header[4] = value.version, value.first_version
+            self.write_board_header(slot, header)
+
+class PersisterSQLite(Persister, PersisterBase):
+    '''
+    Persister implementation using a local SQLite database, for self-hosted deployments
+    running flask_app.py. Every table is keyed by community board, the database runs in
+    WAL mode so readers never block the writer, and each thread gets its own connection.
+    db_path must be a file; an in-memory database would be separate per connection.
+    '''
+
+    file_path = '../members.csv'
+
+    schema = [
+        'CREATE TABLE IF NOT EXISTS session_state (community_board TEXT PRIMARY KEY, document TEXT NOT NULL) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS tally (community_board TEXT PRIMARY KEY, document TEXT NOT NULL) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS members (community_board TEXT NOT NULL, sms_number TEXT NOT NULL, name TEXT NOT NULL, '
+        'PRIMARY KEY (community_board, sms_number)) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS vote_log (community_board TEXT NOT NULL, sms_number TEXT NOT NULL, voter TEXT NOT NULL, '
+        'votes_vote TEXT NOT NULL, PRIMARY KEY (community_board, sms_number)) WITHOUT ROWID',
+        'CREATE INDEX IF NOT EXISTS vote_log_by_option ON vote_log (community_board, votes_vote)',
+        'CREATE TABLE IF NOT EXISTS objects (key TEXT PRIMARY KEY, body TEXT NOT NULL) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS messages (community_board TEXT NOT NULL, message_sid TEXT NOT NULL, claimed_at REAL NOT NULL, '
+        'reply TEXT, PRIMARY KEY (community_board, message_sid)) WITHOUT ROWID',
+    ]
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.environ.get('SQLITE_DB_PATH', 'cb_dashboard.db')
+        self.message_claim_timeout = float(os.environ.get('MESSAGE_CLAIM_TIMEOUT_SECONDS', '15'))
+        self.local = threading.local()
+        connection = self.connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        for statement in self.schema:
+            connection.execute(statement)
+
+    def connection(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not be shared between threads
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            # isolation_level=None leaves transactions to transaction() below, and the
+            # statement cache keeps every query prepared after its first use
+            connection = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, cached_statements=64)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA busy_timeout=5000')
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write updates
+        # from other threads or processes cannot interleave
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    def read_session_state(self, connection, community_board: str) -> SessionState:
+        row = connection.execute('SELECT document FROM session_state WHERE community_board = ?', (community_board,)).fetchone()
+        return SessionState.fromJSON(json.loads(row[0])) if row else SessionState()
+
+    def write_session_state(self, connection, value: SessionState, community_board: str):
+        connection.execute('INSERT OR REPLACE INTO session_state (community_board, document) VALUES (?, ?)',
+                           (community_board, json.dumps(value.toJSON())))
+
+    def get_session_state(self, community_board: str) -> SessionState:
+        return self.read_session_state(self.connection(), community_board)
+
+    def set_session_state(self, value: SessionState, community_board: str):
+        with self.transaction() as connection:
+            self.write_session_state(connection, value, community_board)
+
+    def update_session_state(self, community_board: str, **changes):
+        with self.transaction() as connection:
+            session_state = self.read_session_state(connection, community_board)
+            for attribute, value in changes.items():
+                setattr(session_state, attribute, value)
+            self.write_session_state(connection, session_state, community_board)
+
+    def get_vote_type(self, community_board: str) -> str:
+        return self.get_session_state(community_board).vote_type
+
+    def set_vote_type(self, value: str, community_board: str):
+        self.update_session_state(community_board, vote_type=value)
+
+    def get_election_candidates(self, community_board: str) -> List[str]:
+        return self.get_session_state(community_board).election_candidates
+
+    def set_election_candidates(self, value: List[str], community_board: str):
+        self.update_session_state(community_board, election_candidates=value)
+
+    def get_current_vote_name(self, community_board):
+        return self.get_session_state(community_board).current_vote_name
+
+    def set_current_vote_name(self, value, community_board):
+        self.update_session_state(community_board, current_vote_name=value)
+
+    def get_currently_in_a_voting_session(self, community_board):
+        return self.get_session_state(community_board).currently_in_a_voting_session
+
+    def set_currently_in_a_voting_session(self, value, community_board):
+        self.update_session_state(community_board, currently_in_a_voting_session=value)
+
+    def get_vote_log(self, community_board, vote_type=None) -> Dict[str, Vote]:
+        current_vote_type = vote_type if vote_type is not None else self.get_vote_type(community_board)
+        rows = self.connection().execute(
+            'SELECT sms_number, voter, votes_vote FROM vote_log WHERE community_board = ?', (community_board,))
+        vote_logs = {}
+        for sms_number, name, vote_data in rows:
+            voters_vote = vote_data if current_vote_type == "ELECTION" else VoteOptions(vote_data)
+            vote_logs[sms_number] = Vote(voter=Voter(name=name, sms_number=sms_number), voters_vote=voters_vote)
+        return vote_logs
+
+    def add_to_vote_log(self, key, value, community_board):
+        vote_json = value.toJSON()
+        # The vote and the tally change in one transaction so they can never disagree
+        with self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO vote_log (community_board, sms_number, voter, votes_vote) VALUES (?, ?, ?, ?)',
+                               (community_board, value.voter.sms_number, vote_json['voter'], vote_json['votes_vote']))
+            tally = self.read_tally(connection, community_board)
+            tally.record_vote(value)
+            self.write_tally(connection, tally, community_board)
+
+    def clear_vote_log(self, community_board):
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM vote_log WHERE community_board = ?', (community_board,))
+            self.write_tally(connection, Tally(version=self.read_tally(connection, community_board).version + 1), community_board)
+
+    def read_tally(self, connection, community_board) -> Tally:
+        row = connection.execute('SELECT document FROM tally WHERE community_board = ?', (community_board,)).fetchone()
+        return Tally.fromJSON(json.loads(row[0])) if row else Tally()
+
+    def write_tally(self, connection, value: Tally, community_board):
+        connection.execute('INSERT OR REPLACE INTO tally (community_board, document) VALUES (?, ?)',
+                           (community_board, json.dumps(value.toJSON())))
+
+    def get_tally(self, community_board) -> Tally:
+        return self.read_tally(self.connection(), community_board)
+
+    def set_tally(self, value: Tally, community_board):
+        with self.transaction() as connection:
+            self.write_tally(connection, value, community_board)
+
+    def claim_message(self, message_sid, community_board) -> Optional[str]:
+        with self.transaction() as connection:
+            row = connection.execute('SELECT claimed_at, reply FROM messages WHERE community_board = ? AND message_sid = ?',
+                                     (community_board, message_sid)).fetchone()
+            if row is not None and (row[1] is not None or time.time() - row[0] < self.message_claim_timeout):
+                return row[1] if row[1] is not None else ''
+            # New, or claimed by a worker that died before answering
+            connection.execute('INSERT OR REPLACE INTO messages (community_board, message_sid, claimed_at, reply) VALUES (?, ?, ?, NULL)',
+                               (community_board, message_sid, time.time()))
+            return None
+
+    def set_message_reply(self, message_sid, reply, community_board):
+        with self.transaction() as connection:
+            connection.execute('UPDATE messages SET reply = ? WHERE community_board = ? AND message_sid = ?',
+                               (reply, community_board, message_sid))
+
+    def get_members(self, community_board) -> Dict[str, Voter]:
+        rows = self.connection().execute('SELECT sms_number, name FROM members WHERE community_board = ?', (community_board,))
+        return {sms_number: Voter(name=name, sms_number=sms_number) for sms_number, name in rows}
+
+    def set_members(self, value: Dict[str, Voter], community_board):
+        with self.transaction() as connection:
+            connection.execute('DELETE FROM members WHERE community_board = ?', (community_board,))
+            connection.executemany('INSERT INTO members (community_board, sms_number, name) VALUES (?, ?, ?)',
+                                   [(community_board, key, voter.name) for key, voter in value.items()])
+
+    def load_members(self, community_board):
+        self.members = {}
+        with open(self.file_path, 'r') as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                name = row['name']
+                number = row['number']
+                self.members[number] = Voter(name, number)
+        self.set_members(self.members, community_board)
+
+    def iter_objects(self, prefix):
+        # Range scan on the primary key, so a prefix listing only touches matching rows
+        rows = self.connection().execute('SELECT key FROM objects WHERE key >= ? AND key < ? ORDER BY key',
+                                         (prefix, prefix + '\U0010ffff'))
+        for (key,) in rows:
+            yield key
+
+    def list_objects(self, prefix):
+        try:
+            return list(self.iter_objects(prefix))
+        except Exception as e:
+            print(f"Error listing objects: {str(e)}")
+            return []
+
+    def get_object(self, key):
+        try:
+            row = self.connection().execute('SELECT body FROM objects WHERE key = ?', (key,)).fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            print(f"Error getting object: {str(e)}")
+            return None
+
+    def put_object(self, key, body):
+        with self.transaction() as connection:
+            connection.execute('INSERT OR REPLACE INTO objects (key, body) VALUES (?, ?)', (key, body))
+
+    def append_object(self, key, body):
+        with self.transaction() as connection:
+            connection.execute('INSERT INTO objects (key, body) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET body = body || excluded.body',
+                               (key, body))
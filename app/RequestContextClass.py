@@ -0,0 +1,75 @@
+from collections import Counter
+from typing import Dict, List
+from SessionStateClass import SessionState
+from TallyClass import Tally
+from VoteClass import Vote
+from VoterClass import Voter
+
+class RequestContext:
+    '''
+    Memoizes persister reads for the lifetime of a single request, so each piece of
+    board state is fetched at most once no matter how many helpers ask for it.
+    Writes go straight to the persister and keep the memoized copy up to date.
+    '''
+
+    def __init__(self, persister, community_board):
+        self.persister = persister
+        self.community_board = community_board
+        self.cache = {}
+        # Number of times each read actually reached the persister
+        self.fetch_counts = Counter()
+
+    def memoize(self, name, loader):
+        if name not in self.cache:
+            self.fetch_counts[name] += 1
+            self.cache[name] = loader()
+        return self.cache[name]
+
+    def get_session_state(self) -> SessionState:
+        return self.memoize('session_state', lambda: self.persister.get_session_state(self.community_board))
+
+    def get_current_vote_name(self) -> str:
+        return self.get_session_state().current_vote_name
+
+    def get_currently_in_a_voting_session(self) -> bool:
+        return self.get_session_state().currently_in_a_voting_session
+
+    def get_vote_type(self) -> str:
+        return self.get_session_state().vote_type
+
+    def get_election_candidates(self) -> List[str]:
+        return self.get_session_state().election_candidates
+
+    def get_members(self) -> Dict[str, Voter]:
+        return self.memoize('members', lambda: self.persister.get_members(self.community_board))
+
+    def get_vote_log(self) -> Dict[str, Vote]:
+        return self.memoize('vote_log', lambda: self.persister.get_vote_log(self.community_board, vote_type=self.get_vote_type()))
+
+    def get_tally(self) -> Tally:
+        return self.memoize('tally', lambda: self.persister.get_tally(self.community_board))
+
+    def get_members_version(self) -> str:
+        return self.memoize('members_version', lambda: self.persister.get_members_version(self.community_board, members=self.get_members()))
+
+    def set_session_state(self, value: SessionState):
+        self.persister.set_session_state(value, self.community_board)
+        self.cache['session_state'] = value
+
+    def set_members(self, value: Dict[str, Voter]):
+        self.persister.set_members(value, self.community_board)
+        self.cache['members'] = value
+        self.cache.pop('members_version', None)
+
+    def add_to_vote_log(self, key, value: Vote):
+        self.persister.add_to_vote_log(key=key, value=value, community_board=self.community_board)
+        if 'vote_log' in self.cache:
+            self.cache['vote_log'][key] = value
+        # The persister updated the stored tally, so read it again if it is needed
+        self.cache.pop('tally', None)
+
+    def clear_vote_log(self):
+        self.persister.clear_vote_log(self.community_board)
+        self.cache['vote_log'] = {}
+        # The persister moved the tally's version on, so read it again if it is needed
+        self.cache.pop('tally', None)
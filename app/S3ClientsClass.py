@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+from collections import Counter
+
+class S3Clients:
+    '''
+    The one boto3 S3 client (and resource wrapping it) shared by every persister and logger
+    in the process. boto3 is only imported the first time one is asked for, so importing
+    the app stays cheap on a Lambda cold start, and all S3 callers share one session and
+    one connection pool instead of each building their own.
+
+    The client is tuned from the environment (see config()) and counts its requests in
+    stats: how many were sent, the most in flight at once, how many started while every
+    pooled connection was already in use (pool_waits), and how many connections urllib3
+    had to throw away because the pool was full (pool_discards).
+    '''
+
+    lock = threading.Lock()
+    shared_client = None
+    shared_resource = None
+    stats = Counter()
+    in_flight = 0
+    max_pool_connections = None
+
+    @classmethod
+    def config(cls):
+        from botocore.config import Config
+        # Enough connections for the persister's concurrent GETs (VOTE_LOG_MAX_WORKERS and
+        # OBJECT_FETCH_MAX_WORKERS default to 16) plus the logger, instead of botocore's 10
+        settings = {
+            'max_pool_connections': int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '50')),
+            # Fail fast on a stalled connection so a retry can go elsewhere within the
+            # Lambda's 10 second timeout
+            'connect_timeout': float(os.environ.get('S3_CONNECT_TIMEOUT', '2')),
+            'read_timeout': float(os.environ.get('S3_READ_TIMEOUT', '5')),
+            # adaptive adds client-side rate limiting on throttling to the standard retries
+            'retries': {
+                'mode': os.environ.get('S3_RETRY_MODE', 'adaptive'),
+                'max_attempts': int(os.environ.get('S3_MAX_ATTEMPTS', '3')),
+            },
+            'tcp_keepalive': os.environ.get('S3_TCP_KEEPALIVE', '1').lower() in ('1', 'true', 'yes'),
+        }
+        if os.environ.get('S3_ENDPOINT_URL'):
+            # Local S3 stand-ins (MinIO, moto) are not reachable as bucket subdomains
+            settings['s3'] = {'addressing_style': 'path'}
+        return Config(**settings)
+
+    @classmethod
+    def client(cls):
+        with cls.lock:
+            if cls.shared_client is None:
+                import boto3
+                config = cls.config()
+                # boto3.client goes through boto3's default session, so this is also the one session
+                client = boto3.client('s3', config=config, endpoint_url=os.environ.get('S3_ENDPOINT_URL') or None)
+                cls.max_pool_connections = config.max_pool_connections
+                client.meta.events.register('before-send.s3', cls.count_request_sent)
+                # Emitted after every attempt, whether it got a response or an exception
+                client.meta.events.register('needs-retry.s3', cls.count_request_finished)
+                logging.getLogger('urllib3.connectionpool').addFilter(cls.count_pool_discard)
+                cls.shared_client = client
+            return cls.shared_client
+
+    @classmethod
+    def resource(cls):
+        client = cls.client()
+        with cls.lock:
+            if cls.shared_resource is None:
+                import boto3
+                resource = boto3.resource('s3', config=cls.config(), endpoint_url=os.environ.get('S3_ENDPOINT_URL') or None)
+                # Route the resource's requests through the shared client and its pool
+                resource.meta.client = client
+                cls.shared_resource = resource
+            return cls.shared_resource
+
+    @classmethod
+    def count_request_sent(cls, **kwargs):
+        with cls.lock:
+            if cls.max_pool_connections is not None and cls.in_flight >= cls.max_pool_connections:
+                cls.stats['pool_waits'] += 1
+            cls.in_flight += 1
+            cls.stats['requests'] += 1
+            cls.stats['in_flight_peak'] = max(cls.stats['in_flight_peak'], cls.in_flight)
+        # Returning a response here would replace the real HTTP request
+        return None
+
+    @classmethod
+    def count_request_finished(cls, **kwargs):
+        with cls.lock:
+            cls.in_flight = max(cls.in_flight - 1, 0)
+        # Anything but None is taken as a retry delay
+        return None
+
+    @classmethod
+    def count_pool_discard(cls, record):
+        if record.getMessage().startswith('Connection pool is full'):
+            with cls.lock:
+                cls.stats['pool_discards'] += 1
+        return True
+
+    @classmethod
+    def get_stats(cls):
+        with cls.lock:
+            return dict(cls.stats, in_flight=cls.in_flight, max_pool_connections=cls.max_pool_connections)
+
+    @classmethod
+    def reset(cls):
+        # Forget the cached client and its counters, e.g. between tests that patch boto3
+        with cls.lock:
+            cls.shared_client = None
+            cls.shared_resource = None
+            cls.stats = Counter()
+            cls.in_flight = 0
+            cls.max_pool_connections = None
+        logging.getLogger('urllib3.connectionpool').removeFilter(cls.count_pool_discard)
@@ -0,0 +1,35 @@
+from typing import List
+
+class SessionState:
+  '''
+  Everything needed to know the state of a board's voting session, stored as one document.
+  '''
+  VERSION = 1
+
+  def __init__(self, current_vote_name: str = '', currently_in_a_voting_session: bool = False,
+               vote_type: str = "RESOLUTION", election_candidates: List[str] = None):
+    self.current_vote_name = current_vote_name
+    self.currently_in_a_voting_session = currently_in_a_voting_session
+    self.vote_type = vote_type
+    self.election_candidates = election_candidates if election_candidates is not None else []
+
+  def __str__(self):
+    return f"{self.current_vote_name} ({self.vote_type}, open={self.currently_in_a_voting_session})"
+
+  def toJSON(self):
+    return {
+        'version': self.VERSION,
+        'current_vote_name': self.current_vote_name,
+        'currently_in_a_voting_session': self.currently_in_a_voting_session,
+        'vote_type': self.vote_type,
+        'election_candidates': self.election_candidates
+    }
+
+  @classmethod
+  def fromJSON(cls, data):
+    return cls(
+        current_vote_name=data.get('current_vote_name', ''),
+        currently_in_a_voting_session=data.get('currently_in_a_voting_session', False),
+        vote_type=data.get('vote_type', "RESOLUTION"),
+        election_candidates=data.get('election_candidates', [])
+    )
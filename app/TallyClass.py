@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional
+from VoteClass import Vote
+
+class Tally:
+  '''
+  Running count of a voting session, updated as each vote arrives so results can be
+  read without going through the whole vote log. Votes are keyed by their option's
+  value (VoteOptions value or candidate name).
+  '''
+
+  def __init__(self, voters: Dict[str, str] = None, names: Dict[str, str] = None, version: int = 0,
+               sequences: Dict[str, int] = None, first_version: int = None):
+    # sms_number -> option voted for, and sms_number -> voter name
+    self.voters = dict(voters) if voters else {}
+    self.names = dict(names) if names else {}
+    # sms_number -> the version their current vote was recorded at, its sequence number
+    self.sequences = dict(sequences) if sequences else {}
+    # The version the session started from, every vote in it has a higher sequence number
+    self.first_version = version if first_version is None else first_version
+    self.counts: Dict[str, int] = {}
+    self.options: Dict[str, Dict[str, str]] = {}
+    for sms_number, option in self.voters.items():
+      self.options.setdefault(option, {})[sms_number] = self.names.get(sms_number, '')
+      self.counts[option] = self.counts.get(option, 0) + 1
+    # Incremented on every change so readers can tell whether anything moved
+    self.version = version
+
+  def __str__(self):
+    return f"Tally v{self.version}: {self.counts}"
+
+  def record_vote(self, vote: Vote) -> Optional[str]:
+    '''
+    Adds a vote, moving the voter out of their previous option if they changed their vote.
+    Returns the previous option, if any.
+    '''
+    sms_number = vote.voter.sms_number
+    # VoteOptions are stored by value, candidate names as they are
+    option = getattr(vote.voters_vote, 'value', vote.voters_vote)
+    previous_option = self.voters.get(sms_number)
+    if previous_option is not None:
+      self.counts[previous_option] -= 1
+      del self.options[previous_option][sms_number]
+      if self.counts[previous_option] == 0:
+        del self.counts[previous_option]
+        del self.options[previous_option]
+    self.voters[sms_number] = option
+    self.names[sms_number] = vote.voter.name
+    self.options.setdefault(option, {})[sms_number] = vote.voter.name
+    self.counts[option] = self.counts.get(option, 0) + 1
+    self.version += 1
+    self.sequences[sms_number] = self.version
+    return previous_option
+
+  def get_count(self, option: str) -> int:
+    return self.counts.get(option, 0)
+
+  def get_voters(self, option: str) -> List[dict]:
+    # Same shape as Vote.toJSON so results look the same as when built from the vote log
+    return [{'voter': name, 'votes_vote': option} for name in self.options.get(option, {}).values()]
+
+  def has_voted(self, sms_number: str) -> bool:
+    return sms_number in self.voters
+
+  def has_sequences(self) -> bool:
+    # Tallies saved before votes were numbered cannot say what changed when
+    return self.sequences.keys() == self.voters.keys()
+
+  def get_votes_since(self, since: int) -> List[dict]:
+    '''
+    Current votes recorded after sequence number since, oldest first
+    '''
+    changed = sorted((sequence, sms_number) for sms_number, sequence in self.sequences.items() if sequence > since)
+    return [{'voter': self.names.get(sms_number, ''), 'votes_vote': self.voters[sms_number], 'sequence': sequence}
+            for sequence, sms_number in changed]
+
+  def toJSON(self):
+    return {
+        'version': self.version,
+        'voters': self.voters,
+        'names': self.names,
+        'sequences': self.sequences,
+        'first_version': self.first_version
+    }
+
+  @classmethod
+  def fromJSON(cls, data):
+    return cls(voters=data.get('voters', {}), names=data.get('names', {}), version=data.get('version', 0),
+               sequences=data.get('sequences', {}), first_version=data.get('first_version', 0))
+
+  @classmethod
+  def fromVoteLog(cls, vote_log: Dict[str, Vote], version: int = 0):
+    tally = cls()
+    for vote in vote_log.values():
+      tally.record_vote(vote)
+    # The log does not say what order the votes came in, so a rebuilt tally starts a
+    # fresh sequence and anyone asking for changes gets everything again
+    tally.version = version
+    tally.first_version = version
+    tally.sequences = {sms_number: version for sms_number in tally.voters}
+    return tally
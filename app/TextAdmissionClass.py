@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+class RateLimits:
+    '''
+    Token bucket state per (board, number), kept in this process. Anything with the same
+    get_rate_limit and update_rate_limit methods can stand in for it, e.g. PersisterS3 so
+    Lambdas share the state.
+    '''
+
+    def __init__(self, max_numbers=None):
+        self.max_numbers = max_numbers or int(os.environ.get('RATE_LIMIT_MAX_NUMBERS', '10000'))
+        # (community board, number) -> bucket state, least recently used first
+        self.states = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_rate_limit(self, community_board, sms_number) -> dict:
+        with self.lock:
+            return dict(self.states.get((community_board, sms_number), {}))
+
+    def update_rate_limit(self, community_board, sms_number, update):
+        # update(state) changes the state in place, its result is handed back
+        key = (community_board, sms_number)
+        with self.lock:
+            state = self.states.setdefault(key, {})
+            self.states.move_to_end(key)
+            result = update(state)
+            while len(self.states) > self.max_numbers:
+                self.states.popitem(last=False)
+            return result
+
+class TextAdmission:
+    '''
+    Decides which incoming texts get handled, in front of parse_incoming_text:
+
+    * each (board, number) has a token bucket of burst texts refilled at rate_per_minute,
+      and texts beyond it are dropped without a reply
+    * a text that arrives within coalesce_window of the number's previous one is a burst;
+      it waits out the window and is only handled if no later text came in meanwhile, so a
+      burst persists its first and its latest text rather than all of them
+    * at most max_concurrent texts are handled at once in this process, a text that cannot
+      get a slot within max_wait is asked to text again
+    '''
+
+    def __init__(self, burst=None, rate_per_minute=None, coalesce_window=None, max_concurrent=None, max_wait=None):
+        self.burst = burst or float(os.environ.get('TEXT_BURST', '5'))
+        self.rate = (rate_per_minute or float(os.environ.get('TEXT_RATE_PER_MINUTE', '20'))) / 60.0
+        self.coalesce_window = coalesce_window if coalesce_window is not None else float(os.environ.get('TEXT_COALESCE_SECONDS', '1'))
+        self.max_concurrent = max_concurrent or int(os.environ.get('MAX_CONCURRENT_TEXTS', '32'))
+        self.max_wait = max_wait if max_wait is not None else float(os.environ.get('TEXT_ADMISSION_WAIT_SECONDS', '2'))
+        self.slots = threading.BoundedSemaphore(self.max_concurrent)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def count(self, counter):
+        with self.lock:
+            self.stats[counter] += 1
+
+    def take_token(self, state, now) -> tuple:
+        '''
+        (whether the text may go ahead, its place in the burst it is part of or None)
+        '''
+        tokens = min(self.burst, state.get('tokens', self.burst) + (now - state.get('updated_at', now)) * self.rate)
+        state['updated_at'] = now
+        if tokens < 1:
+            state['tokens'] = tokens
+            return False, None
+        state['tokens'] = tokens - 1
+        in_burst = now - state.get('last_seen', float('-inf')) < self.coalesce_window
+        state['last_seen'] = now
+        state['latest'] = state.get('latest', 0) + 1
+        return True, state['latest'] if in_burst else None
+
+    def answer(self, community_board, sms_number, rate_limits, answer_text, dropped_reply, busy_reply) -> str:
+        now = time.time()
+        try:
+            allowed, sequence = rate_limits.update_rate_limit(community_board, sms_number, lambda state: self.take_token(state, now))
+        except Exception as e:
+            # Better an extra write than a vote nobody records, but counted and logged as an error,
+            # since a store that keeps failing (e.g. a botocore without conditional PUTs) means no limits at all
+            self.count('limiter_errors')
+            print(f"ERROR rate limiter failed for {sms_number}, letting the text through unlimited: {type(e).__name__}: {str(e)}")
+            allowed, sequence = True, None
+        if not allowed:
+            self.count('rate_limited')
+            return dropped_reply
+
+        if sequence is not None:
+            time.sleep(self.coalesce_window)
+            try:
+                latest = rate_limits.get_rate_limit(community_board, sms_number).get('latest', sequence)
+            except Exception as e:
+                self.count('limiter_errors')
+                print(f"ERROR rate limiter failed for {sms_number}, not coalescing the text: {type(e).__name__}: {str(e)}")
+                latest = sequence
+            if latest != sequence:
+                self.count('coalesced')
+                return dropped_reply
+
+        if not self.slots.acquire(timeout=self.max_wait):
+            self.count('busy')
+            return busy_reply
+        try:
+            self.count('admitted')
+            return answer_text()
+        finally:
+            self.slots.release()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def clear_stats(self):
+        with self.lock:
+            self.stats.clear()
@@ -0,0 +1,50 @@
+from string import Formatter
+
+class Twiml:
+    '''
+    Renders the TwiML replies to incoming texts, byte for byte what twilio's
+    MessagingResponse produces for a single message, without importing twilio. Fixed
+    replies are rendered once and looked up; replies with values in them are
+    TwimlTemplates whose fixed text is escaped up front.
+    '''
+
+    HEADER = '<?xml version="1.0" encoding="UTF-8"?>'
+    EMPTY_MESSAGE = HEADER + '<Response><Message /></Response>'
+    # No reply at all, nothing is sent back to the texter
+    EMPTY_RESPONSE = HEADER + '<Response />'
+
+    def __init__(self, constant_messages=()):
+        # Reply text -> its rendered TwiML
+        self.rendered = {text: self.render(text) for text in constant_messages}
+
+    @staticmethod
+    def escape(text: str) -> str:
+        # What ElementTree escapes in element text, quotes are left as they are
+        return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+    @classmethod
+    def render(cls, text: str) -> str:
+        if not text:
+            return cls.EMPTY_MESSAGE
+        return f'{cls.HEADER}<Response><Message>{cls.escape(text)}</Message></Response>'
+
+    def message(self, text: str) -> str:
+        rendered = self.rendered.get(text)
+        return rendered if rendered is not None else self.render(text)
+
+class TwimlTemplate:
+    '''
+    A reply in str.format syntax, e.g. 'you voted {vote} for {name}'. Only the values
+    are escaped when it is rendered.
+    '''
+
+    def __init__(self, template: str):
+        parts = []
+        for literal, field, _, _ in Formatter().parse(template):
+            parts.append(Twiml.escape(literal).replace('{', '{{').replace('}', '}}'))
+            if field is not None:
+                parts.append('{' + field + '}')
+        self.format_string = Twiml.HEADER + '<Response><Message>' + ''.join(parts) + '</Message></Response>'
+
+    def render(self, **values) -> str:
+        return self.format_string.format(**{name: Twiml.escape(str(value)) for name, value in values.items()})
@@ -1,19 +1,26 @@
 from datetime import datetime
-import boto3
-import pytz
+import json
 import os
+import threading
+import time
+import uuid
+from S3ClientsClass import S3Clients
+from DeadlineClass import Deadline, DeadlineBoundS3, DeadlineExceeded
 
 class VoteLoggingClass:
     '''
     Responsible for logging raw and summary votes
     '''
     def get_day_for_timestamp(self):
+        # Imported here so a cold start that logs nothing does not load the tz database
+        import pytz
         eastern = pytz.timezone('America/New_York')
         today = datetime.now(eastern)
         formatted_date = today.strftime("%Y_%m_%d")
         return formatted_date
 
     def get_time_stamp_with_seconds(self):
+        import pytz
         eastern = pytz.timezone('America/New_York')
         today = datetime.now(eastern)
         formatted_date = today.strftime("%Y_%m_%d_%H:%M:%S")
@@ -28,6 +35,12 @@ class VoteLoggingClass:
     def log_vote_summary_to_file(self,current_vote_name,summary,community_board):
         pass
 
+    def flush(self):
+        '''
+        Writes out anything still buffered. Called before a request handler returns.
+        '''
+        pass
+
 class LocalVoteLoggingClass(VoteLoggingClass):
     file_log_folder = '/home/regolith/Downloads/'
 
@@ -48,18 +61,59 @@ class LocalVoteLoggingClass(VoteLoggingClass):
 
 
 class S3VoteLoggingClass(VoteLoggingClass):
-    def __init__(self):
-        self.s3_resource = boto3.resource('s3')
+    '''
+    Logs to S3. With buffered=True (or RAW_LOG_BUFFERED=1) raw texts are queued in memory
+    and written as batched NDJSON objects by a background worker once max_batch_lines
+    lines are waiting or the oldest is max_batch_age seconds old, and flush() writes
+    whatever is left, so the SMS reply never waits on a PUT. Unbuffered raw texts are
+    queued the same way when the request's deadline has less than defer_below seconds left,
+    or when their PUT runs out of time.
+    '''
+    def __init__(self, buffered=None, max_batch_lines=100, max_batch_age=2.0):
+        # Created on first use from the shared S3Clients
+        self._s3_resource = None
         self.bucket_name = 'cb-dashboard-data-store'
         self.vote_summary_folder = 'summaryvotelog/'
         self.vote_raw_folder = 'rawvotelog/'
+        if buffered is None:
+            buffered = os.environ.get('RAW_LOG_BUFFERED', '').lower() in ('1', 'true', 'yes')
+        self.buffered = buffered
+        self.max_batch_lines = max_batch_lines
+        self.max_batch_age = max_batch_age
+        # (community_board, record) pairs waiting to be written, oldest first
+        self.buffer = []
+        self.buffer_started = None
+        self.buffer_condition = threading.Condition()
+        # Held for the whole of a flush so flush() returns only once earlier writes are done
+        self.flush_lock = threading.Lock()
+        self.worker = None
+        # Below this many seconds left on the request deadline, raw logging waits for a flush
+        self.defer_below = float(os.environ.get('RAW_LOG_DEFER_BELOW_SECONDS', '2'))
+        self.deferred = 0
+
+    @property
+    def s3_resource(self):
+        if self._s3_resource is None:
+            self._s3_resource = S3Clients.resource()
+        return DeadlineBoundS3.wrap(self._s3_resource)
+
+    @s3_resource.setter
+    def s3_resource(self, value):
+        self._s3_resource = value
 
     def log_raw_vote_to_file(self, incoming_number: str, incoming_msg: str, current_vote_name: str,community_board:str) -> None:
+        if self.buffered or self.should_defer():
+            self.enqueue_raw_vote(incoming_number, incoming_msg, current_vote_name, community_board)
+            return
         try:
             object_key = self.vote_raw_folder + community_board + '/' + self.get_time_stamp_with_seconds()+'_'+incoming_number + '.txt'
             obj = self.s3_resource.Object(self.bucket_name, object_key)
             value = self.get_time_stamp_with_seconds()+','+incoming_number+','+incoming_msg+','+current_vote_name+'\n'
             obj.put(Body=value)
+        except DeadlineExceeded:
+            # The vote itself matters more, keep the line for the next flush
+            self.deferred += 1
+            self.enqueue_raw_vote(incoming_number, incoming_msg, current_vote_name, community_board)
         except Exception as e:
             # Handle any exceptions
             pass
@@ -71,4 +125,96 @@ class S3VoteLoggingClass(VoteLoggingClass):
             obj.put(Body=summary)
         except Exception as e:
             # Handle any exceptions
-            pass
\ No newline at end of file
+            pass
+
+    def should_defer(self) -> bool:
+        deadline = Deadline.current()
+        if deadline is None or deadline.remaining() >= self.defer_below:
+            return False
+        self.deferred += 1
+        return True
+
+    def enqueue_raw_vote(self, incoming_number: str, incoming_msg: str, current_vote_name: str, community_board: str):
+        record = {
+            'timestamp': self.get_time_stamp_with_seconds(),
+            'incoming_number': incoming_number,
+            'incoming_msg': incoming_msg,
+            'current_vote_name': current_vote_name
+        }
+        with self.buffer_condition:
+            if not self.buffer:
+                self.buffer_started = time.monotonic()
+            self.buffer.append((community_board, record))
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run_flush_worker, name='raw-vote-log-flusher', daemon=True)
+                self.worker.start()
+            self.buffer_condition.notify()
+
+    def run_flush_worker(self):
+        while True:
+            with self.buffer_condition:
+                while not self.buffer:
+                    self.buffer_condition.wait()
+                # Wait for a full batch, or until the oldest line has waited long enough
+                while self.buffer and len(self.buffer) < self.max_batch_lines:
+                    remaining = self.max_batch_age - (time.monotonic() - self.buffer_started)
+                    if remaining <= 0:
+                        break
+                    self.buffer_condition.wait(remaining)
+            self.flush()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.buffer_condition:
+                batch, self.buffer, self.buffer_started = self.buffer, [], None
+            if not batch:
+                return
+            records_by_board = {}
+            for community_board, record in batch:
+                records_by_board.setdefault(community_board, []).append(record)
+            boards = list(records_by_board.items())
+            for i, (community_board, records) in enumerate(boards):
+                try:
+                    object_key = self.vote_raw_folder + community_board + '/' + self.get_time_stamp_with_seconds() + '_' + uuid.uuid4().hex + '.ndjson'
+                    obj = self.s3_resource.Object(self.bucket_name, object_key)
+                    obj.put(Body=''.join(json.dumps(record) + '\n' for record in records))
+                except DeadlineExceeded:
+                    # Out of time, put this board and the rest back for the next flush. A PUT
+                    # that timed out may still land, so its lines can end up logged twice
+                    self.requeue([(board, record) for board, unwritten in boards[i:] for record in unwritten])
+                    return
+                except Exception as e:
+                    print(f"Error writing {len(records)} raw votes for {community_board}: {str(e)}")
+
+    def requeue(self, batch):
+        with self.buffer_condition:
+            self.buffer[:0] = batch
+            if self.buffer_started is None:
+                self.buffer_started = time.monotonic()
+
+class SQLiteVoteLoggingClass(VoteLoggingClass):
+    '''
+    Writes raw and summary logs into the objects of a PersisterSQLite or PersisterInMemory,
+    using the same keys as S3VoteLoggingClass so api_export_votes works unchanged
+    '''
+    def __init__(self, persister):
+        self.persister = persister
+        self.vote_summary_folder = 'summaryvotelog/'
+        self.vote_raw_folder = 'rawvotelog/'
+
+    def log_raw_vote_to_file(self, incoming_number: str, incoming_msg: str, current_vote_name: str,community_board:str) -> None:
+        try:
+            object_key = self.vote_raw_folder + community_board + '/' + self.get_day_for_timestamp() + '.txt'
+            value = self.get_time_stamp_with_seconds()+','+incoming_number+','+incoming_msg+','+current_vote_name+'\n'
+            self.persister.append_object(object_key, value)
+        except Exception as e:
+            # Handle any exceptions
+            pass
+
+    def log_vote_summary_to_file(self,current_vote_name, summary,community_board:str):
+        try:
+            object_key = self.vote_summary_folder + community_board + '/' + self.get_day_for_timestamp()+'_'+current_vote_name+'_summary.txt'
+            self.persister.put_object(object_key, summary)
+        except Exception as e:
+            # Handle any exceptions
+            pass
@@ -0,0 +1,175 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, List
+from VoteOptionsEnum import VoteOptions
+
+class VoteParser:
+    '''
+    Turns an incoming text into the vote it casts. Built once per session (vote type and
+    candidates) and cached, so each text is one normalization and a dictionary lookup.
+
+    Resolutions match whole words, so "know" is not a no and "I vote yes!" is a yes, and
+    any text naming cause is a vote for cause.
+    Elections match the whole message against the candidate names, ignoring case, accents,
+    punctuation and spacing, optionally falling back to a unique prefix ("alice" for
+    "Alice Smith") and to names within max_edit_distance typos. parse() returns every
+    option a text matches, so a text matching more than one is reported as ambiguous
+    rather than silently resolved.
+    '''
+
+    RESOLUTION_KEYWORDS = {
+        'yes': VoteOptions.YES,
+        'no': VoteOptions.NO,
+        'abstain': VoteOptions.ABSTAIN,
+        'cause': VoteOptions.CAUSE,
+    }
+
+    SEPARATORS = re.compile(r'[\W_]+')
+
+    # Parsers by (vote type, candidates, options), shared across requests
+    compiled = {}
+    compiled_lock = threading.Lock()
+    max_compiled = 64
+
+    def __init__(self, vote_type: str = "RESOLUTION", candidates: List[str] = None,
+                 prefix_matching: bool = False, max_edit_distance: int = 0):
+        self.vote_type = vote_type
+        self.prefix_matching = prefix_matching
+        self.max_edit_distance = max_edit_distance
+        # Normalized name -> every candidate with that name, more than one is ambiguous
+        self.candidates_by_name: Dict[str, List[str]] = {}
+        for candidate in candidates or []:
+            names = self.candidates_by_name.setdefault(self.normalize(candidate), [])
+            if candidate not in names:
+                names.append(candidate)
+        self.candidates_by_name.pop('', None)
+        # Sorted so every name starting with a prefix is one contiguous run
+        self.sorted_names = sorted(self.candidates_by_name)
+        # Names by every string left after deleting up to max_edit_distance letters from them.
+        # Two strings within that many edits share one of these, so a typo only has to be
+        # compared with the few names it shares one with
+        self.names_by_deletion: Dict[str, set] = {}
+        for name in self.sorted_names if max_edit_distance > 0 else ():
+            for deletion in self.deletions(name, max_edit_distance):
+                self.names_by_deletion.setdefault(deletion, set()).add(name)
+
+    @classmethod
+    def for_session(cls, vote_type, candidates, prefix_matching=False, max_edit_distance=0) -> 'VoteParser':
+        key = (vote_type, tuple(candidates or ()), prefix_matching, max_edit_distance)
+        with cls.compiled_lock:
+            parser = cls.compiled.get(key)
+        if parser is None:
+            parser = cls(vote_type, list(candidates or ()), prefix_matching, max_edit_distance)
+            with cls.compiled_lock:
+                if len(cls.compiled) >= cls.max_compiled:
+                    cls.compiled.clear()
+                cls.compiled[key] = parser
+        return parser
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        # Lower case without accents, with punctuation and runs of whitespace as single spaces
+        text = text.casefold()
+        if not text.isascii():
+            text = unicodedata.normalize('NFKD', text)
+            text = ''.join(character for character in text if not unicodedata.combining(character))
+        return VoteParser.SEPARATORS.sub(' ', text).strip()
+
+    def parse(self, message: str) -> list:
+        '''
+        Every distinct vote the message could mean: none, one, or several when it is ambiguous
+        '''
+        normalized = self.normalize(message)
+        if self.vote_type == "ELECTION":
+            return self.parse_election(normalized)
+        matches = []
+        for token in normalized.split():
+            option = self.RESOLUTION_KEYWORDS.get(token)
+            if option is not None and option not in matches:
+                matches.append(option)
+        # "abstain for cause" and "no, cause" explain a for-cause abstention, cause has always won
+        if VoteOptions.CAUSE in matches:
+            return [VoteOptions.CAUSE]
+        return matches
+
+    def get_vote(self, message: str):
+        # The vote, or None when the message matches nothing or more than one option
+        matches = self.parse(message)
+        return matches[0] if len(matches) == 1 else None
+
+    def parse_election(self, name: str) -> List[str]:
+        if not name:
+            return []
+        exact = self.candidates_by_name.get(name)
+        if exact is not None:
+            return list(exact)
+        if self.prefix_matching:
+            matches = self.match_prefix(name)
+            if matches:
+                return matches
+        if self.max_edit_distance > 0:
+            return self.match_nearest(name)
+        return []
+
+    def match_prefix(self, prefix: str) -> List[str]:
+        matches = []
+        i = bisect_left(self.sorted_names, prefix)
+        while i < len(self.sorted_names) and self.sorted_names[i].startswith(prefix):
+            name = self.sorted_names[i]
+            # Only whole words, so "al" is not taken for "Alice Smith"
+            if name[len(prefix)] == ' ':
+                matches.extend(self.candidates_by_name[name])
+            i += 1
+        return matches
+
+    @staticmethod
+    def deletions(name: str, count: int) -> set:
+        found = {name}
+        latest = {name}
+        for _ in range(count):
+            latest = {text[:i] + text[i + 1:] for text in latest for i in range(len(text))}
+            found |= latest
+        return found
+
+    def match_nearest(self, name: str) -> List[str]:
+        best_distance = self.max_edit_distance + 1
+        matches = []
+        nearby = set()
+        for deletion in self.deletions(name, self.max_edit_distance):
+            nearby |= self.names_by_deletion.get(deletion, set())
+        for candidate_name in sorted(nearby):
+            distance = self.edit_distance(name, candidate_name, min(best_distance, self.max_edit_distance))
+            if distance < best_distance:
+                best_distance = distance
+                matches = list(self.candidates_by_name[candidate_name])
+            elif distance == best_distance and distance <= self.max_edit_distance:
+                matches.extend(self.candidates_by_name[candidate_name])
+        return matches
+
+    @staticmethod
+    def edit_distance(a: str, b: str, limit: int) -> int:
+        '''
+        Levenshtein distance counting a swap of neighbouring letters as one edit. Only the
+        band of cells within limit of the diagonal is worked out, and it gives up with
+        limit + 1 as soon as the distance is known to be more than limit.
+        '''
+        if abs(len(a) - len(b)) > limit:
+            return limit + 1
+        too_far = limit + 1
+        previous_previous = None
+        previous = [j if j <= limit else too_far for j in range(len(b) + 1)]
+        for i in range(1, len(a) + 1):
+            current = [too_far] * (len(b) + 1)
+            current[0] = i if i <= limit else too_far
+            for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+                if previous_previous is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                    distance = min(distance, previous_previous[j - 2] + 1)
+                current[j] = min(distance, too_far)
+            if min(current) > limit:
+                return too_far
+            previous_previous, previous = previous, current
+        return previous[len(b)]
@@ -0,0 +1,80 @@
+'''
+Cold start benchmark for lambda_app.
+
+Imports lambda_app in fresh interpreters under python -X importtime and reports the
+cumulative import time of each app module and of the heaviest third-party packages,
+then how long the first S3 call costs once boto3 is actually needed. Run from the app
+directory:
+
+    python benchmarks/bench_cold_start.py --runs 5 --top 10
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+FIRST_USE_SCRIPT = '''
+import time
+import lambda_app
+start = time.perf_counter()
+lambda_app.persister.s3
+lambda_app.votelogger.s3_resource
+print(time.perf_counter() - start)
+'''
+
+
+def run(args):
+    env = dict(os.environ, API_KEY='bench', TWILIO_API_KEY='bench', AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+    return subprocess.run([sys.executable] + args, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def import_times():
+    # Maps each module imported by `import lambda_app` to its cumulative microseconds
+    times = {}
+    started = False
+    for line in run(['-X', 'importtime', '-c', 'import lambda_app']).stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        # Lines come out as each import finishes, so everything before site is interpreter startup
+        if not started:
+            started = name == 'site'
+            continue
+        times[name] = max(times.get(name, 0), int(cumulative))
+    return times
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    app_modules = {os.path.splitext(file)[0] for file in os.listdir(APP_DIR) if file.endswith('.py')}
+    # Warm the .pyc files so the first run is not an outlier
+    run(['-c', 'import lambda_app'])
+    runs = [import_times() for _ in range(args.runs)]
+    medians = {name: statistics.median(times.get(name, 0) for times in runs) for name in runs[0]}
+    total = medians.get('lambda_app', 0)
+
+    print(f'import lambda_app: {total / 1000:.1f} ms (median of {args.runs} runs)')
+    print('app modules, cumulative:')
+    for name, micros in sorted(medians.items(), key=lambda item: -item[1]):
+        if name in app_modules:
+            print(f'  {name:>24}: {micros / 1000:7.1f} ms')
+    print(f'heaviest {args.top} other packages, cumulative:')
+    others = [(name, micros) for name, micros in medians.items() if name not in app_modules and '.' not in name]
+    for name, micros in sorted(others, key=lambda item: -item[1])[:args.top]:
+        print(f'  {name:>24}: {micros / 1000:7.1f} ms')
+    loaded = run(['-c', 'import sys, lambda_app; print(" ".join(name for name in ("boto3", "twilio", "pytz") if name in sys.modules))']).stdout.strip()
+    print(f'loaded by import: {loaded or "none of boto3, twilio, pytz"}')
+    first_use = statistics.median(float(run(['-c', FIRST_USE_SCRIPT]).stdout.strip()) for _ in range(args.runs))
+    print(f'first S3 client (deferred to the first request that needs it): {first_use * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,77 @@
+'''
+Benchmark for main.api_export_votes against a local S3 stand-in.
+
+Compares the old export (serial GET per summary, joined with +=) with the current
+one (bounded concurrent GETs streamed in key order, joined once), reporting S3
+round-trips and wall-clock time. Run from the app directory:
+
+    python benchmarks/bench_export_votes.py --summaries 250 --latency-ms 20
+'''
+import argparse
+import gzip
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+from fake_s3 import FakeS3
+import main
+from PersisterClass import PersisterS3
+
+
+def serial_export_votes(persister, date, community_board):
+    # The export as it was before the concurrent rewrite, kept here as the baseline
+    keys = persister.list_objects(prefix=f'summaryvotelog/{community_board}/{date.replace("-", "_")}')
+    aggregated_content = ""
+    for key in keys:
+        aggregated_content += persister.get_object(key=key) + "\n"
+    return aggregated_content.strip()
+
+
+def current_export_votes(persister, date, community_board):
+    with patch.object(main, 'persister', persister):
+        return main.api_export_votes(date, community_board)
+
+
+def build_persister(summaries, latency):
+    fake_s3 = FakeS3(latency=latency)
+    with patch('boto3.resource'), patch('boto3.client'):
+        persister = PersisterS3()
+    persister.s3 = fake_s3
+    persister.s3_resource = fake_s3
+    for i in range(summaries):
+        summary = f'Vote {i}\n' + ''.join(f'Member {j}: Yes\n' for j in range(50))
+        fake_s3.objects[f'summaryvotelog/bench/2024_05_01_vote{i:04d}_summary.txt'] = summary.encode('utf-8')
+    return persister, fake_s3
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--summaries', type=int, default=250)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    persister, fake_s3 = build_persister(args.summaries, args.latency_ms / 1000.0)
+    print(f'{args.summaries} summaries, {args.latency_ms:.0f} ms simulated S3 latency')
+    results = {}
+    # get_object prints every key it fetches, keep that out of the report
+    with open(os.devnull, 'w') as devnull:
+        for name, export in [('serial', serial_export_votes), ('concurrent', current_export_votes)]:
+            fake_s3.reset_calls()
+            start = time.perf_counter()
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                results[name] = export(persister, '2024-05-01', 'bench')
+            finally:
+                sys.stdout = stdout
+            elapsed = time.perf_counter() - start
+            print(f'{name:>10}: {len(results[name])} chars, {fake_s3.round_trips} round-trips, {elapsed * 1000:.1f} ms')
+    assert results['serial'] == results['concurrent']
+    print(f'{"gzip":>10}: {len(gzip.compress(results["concurrent"].encode("utf-8")))} bytes')
+
+
+if __name__ == '__main__':
+    main_benchmark()
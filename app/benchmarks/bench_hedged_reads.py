@@ -0,0 +1,96 @@
+'''
+Benchmark for PersisterS3's hedged reads against a local S3 stand-in with a long tail.
+
+Runs the reads an incoming text makes (session, members, tally) many times with
+hedging off and on. Each GET takes 8-15 ms, except for --tail-percent of them, which
+take --tail-ms. Reports per-request p50/p95/p99, GETs sent and hedges issued and won.
+Run from the app directory:
+
+    python benchmarks/bench_hedged_reads.py --requests 300 --tail-percent 3 --tail-ms 250
+'''
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+from fake_s3 import FakeS3
+from PersisterClass import PersisterS3
+from SessionStateClass import SessionState
+from VoterClass import Voter
+
+
+def long_tail_latency(tail_fraction, tail_seconds, seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    def latency(operation, key):
+        if operation != 'get_object':
+            return 0
+        with lock:
+            straggler = rng.random() < tail_fraction
+            quick = rng.uniform(0.008, 0.015)
+        return tail_seconds if straggler else quick
+    return latency
+
+
+def build_persister(hedge, args):
+    fake_s3 = FakeS3()
+    with patch('boto3.resource'), patch('boto3.client'):
+        persister = PersisterS3()
+    persister.s3 = fake_s3
+    persister.s3_resource = fake_s3
+    persister.hedge_reads = hedge
+    persister.hedge_percentile = args.percentile
+    persister.set_session_state(SessionState(current_vote_name='Budget', currently_in_a_voting_session=True), 'bench')
+    persister.set_members({f'+1555{i:07d}': Voter(f'Member {i}', f'+1555{i:07d}') for i in range(50)}, 'bench')
+    persister.get_tally('bench')
+    fake_s3.latency = long_tail_latency(args.tail_percent / 100.0, args.tail_ms / 1000.0, args.seed)
+    fake_s3.reset_calls()
+    return persister, fake_s3
+
+
+def percentile(durations, p):
+    return durations[min(int(len(durations) * p / 100), len(durations) - 1)]
+
+
+def run(hedge, args):
+    persister, fake_s3 = build_persister(hedge, args)
+    PersisterS3.clear_hedge_stats()
+    durations = []
+    for _ in range(args.requests):
+        # A members cache miss every time, so each request makes all three GETs
+        PersisterS3.clear_members_cache()
+        start = time.perf_counter()
+        persister.get_session_state('bench')
+        persister.get_members('bench')
+        persister.get_tally('bench')
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    stats = PersisterS3.get_hedge_stats()
+    print(f'{"hedged" if hedge else "plain":>8}: p50 {percentile(durations, 50) * 1000:6.1f} ms, '
+          f'p95 {percentile(durations, 95) * 1000:6.1f} ms, p99 {percentile(durations, 99) * 1000:6.1f} ms, '
+          f'{fake_s3.calls["get_object"]} GETs, {stats["hedges_issued"]} hedges issued, {stats["hedges_won"]} won')
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--tail-percent', type=float, default=3.0)
+    parser.add_argument('--tail-ms', type=float, default=250.0)
+    parser.add_argument('--percentile', type=float, default=95.0)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    print(f'{args.requests} requests of 3 GETs, {args.tail_percent}% of GETs take {args.tail_ms:.0f} ms, '
+          f'hedging at p{args.percentile:.0f}')
+    run(False, args)
+    run(True, args)
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,300 @@
+'''
+Micro-benchmarks for the per-text and per-poll hot paths, meant to be compared between commits.
+
+Times get_vote_from_string, summarize_votes, get_summary, api_get_results and
+parse_incoming_text on boards of 50, 500 and 5000 members, for resolutions and for
+elections of 2, 20 and 200 candidates, and the persister reads and writes behind them
+(in memory, shared memory, SQLite and S3 against the fake S3 from the tests). Each case is
+run --repeat times for at least --min-time seconds and reports the median and the fastest
+microseconds per call.
+
+--output writes the results as JSON with sorted keys, so two files diff cleanly.
+--compare reads such a file and flags every case that got more than --threshold slower,
+exiting with status 1 if any did. Run from the app directory:
+
+    python benchmarks/bench_hot_paths.py --output before.json
+    python benchmarks/bench_hot_paths.py --compare before.json --threshold 0.25
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+from fake_s3 import FakeS3
+import main
+from PersisterClass import PersisterInMemory, PersisterS3, PersisterSharedMemory, PersisterSQLite
+from SessionStateClass import SessionState
+from VoteClass import Vote
+from VoteLoggingClass import VoteLoggingClass
+from VoterClass import Voter
+from VoteOptionsEnum import VoteOptions
+
+MEMBER_COUNTS = [50, 500, 5000]
+CANDIDATE_COUNTS = [2, 20, 200]
+# Share of the board that has voted when the vote is timed
+TURNOUT = 0.8
+BOARD = 'bench'
+SCHEMA = 1
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carmen', 'Dmitri', 'Esther', 'Farah', 'Gustavo', 'Ines', 'Kwame', 'Lucia']
+LAST_NAMES = ['Smith', 'Johnson', 'Garcia', 'Nguyen', 'Kowalski', 'Okafor', 'Rossi', 'Chen', 'Alvarez', 'Brown']
+RESOLUTION_TEXTS = ['yes', 'Yes', 'YES', 'I vote yes', 'no', 'No.', 'no thanks', 'abstain', 'cause', 'yes no', 'know']
+
+
+def candidate_names(count):
+    return [f'{FIRST_NAMES[i % 10]} {LAST_NAMES[i // 10 % 10]} {i // 100 or ""}'.strip() for i in range(count)]
+
+
+def member_numbers(count):
+    return [f'+1555{i:07d}' for i in range(count)]
+
+
+def make_s3():
+    fake_s3 = FakeS3()
+    with patch('boto3.resource'), patch('boto3.client'):
+        persister = PersisterS3()
+    persister.s3 = fake_s3
+    persister.s3_resource = fake_s3
+    PersisterS3.clear_members_cache()
+    return persister
+
+
+class Persisters:
+    '''
+    Creates each kind of persister once and removes what they leave behind on close()
+    '''
+
+    def __init__(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.created = []
+
+    def make(self, kind):
+        if kind == 'in_memory':
+            persister = PersisterInMemory()
+        elif kind == 'shared_memory':
+            persister = PersisterSharedMemory(name=f'cb_bench_{os.getpid()}_{len(self.created)}', boards=2,
+                                              max_members=max(MEMBER_COUNTS), max_candidates=max(CANDIDATE_COUNTS),
+                                              lock_path=os.path.join(self.temp_dir.name, f'{len(self.created)}.lock'))
+        elif kind == 'sqlite':
+            persister = PersisterSQLite(db_path=os.path.join(self.temp_dir.name, f'{len(self.created)}.db'))
+        else:
+            persister = make_s3()
+        self.created.append(persister)
+        return persister
+
+    def close(self):
+        for persister in self.created:
+            if isinstance(persister, PersisterSharedMemory):
+                persister.unlink()
+            elif isinstance(persister, PersisterSQLite):
+                persister.close()
+        self.temp_dir.cleanup()
+
+
+def fill_board(persister, members, candidates, rng):
+    '''
+    A board of members with an open vote TURNOUT of them have voted in
+    '''
+    voters = {number: Voter(f'Member {number[-7:]}', number) for number in members}
+    persister.set_members(voters, BOARD)
+    if candidates:
+        session = SessionState(current_vote_name='Chair', currently_in_a_voting_session=True,
+                               vote_type='ELECTION', election_candidates=candidates)
+    else:
+        session = SessionState(current_vote_name='Budget', currently_in_a_voting_session=True)
+    persister.set_session_state(session, BOARD)
+    options = candidates or list(VoteOptions)
+    for number in rng.sample(members, int(len(members) * TURNOUT)):
+        persister.add_to_vote_log(key=number, value=Vote(voters[number], rng.choice(options)), community_board=BOARD)
+    return voters
+
+
+def texts_for(candidates, rng):
+    if not candidates:
+        return RESOLUTION_TEXTS
+    texts = []
+    for candidate in rng.sample(candidates, min(len(candidates), 20)):
+        texts += [candidate, candidate.lower(), candidate.upper() + ' ', candidate + '.', 'I vote ' + candidate]
+    return texts
+
+
+def time_case(function, repeat, min_time):
+    '''
+    Median and fastest seconds per call over repeat runs of at least min_time each
+    '''
+    function()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        runs.append((time.perf_counter() - start) / number)
+    return statistics.median(runs), min(runs), number
+
+
+def cycle(items):
+    # A function that hands back the next item on every call, so repeated calls do not hit one cache line
+    state = {'i': 0}
+
+    def next_item():
+        state['i'] = (state['i'] + 1) % len(items)
+        return items[state['i']]
+    return next_item
+
+
+def hot_path_cases(persister, members, candidates, rng):
+    '''
+    (name, function) for the main.py functions on a filled board
+    '''
+    fill_board(persister, members, candidates, rng)
+    next_text = cycle(texts_for(candidates, rng))
+    next_member = cycle(rng.sample(members, len(members)))
+    next_stranger = cycle([f'+1999{i:07d}' for i in range(100)])
+    return [
+        ('get_vote_from_string', lambda: main.get_vote_from_string(next_text(), BOARD)),
+        ('summarize_votes', lambda: main.summarize_votes(BOARD)),
+        ('get_summary', lambda: main.get_summary(BOARD)),
+        ('api_get_results', lambda: main.api_get_results(BOARD)),
+        ('parse_incoming_text', lambda: main.parse_incoming_text(next_member(), next_text(), BOARD)),
+        ('parse_incoming_text_stranger', lambda: main.parse_incoming_text(next_stranger(), 'yes', BOARD)),
+    ]
+
+
+def persister_cases(persister, members, rng):
+    '''
+    (name, function) for the reads and writes a text and a poll make
+    '''
+    voters = fill_board(persister, members, [], rng)
+    next_member = cycle(rng.sample(members, len(members)))
+    options = list(VoteOptions)
+
+    def add_vote():
+        number = next_member()
+        persister.add_to_vote_log(key=number, value=Vote(voters[number], rng.choice(options)), community_board=BOARD)
+
+    return [
+        ('get_session_state', lambda: persister.get_session_state(BOARD)),
+        ('get_members', lambda: persister.get_members(BOARD)),
+        ('get_tally', lambda: persister.get_tally(BOARD)),
+        ('get_vote_log', lambda: persister.get_vote_log(BOARD)),
+        ('add_to_vote_log', add_vote),
+    ]
+
+
+def run_suite(args):
+    rng = random.Random(args.seed)
+    results = {}
+    persisters = Persisters()
+
+    def record(name, function):
+        # Whole parts of the name, so members=50 does not also pick members=5000
+        if args.filter and not set(args.filter.split(',')) <= set(name.split('/')):
+            return
+        median, fastest, number = time_case(function, args.repeat, args.min_time)
+        results[name] = {'median_us': round(median * 1e6, 3), 'min_us': round(fastest * 1e6, 3), 'calls_per_run': number}
+        print(f'{name:<72} {median * 1e6:>12.2f} us {fastest * 1e6:>12.2f} us', file=sys.__stdout__, flush=True)
+
+    # The functions print a line for every text from a stranger, keep them out of the results
+    with patch('main.votelogger', new=VoteLoggingClass()), contextlib.redirect_stdout(io.StringIO()):
+        try:
+            for member_count in args.members:
+                members = member_numbers(member_count)
+                for candidate_count in [0] + args.candidates:
+                    kinds = ['in_memory'] if candidate_count else args.persisters
+                    for kind in kinds:
+                        vote = f'election_{candidate_count}' if candidate_count else 'resolution'
+                        with patch('main.persister', new=persisters.make(kind)) as persister:
+                            for case, function in hot_path_cases(persister, members, candidate_names(candidate_count), rng):
+                                record(f'{case}/{kind}/{vote}/members={member_count}', function)
+                for kind in args.persisters:
+                    for case, function in persister_cases(persisters.make(kind), members, rng):
+                        record(f'persister.{case}/{kind}/members={member_count}', function)
+        finally:
+            persisters.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''
+    Prints how each case moved against the baseline, returns the names of the ones that regressed
+    '''
+    regressions = []
+    for name in sorted(results):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = results[name]['median_us'] / max(before['median_us'], 1e-9)
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            verdict = 'REGRESSION'
+        elif ratio < 1 / (1 + threshold):
+            verdict = 'faster'
+        else:
+            continue
+        print(f'{verdict:>10} {name:<72} {before["median_us"]:>12.2f} -> {results[name]["median_us"]:.2f} us ({ratio:.2f}x)')
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print(f'{len(missing)} baseline case(s) were not run')
+    return regressions
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=lambda value: [int(count) for count in value.split(',')], default=MEMBER_COUNTS)
+    parser.add_argument('--candidates', type=lambda value: [int(count) for count in value.split(',')], default=CANDIDATE_COUNTS)
+    parser.add_argument('--persisters', type=lambda value: value.split(','), default=['in_memory', 'shared_memory', 'sqlite', 's3'])
+    parser.add_argument('--filter', default='', help='only run cases whose name has all of these comma separated parts, e.g. s3,members=500')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help='seconds each run lasts at least')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='a JSON file from an earlier --output to check against')
+    parser.add_argument('--threshold', type=float, default=0.25, help='how much slower a case may get before it is flagged')
+    args = parser.parse_args()
+
+    print(f'{"case":<72} {"median":>15} {"fastest":>15}')
+    results = run_suite(args)
+    report = {
+        'schema': SCHEMA,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'settings': {'repeat': args.repeat, 'min_time': args.min_time, 'seed': args.seed, 'turnout': TURNOUT},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('python') != report['python'] or baseline.get('machine') != report['machine']:
+            print(f'Baseline is from Python {baseline.get("python")} on {baseline.get("machine")}, timings may not be comparable')
+        regressions = compare(results, baseline.get('results', {}), args.threshold)
+        print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main_benchmark()
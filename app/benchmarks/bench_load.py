@@ -0,0 +1,345 @@
+'''
+End to end load generator for the Lambda handler and the Flask app, against the local
+S3 stand-in from the tests.
+
+Drives lambda_app.lambda_handler in-process and flask_app over real HTTP (a threaded
+server on a local port) with a mix of traffic:
+
+    sms    texts from members (votes, typos, instructions), strangers and Twilio retries
+    poll   dashboards polling /results and /isvotingstarted with the ETag they last got
+    admin  the members list, and now and then a new vote being started
+
+and reports throughput, p50/p95/p99 latency per endpoint, and the S3 calls each endpoint
+makes per request (measured one request at a time before the load starts). Run from the
+app directory:
+
+    python benchmarks/bench_load.py --target both --requests 2000 --concurrency 16 --members 500
+'''
+import argparse
+import base64
+import contextlib
+import http.client
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+API_KEY = 'bench-api-key'
+TWILIO_API_KEY = 'bench-twilio-key'
+# lambda_app reads these when it is imported, flask_app on every request
+os.environ.setdefault('API_KEY', API_KEY)
+os.environ.setdefault('TWILIO_API_KEY', TWILIO_API_KEY)
+API_KEY = os.environ['API_KEY']
+TWILIO_API_KEY = os.environ['TWILIO_API_KEY']
+
+from fake_s3 import FakeS3
+import main
+import lambda_app
+from MessageDedupeClass import MessageDedupe
+from PersisterClass import PersisterS3
+from TextAdmissionClass import TextAdmission
+from VoteLoggingClass import S3VoteLoggingClass
+from VoterClass import Voter
+
+RESOLUTION_TEXTS = ['yes', 'Yes', 'YES', 'yes!', 'I vote yes', 'no', 'No.', 'no thanks', 'abstain', 'Abstain',
+                    'cause', 'yes no', 'instructions', 'Sorry, running late']
+FIRST_NAMES = ['Alice', 'Bob', 'Carmen', 'Dmitri', 'Esther', 'Farah', 'Gustavo', 'Ines', 'Kwame', 'Lucia']
+LAST_NAMES = ['Smith', 'Johnson', 'Garcia', 'Nguyen', 'Kowalski', 'Okafor', 'Rossi', 'Chen']
+
+
+class LambdaContext:
+    def get_remaining_time_in_millis(self):
+        return 10000
+
+
+class Traffic:
+    '''
+    Builds requests for one target. Everything random comes from one seeded generator, so
+    two runs with the same arguments send the same requests.
+    '''
+
+    def __init__(self, args, boards):
+        self.args = args
+        self.boards = boards
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.mix = [(kind, float(weight)) for kind, weight in (part.split('=') for part in args.mix.split(','))]
+        self.candidates = [f'{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]}'
+                           for i in range(args.candidates)]
+        self.sent_sids = []
+        self.etags = {}
+
+    def members(self, board):
+        return {f'+1555{board.zfill(3)}{i:04d}': Voter(f'Member {i}', f'+1555{board.zfill(3)}{i:04d}')
+                for i in range(self.args.members)}
+
+    def start_vote(self, board, title):
+        if self.args.vote_type == 'ELECTION':
+            main.api_start_voting(title, board, vote_type='ELECTION', candidates=self.candidates)
+        else:
+            main.api_start_voting(title, board)
+
+    def next_request(self, sms_boards):
+        # (endpoint, board, sms form or None), the choices are made under the lock so the sequence is repeatable
+        with self.lock:
+            kind = self.rng.choices([kind for kind, _ in self.mix], [weight for _, weight in self.mix])[0]
+            if kind == 'sms':
+                board = self.rng.choice(sms_boards)
+                return 'incomingtext', board, self.sms_form(board)
+            board = self.rng.choice(self.boards)
+            if kind == 'poll':
+                return self.rng.choice(['results', 'results', 'results', 'isvotingstarted']), board, None
+            return ('startvoting' if self.rng.random() < 0.1 else 'members'), board, None
+
+    def sms_form(self, board):
+        if self.sent_sids and self.rng.random() < 0.02:
+            # Twilio retrying a webhook it timed out on
+            return self.rng.choice(self.sent_sids)
+        if self.rng.random() < 0.05:
+            number = f'+1999{self.rng.randrange(10 ** 7):07d}'
+        else:
+            number = f'+1555{board.zfill(3)}{self.rng.randrange(self.args.members):04d}'
+        if self.args.vote_type == 'ELECTION':
+            candidate = self.rng.choice(self.candidates)
+            body = self.rng.choice([candidate, candidate.lower(), candidate.upper() + ' ', candidate.split()[0], 'instructions'])
+        else:
+            body = self.rng.choice(RESOLUTION_TEXTS)
+        form = {'Body': body, 'From': number, 'MessageSid': f'SM{self.rng.getrandbits(64):016x}'}
+        self.sent_sids.append(form)
+        return form
+
+    def remember_etag(self, endpoint, board, etag):
+        if etag:
+            with self.lock:
+                self.etags[(endpoint, board)] = etag
+
+    def get_etag(self, endpoint, board):
+        with self.lock:
+            return self.etags.get((endpoint, board))
+
+
+class LambdaTarget:
+    name = 'lambda'
+
+    def __init__(self, traffic):
+        self.traffic = traffic
+        self.context = LambdaContext()
+
+    def sms_boards(self):
+        return self.traffic.boards
+
+    def send(self, endpoint, board, form):
+        headers = {'x-api-key': API_KEY, 'x-community-board': board}
+        event = {'rawPath': '/default/' + endpoint, 'rawQueryString': '', 'headers': headers,
+                 'requestContext': {'http': {'method': 'GET'}}}
+        if endpoint == 'incomingtext':
+            event.update(rawQueryString=f'auth={TWILIO_API_KEY}&cb={board}', headers={},
+                         body=base64.b64encode(urlencode(form).encode('utf-8')).decode('utf-8'))
+            event['requestContext']['http']['method'] = 'POST'
+        elif endpoint == 'startvoting':
+            event['requestContext']['http']['method'] = 'POST'
+            event['body'] = json.dumps({'title': f'Item {time.time_ns()}', 'vote_type': self.traffic.args.vote_type,
+                                        'candidates': self.traffic.candidates or None})
+        else:
+            etag = self.traffic.get_etag(endpoint, board)
+            if etag:
+                headers['if-none-match'] = etag
+        response = lambda_app.lambda_handler(event, self.context)
+        if not isinstance(response, dict):
+            return 500
+        self.traffic.remember_etag(endpoint, board, (response.get('headers') or {}).get('ETag'))
+        return response.get('statusCode', 200)
+
+    def close(self):
+        pass
+
+
+class FlaskTarget:
+    name = 'flask'
+
+    def __init__(self, traffic):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        import flask_app
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.traffic = traffic
+        self.server = make_server('127.0.0.1', 0, flask_app.app, threaded=True, request_handler=QuietHandler)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def sms_boards(self):
+        # flask_app's /incomingtext always votes on board 7
+        return ['7']
+
+    def send(self, endpoint, board, form):
+        headers = {'x-api-key': API_KEY, 'x-community-board': board}
+        method, body = 'GET', None
+        if endpoint == 'incomingtext':
+            method, body = 'POST', urlencode(form)
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        elif endpoint == 'startvoting':
+            method = 'POST'
+            body = json.dumps({'title': f'Item {time.time_ns()}', 'vote_type': self.traffic.args.vote_type,
+                               'candidates': self.traffic.candidates or None})
+            headers['Content-Type'] = 'application/json'
+        else:
+            etag = self.traffic.get_etag(endpoint, board)
+            if etag:
+                headers['If-None-Match'] = etag
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        try:
+            connection.request(method, '/' + endpoint, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            self.traffic.remember_etag(endpoint, board, response.getheader('ETag'))
+            return response.status
+        finally:
+            connection.close()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def percentile(durations, p):
+    return durations[min(int(len(durations) * p / 100), len(durations) - 1)]
+
+
+def setup(target_class, args):
+    '''
+    A fresh fake S3 with the boards' members and an open vote, and the app pointed at it
+    '''
+    fake_s3 = FakeS3()
+    with patch('boto3.resource'), patch('boto3.client'):
+        persister = PersisterS3()
+        votelogger = S3VoteLoggingClass()
+    persister.s3 = fake_s3
+    persister.s3_resource = fake_s3
+    votelogger.s3_resource = fake_s3
+    PersisterS3.clear_members_cache()
+    admission = TextAdmission() if args.admission else TextAdmission(burst=10 ** 9, coalesce_window=0)
+    patchers = [patch('main.persister', new=persister), patch('lambda_app.persister', new=persister),
+                patch('main.votelogger', new=votelogger), patch('lambda_app.votelogger', new=votelogger),
+                patch('main.message_dedupe', new=MessageDedupe()), patch('main.text_admission', new=admission),
+                patch('lambda_app.TWILIO_API_KEY', TWILIO_API_KEY), patch('lambda_app.API_KEY', API_KEY)]
+    for patcher in patchers:
+        patcher.start()
+
+    boards = [str(7 + board) for board in range(args.boards)]
+    traffic = Traffic(args, boards)
+    for board in boards:
+        persister.set_members(traffic.members(board), board)
+        traffic.start_vote(board, 'Budget')
+    fake_s3.latency = args.s3_latency_ms / 1000.0
+    return target_class(traffic), fake_s3, patchers, votelogger
+
+
+def calibrate(target, fake_s3, args):
+    # S3 calls per request for each endpoint, one request at a time so nothing else is counted
+    calls = {}
+    sms_boards = target.sms_boards()
+    for endpoint in ('incomingtext', 'results', 'isvotingstarted', 'members', 'startvoting'):
+        totals = Counter()
+        for _ in range(args.calibrate):
+            board = target.traffic.rng.choice(sms_boards)
+            form = target.traffic.sms_form(board) if endpoint == 'incomingtext' else None
+            fake_s3.reset_calls()
+            target.send(endpoint, board, form)
+            totals.update(fake_s3.calls)
+        calls[endpoint] = {operation: count / args.calibrate for operation, count in totals.items()}
+    return calls
+
+
+def run(target_class, args):
+    target, fake_s3, patchers, votelogger = setup(target_class, args)
+    try:
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            calls_per_request = calibrate(target, fake_s3, args) if args.calibrate else {}
+        latencies = defaultdict(list)
+        statuses = defaultdict(Counter)
+        lock = threading.Lock()
+        sms_boards = target.sms_boards()
+
+        def one_request(_):
+            endpoint, board, form = target.traffic.next_request(sms_boards)
+            start = time.perf_counter()
+            try:
+                status = target.send(endpoint, board, form)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[endpoint].append(elapsed)
+                statuses[endpoint][status] += 1
+
+        fake_s3.reset_calls()
+        # The app prints a line per text and per retried write, keep them out of the report unless asked
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                list(executor.map(one_request, range(args.requests)))
+            wall = time.perf_counter() - start
+            votelogger.flush()
+        report(target.name, args, wall, latencies, statuses, calls_per_request, fake_s3)
+    finally:
+        target.close()
+        for patcher in reversed(patchers):
+            patcher.stop()
+
+
+def report(name, args, wall, latencies, statuses, calls_per_request, fake_s3):
+    total = sum(len(durations) for durations in latencies.values())
+    print(f'\n{name}: {total} requests in {wall:.2f} s, {total / wall:.0f} requests/s, '
+          f'{fake_s3.round_trips} S3 calls ({fake_s3.round_trips / total:.1f} per request)')
+    print(f'{"endpoint":>16} {"count":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}  {"statuses":<22} S3 calls per request')
+    for endpoint in sorted(latencies, key=lambda endpoint: -len(latencies[endpoint])):
+        durations = sorted(latencies[endpoint])
+        status_text = ' '.join(f'{status}x{count}' for status, count in sorted(statuses[endpoint].items(), key=str))
+        calls = calls_per_request.get(endpoint, {})
+        calls_text = ', '.join(f'{count:.1f} {operation}' for operation, count in sorted(calls.items())) or '-'
+        print(f'{endpoint:>16} {len(durations):>6} {percentile(durations, 50) * 1000:>8.1f} '
+              f'{percentile(durations, 95) * 1000:>8.1f} {percentile(durations, 99) * 1000:>8.1f}  {status_text:<22} {calls_text}')
+    print(f'{"S3 totals":>16} ' + ', '.join(f'{count} {operation}' for operation, count in sorted(fake_s3.calls.items())))
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=['lambda', 'flask', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--members', type=int, default=500, help='members per board')
+    parser.add_argument('--boards', type=int, default=1)
+    parser.add_argument('--vote-type', choices=['RESOLUTION', 'ELECTION'], default='RESOLUTION')
+    parser.add_argument('--candidates', type=int, default=5, help='candidates when --vote-type ELECTION')
+    parser.add_argument('--mix', default='sms=85,poll=14,admin=1', help='relative weights of sms, poll and admin requests')
+    parser.add_argument('--s3-latency-ms', type=float, default=10.0, help='added to every S3 call')
+    parser.add_argument('--calibrate', type=int, default=20, help='requests per endpoint for the S3 call counts, 0 to skip')
+    parser.add_argument('--admission', action='store_true', help='keep the per-number rate limits and burst coalescing on')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help="show the app's own output")
+    args = parser.parse_args()
+    if args.vote_type == 'RESOLUTION':
+        args.candidates = 0
+
+    print(f'{args.requests} requests, {args.concurrency} at a time, {args.boards} board(s) of {args.members} members, '
+          f'{args.vote_type.lower()}, mix {args.mix}, {args.s3_latency_ms:.0f} ms per S3 call')
+    targets = {'lambda': [LambdaTarget], 'flask': [FlaskTarget], 'both': [LambdaTarget, FlaskTarget]}[args.target]
+    for target_class in targets:
+        run(target_class, args)
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,56 @@
+'''
+Benchmark for S3VoteLoggingClass.log_raw_vote_to_file against a local S3 stand-in.
+
+Measures the time each inbound text spends in raw logging (the part that sits on
+the SMS-to-TwiML path) with the per-message PUT and with the buffered mode, plus the
+cost of the final flush and the number of PUTs. Run from the app directory:
+
+    python benchmarks/bench_raw_logging.py --messages 200 --latency-ms 30
+'''
+import argparse
+import os
+import statistics
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+from fake_s3 import FakeS3
+from VoteLoggingClass import S3VoteLoggingClass
+
+
+def run(buffered, messages, latency):
+    fake_s3 = FakeS3(latency=latency)
+    with patch('boto3.resource'):
+        logger = S3VoteLoggingClass(buffered=buffered)
+    logger.s3_resource = fake_s3
+    per_message = []
+    for i in range(messages):
+        start = time.perf_counter()
+        logger.log_raw_vote_to_file(f'+1555{i:07d}', 'yes', 'Budget', 'bench')
+        per_message.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    logger.flush()
+    flush_time = time.perf_counter() - start
+    return per_message, flush_time, fake_s3.calls['put_object']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--latency-ms', type=float, default=30.0)
+    args = parser.parse_args()
+
+    print(f'{args.messages} texts, {args.latency_ms:.0f} ms simulated S3 latency')
+    for name, buffered in [('per-message PUT', False), ('buffered', True)]:
+        per_message, flush_time, puts = run(buffered, args.messages, args.latency_ms / 1000.0)
+        per_message_ms = sorted(t * 1000 for t in per_message)
+        p95 = per_message_ms[int(len(per_message_ms) * 0.95) - 1]
+        print(f'{name:>16}: median {statistics.median(per_message_ms):.3f} ms, p95 {p95:.3f} ms per text, '
+              f'final flush {flush_time * 1000:.1f} ms, {puts} PUTs')
+
+
+if __name__ == '__main__':
+    main()
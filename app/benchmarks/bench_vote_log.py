@@ -0,0 +1,79 @@
+'''
+Benchmark for PersisterS3.get_vote_log against a local S3 stand-in.
+
+Compares the old serial loader (one GET per voter plus a vote type GET per voter)
+with the current single-pass concurrent loader, reporting S3 round-trips and
+wall-clock time. Run from the app directory:
+
+    python benchmarks/bench_vote_log.py --members 50 --latency-ms 20
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests'))
+
+from fake_s3 import FakeS3
+from PersisterClass import PersisterS3
+from VoteClass import Vote
+from VoterClass import Voter
+from VoteOptionsEnum import VoteOptions
+
+
+def serial_get_vote_log(persister, community_board):
+    # The loader as it was before the concurrent rewrite, kept here as the baseline
+    vote_logs = {}
+    response = persister.s3.list_objects_v2(Bucket=persister.bucket_name, Prefix=persister.vote_log_folder+'/'+community_board+'/+')
+    for obj in response.get('Contents', []):
+        object_key = obj['Key']
+        data = json.loads(persister.s3.get_object(Bucket=persister.bucket_name, Key=object_key)['Body'].read().decode('utf-8'))
+        sms_number = object_key.split('/')[2]
+        if data['votes_vote']:
+            if persister.get_vote_type(community_board) == "ELECTION":
+                vote_logs[sms_number] = Vote(Voter(data['voter'], sms_number), data['votes_vote'])
+            else:
+                vote_logs[sms_number] = Vote(Voter(data['voter'], sms_number), VoteOptions(data['votes_vote']))
+    return vote_logs
+
+
+def build_persister(members, latency):
+    fake_s3 = FakeS3(latency=latency)
+    with patch('boto3.resource'), patch('boto3.client'):
+        persister = PersisterS3()
+    persister.s3 = fake_s3
+    persister.s3_resource = fake_s3
+    persister.set_vote_type("RESOLUTION", 'bench')
+    for i in range(members):
+        sms_number = f'+1555{i:07d}'
+        persister.add_to_vote_log(sms_number, Vote(Voter(f'Member {i}', sms_number), VoteOptions.YES), 'bench')
+    fake_s3.reset_calls()
+    return persister, fake_s3
+
+
+def run(loader, persister, fake_s3):
+    fake_s3.reset_calls()
+    start = time.perf_counter()
+    vote_log = loader(persister, 'bench')
+    elapsed = time.perf_counter() - start
+    return len(vote_log), fake_s3.round_trips, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    persister, fake_s3 = build_persister(args.members, args.latency_ms / 1000.0)
+    print(f'{args.members} votes, {args.latency_ms:.0f} ms simulated S3 latency')
+    for name, loader in [('serial', serial_get_vote_log), ('concurrent', lambda p, cb: p.get_vote_log(cb))]:
+        votes, round_trips, elapsed = run(loader, persister, fake_s3)
+        print(f'{name:>10}: {votes} votes, {round_trips} round-trips, {elapsed * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''
+Benchmark for the compiled VoteParser against the substring matching it replaced.
+
+Parses a corpus of real-looking resolution texts and election texts against a large
+candidate list, reporting microseconds per message and every message the two parsers
+read differently. Run from the app directory:
+
+    python benchmarks/bench_vote_parser.py --candidates 200 --messages 20000
+'''
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from VoteOptionsEnum import VoteOptions
+from VoteParserClass import VoteParser
+
+RESOLUTION_TEXTS = [
+    'yes', 'Yes', 'YES', 'yes!', 'Yes please', 'I vote yes', 'yes.', ' yes ', 'Y', 'yea',
+    'no', 'No', 'NO.', 'no thanks', 'I vote no', 'nope', 'nope, yes', 'know', 'not sure',
+    'abstain', 'Abstain', 'I abstain', 'abstaining', 'cause', 'Cause', 'recuse for cause',
+    'yes no', 'instructions', 'what is this vote?', 'Sorry, running late', 'Noted',
+]
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carmen', 'Dmitri', 'Esther', 'Farah', 'Gustavo', 'Hye-jin', 'Ines', 'José',
+               'Kwame', 'Lucia', 'Marcus', 'Nadia', 'Oren', 'Priya', 'Quentin', 'Rosa', 'Sean', 'Tomás']
+LAST_NAMES = ['Smith', 'Johnson', 'García', 'Nguyen', 'O\'Brien', 'Kowalski', 'Okafor', 'Rossi', 'Chen', 'Álvarez']
+
+
+def substring_vote(message, vote_type, candidates):
+    # get_vote_from_string as it was before VoteParser, kept here as the baseline
+    if vote_type == "ELECTION":
+        for candidate in candidates:
+            if message.lower() == candidate.lower():
+                return candidate
+        return None
+    message = message.lower()
+    if 'cause' in message:
+        return VoteOptions.CAUSE
+    elif 'abstain' in message:
+        return VoteOptions.ABSTAIN
+    elif 'yes' in message:
+        return VoteOptions.YES
+    elif 'no' in message:
+        return VoteOptions.NO
+    return None
+
+
+def election_texts(candidates, rng):
+    # How people actually type a name: lower case, trailing space, a period, a missing accent
+    texts = []
+    for candidate in candidates:
+        texts += [candidate, candidate.lower(), candidate.upper() + ' ', candidate + '.',
+                  candidate.replace('é', 'e').replace('á', 'a').replace('Á', 'A'),
+                  candidate.split()[0], 'I vote ' + candidate]
+    rng.shuffle(texts)
+    return texts
+
+
+def time_parser(parse, messages):
+    start = time.perf_counter()
+    results = [parse(message) for message in messages]
+    return results, (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def compare(label, vote_type, candidates, corpus, count, rng, show):
+    messages = [rng.choice(corpus) for _ in range(count)]
+    old_results, old_us = time_parser(lambda message: substring_vote(message, vote_type, candidates), messages)
+    parser = VoteParser.for_session(vote_type, candidates)
+    new_results, new_us = time_parser(parser.get_vote, messages)
+    print(f'{label}: substring {old_us:.2f} us/message, compiled {new_us:.2f} us/message')
+    differences = sorted({(message, old, new) for message, old, new in zip(messages, old_results, new_results) if old != new},
+                         key=lambda difference: difference[0])
+    print(f'    {len(differences)} messages read differently, for example:')
+    for message, old, new in differences[:show]:
+        describe = lambda vote: getattr(vote, 'value', vote)
+        print(f'    {message!r:>28}: {describe(old)} -> {describe(new)}')
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--candidates', type=int, default=200)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--show', type=int, default=10, help='how many differing messages to list')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    candidates = [f'{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}'
+                  + (f' {i // (len(FIRST_NAMES) * len(LAST_NAMES)) + 1}' if i >= len(FIRST_NAMES) * len(LAST_NAMES) else '')
+                  for i in range(args.candidates)]
+    compare('resolution', 'RESOLUTION', [], RESOLUTION_TEXTS, args.messages, rng, args.show)
+    compare(f'election, {len(candidates)} candidates', 'ELECTION', candidates, election_texts(candidates, rng), args.messages, rng, args.show)
+
+    start = time.perf_counter()
+    VoteParser('ELECTION', candidates, prefix_matching=True, max_edit_distance=2)
+    print(f'compiling {len(candidates)} candidates for prefix and typo matching: {(time.perf_counter() - start) * 1000:.2f} ms')
+    fuzzy = VoteParser('ELECTION', candidates, prefix_matching=True, max_edit_distance=2)
+    typos = [candidate[:3] + candidate[4] + candidate[3] + candidate[5:] for candidate in candidates]
+    _, fuzzy_us = time_parser(fuzzy.get_vote, typos)
+    print(f'election typo lookups with max_edit_distance=2: {fuzzy_us:.1f} us/message, '
+          f'{sum(fuzzy.get_vote(typo) == candidate for typo, candidate in zip(typos, candidates))}/{len(typos)} resolved')
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,134 @@
+"""
+Nightly compaction of the S3 logs. Merges one board's log objects for one day into a
+single LogArchive at <folder><cb>/<YYYY_MM_DD>.ndjson.gz, then deletes the originals
+(or tags them so a lifecycle rule can expire them). Running it again for the same day
+folds in anything logged since.
+
+    python3 compact_logs.py                      # yesterday, every board
+    python3 compact_logs.py --day 2024-01-02 --board 7 --keep-originals
+    python3 compact_logs.py --extract ~/Downloads/tonightsvotes/raw/
+
+lambda_handler takes an optional event of
+{"day": "YYYY-MM-DD", "community_boards": [...], "folder": "rawvotelog/", "keep_originals": false}
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+import pytz
+from LogArchiveClass import LogArchive
+from PersisterClass import PersisterS3
+
+RAW_LOG_FOLDER = 'rawvotelog/'
+
+
+def get_yesterday():
+    eastern = pytz.timezone('America/New_York')
+    return (datetime.now(eastern) - timedelta(days=1)).strftime("%Y_%m_%d")
+
+
+def compact_day(persister, community_board, day, folder=RAW_LOG_FOLDER, keep_originals=False):
+    day = day.replace('-', '_')
+    archive_key = LogArchive.key_for(folder, community_board, day)
+    archive = LogArchive(community_board=community_board, day=day)
+
+    keys = []
+    for key in persister.iter_objects(folder + community_board + '/' + day):
+        if key == archive_key:
+            data = persister.get_object_bytes(key)
+            if data is None:
+                # Rewriting it without its current contents would lose them
+                raise RuntimeError(f"Could not read existing archive {archive_key}")
+            archive = LogArchive.fromBytes(data)
+        elif not LogArchive.is_archive_key(key):
+            keys.append(key)
+
+    # Log objects never change once written, so anything already in the archive (kept
+    # because of keep_originals) does not need to be read again
+    new_keys = [key for key in keys if key not in archive.entries]
+    result = {'community_board': community_board, 'day': day, 'archive_key': archive_key, 'compacted': 0}
+    if not new_keys:
+        result['object_count'] = len(archive.entries)
+        return result
+
+    compacted_keys = []
+    for key, content in zip(new_keys, persister.map_in_order(persister.get_object, new_keys)):
+        # Leave anything we could not read where it is, the next run picks it up
+        if content is not None:
+            archive.add(key, content)
+            compacted_keys.append(key)
+
+    # Only remove the originals once the archive holding them is written
+    persister.put_object(archive_key, archive.toBytes(), ContentType='application/gzip')
+    if keep_originals:
+        persister.tag_keys(compacted_keys, {'compacted': archive_key})
+    else:
+        persister.delete_keys(compacted_keys)
+
+    result['compacted'] = len(compacted_keys)
+    result['object_count'] = len(archive.entries)
+    return result
+
+
+def compact(persister, day=None, community_boards=None, folder=RAW_LOG_FOLDER, keep_originals=False):
+    day = day or get_yesterday()
+    if not community_boards:
+        community_boards = [prefix[len(folder):].strip('/') for prefix in persister.iter_common_prefixes(folder)]
+    return [compact_day(persister, community_board, day, folder=folder, keep_originals=keep_originals)
+            for community_board in community_boards]
+
+
+def extract_archives(directory):
+    # Writes each archived object back next to its archive, under its original file name
+    extracted = 0
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if not LogArchive.is_archive_key(file):
+                continue
+            archive_path = os.path.join(root, file)
+            with open(archive_path, 'rb') as f:
+                archive = LogArchive.fromBytes(f.read())
+            for key, body in archive.items():
+                with open(os.path.join(root, key.rsplit('/', 1)[-1]), 'w') as f:
+                    f.write(body)
+                extracted += 1
+            os.remove(archive_path)
+    return extracted
+
+
+def lambda_handler(event, context):
+    event = event or {}
+    results = compact(PersisterS3(),
+                      day=event.get('day'),
+                      community_boards=event.get('community_boards'),
+                      folder=event.get('folder', RAW_LOG_FOLDER),
+                      keep_originals=event.get('keep_originals', False))
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": "application/json",
+        },
+        "body": json.dumps(results)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compact a day of S3 log objects into one archive per board')
+    parser.add_argument('--day', help='YYYY-MM-DD, defaults to yesterday')
+    parser.add_argument('--board', action='append', dest='community_boards', help='community board, repeatable, defaults to every board')
+    parser.add_argument('--folder', default=RAW_LOG_FOLDER, help='log folder to compact, e.g. summaryvotelog/')
+    parser.add_argument('--keep-originals', action='store_true', help='tag the original objects instead of deleting them')
+    parser.add_argument('--extract', metavar='DIRECTORY', help='expand downloaded archives under DIRECTORY instead of compacting')
+    args = parser.parse_args(argv)
+
+    if args.extract:
+        print(f"Extracted {extract_archives(args.extract)} objects")
+        return
+    for result in compact(PersisterS3(), day=args.day, community_boards=args.community_boards,
+                          folder=args.folder, keep_originals=args.keep_originals):
+        print(f"{result['community_board']} {result['day']}: compacted {result['compacted']} objects, "
+              f"{result['object_count']} in {result['archive_key']}")
+
+
+if __name__ == "__main__":
+    main()
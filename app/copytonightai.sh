@@ -20,5 +20,7 @@ mkdir ~/Downloads/tonightsvotes/summary/
 
 aws s3 cp s3://cb-dashboard-data-store/summaryvotelog/ ~/Downloads/tonightsvotes/summary/  --recursive --exclude "*" --include "${today}*" --include "${yesterday}*" --include "${twodaysago}*"
 aws s3 cp s3://cb-dashboard-data-store/rawvotelog/ ~/Downloads/tonightsvotes/raw/ --recursive --exclude "*" --include "${today}*" --include "${yesterday}*" --include "${twodaysago}*"
+# Expand any nightly archives back into the original files
+python3 "$(dirname "$0")/compact_logs.py" --extract ~/Downloads/tonightsvotes/
 cat ~/Downloads/tonightsvotes/summary/*.txt > ~/Downloads/tonightsvotes/combined_output.txt
 zip -r ~/Downloads/tonightsvotes.zip ~/Downloads/tonightsvotes/
@@ -1,10 +1,17 @@
-from flask import Flask, request, render_template,jsonify
+from flask import Flask, Response, request, render_template,jsonify,make_response
 from flask_cors import CORS
 from functools import wraps
+import atexit
+import gzip
+import hashlib
+import hmac
 import os
+import time
 from main import * 
 app = Flask('Voting')
 CORS(app)
+# The background worker flushes buffered raw vote logs as it goes; catch the last few on shutdown
+atexit.register(votelogger.flush)
 
 def require_auth_key(func):
     @wraps(func)
@@ -36,6 +43,14 @@ def export_votes(provided_community_board):
 
         result = api_export_votes(date,provided_community_board)
         print(result)
+        if isinstance(result, str) and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = make_response(gzip.compress(result.encode('utf-8')))
+            response.headers['Content-Type'] = 'text/plain; charset=utf-8'
+            response.headers['Content-Encoding'] = 'gzip'
+            return response
+        if isinstance(result, dict):
+            # A missing day, an unreadable listing or a persister that cannot export
+            return jsonify(result['body']), result['statusCode']
         return result
         
     except Exception as e:
@@ -47,12 +62,59 @@ def incoming_text():
     incoming_msg = request.values['Body']
     incoming_number = request.values['From']
     community_board = '7'
-    return parse_incoming_text(incoming_number,incoming_msg,community_board)
+    handle_text = lambda: parse_incoming_text(incoming_number,incoming_msg,community_board)
+    return answer_text_once(request.values.get('MessageSid'), community_board,
+                            lambda: admit_text(incoming_number, community_board, handle_text))
     
+def with_etag(result, body):
+    # Hands the ETag on as a real HTTP header, and a 304 as a real 304
+    headers = {'ETag': result['headers']['ETag'], 'Access-Control-Expose-Headers': 'ETag'}
+    if result['statusCode'] == 304:
+        return '', 304, headers
+    return body, 200, headers
+
 @app.route('/results', methods=['GET'])
 @require_auth_key
 def results(provided_community_board):
-    return api_get_results(provided_community_board)
+    since = request.args.get('since')
+    result = api_get_results(provided_community_board, if_none_match=request.headers.get('If-None-Match'),
+                             since=parse_since(since) if since is not None else None)
+    return with_etag(result, result)
+
+# Seconds an /events stream token can be used to open a stream
+EVENTS_TOKEN_SECONDS = int(os.environ.get('EVENTS_TOKEN_SECONDS', '60'))
+
+def sign_events_token(community_board, expires):
+    message = f'events:{community_board}:{expires}'.encode('utf-8')
+    return hmac.new(os.environ.get('API_KEY', '').encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+def check_events_token(token, community_board) -> bool:
+    try:
+        expires, signature = token.split('.', 1)
+        expires = int(expires)
+    except (AttributeError, ValueError):
+        return False
+    return expires >= time.time() and hmac.compare_digest(signature, sign_events_token(community_board, expires))
+
+@app.route('/eventstoken', methods=['POST'])
+@require_auth_key
+def events_token(provided_community_board):
+    # EventSource cannot set headers, so the dashboard trades its key for a token that only
+    # opens this board's stream and expires shortly, and puts that in the query string instead
+    expires = int(time.time()) + EVENTS_TOKEN_SECONDS
+    return jsonify({'token': f'{expires}.{sign_events_token(provided_community_board, expires)}', 'expiresIn': EVENTS_TOKEN_SECONDS})
+
+@app.route('/events', methods=['GET'])
+def event_stream():
+    provided_community_board = request.headers.get('x-community-board') or request.args.get('cb')
+    if provided_community_board is None:
+        return jsonify({'message': 'No Community Board'}), 404
+    if request.headers.get('x-api-key') != os.environ.get('API_KEY') and not check_events_token(request.args.get('token'), provided_community_board):
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    subscription = events.subscribe(provided_community_board)
+    return Response(events.stream(provided_community_board, subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/webresults', methods=['GET'])
 def webresults():
@@ -115,12 +177,14 @@ def stopvoting(provided_community_board):
 @app.route('/isvotingstarted', methods=['GET'])
 @require_auth_key
 def is_voting_started(provided_community_board):
-    return json.dumps(api_is_voting_started(provided_community_board))
+    result = api_is_voting_started(provided_community_board, if_none_match=request.headers.get('If-None-Match'))
+    return with_etag(result, json.dumps(result))
 
 @app.route('/members', methods=['GET'])
 @require_auth_key
 def get_members(provided_community_board):
-    return json.dumps(api_get_members(provided_community_board))
+    result = api_get_members(provided_community_board, if_none_match=request.headers.get('If-None-Match'))
+    return with_etag(result, json.dumps(result))
 
 @app.route('/members', methods=['POST'])
 @require_auth_key
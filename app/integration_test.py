@@ -30,8 +30,9 @@ def test_send_votes_to_lambda():
 
         # Create a list of futures for sending requests
         futures = [executor.submit(send_vote_request, number_to_send,"Yes") for number_to_send in number_to_send_values]
+        concurrent.futures.wait(futures)
 
-        # Calculate the elapsed time
+        # Calculate the elapsed time, once every request has come back
         elapsed_time = time.time() - start_time
         print('elapsed'+str(elapsed_time))
 
@@ -2,15 +2,32 @@ import json
 from main import *
 import base64
 from urllib.parse import parse_qs
+from DeadlineClass import Deadline, DeadlineExceeded
 
 import os
-import boto3
 
-s3 = boto3.client('s3')
 API_KEY = os.environ.get('API_KEY')
 TWILIO_API_KEY = os.environ.get('TWILIO_API_KEY')
+# Each container keeps its own token buckets unless they are shared through S3, which costs a
+# GET and a conditional PUT on every text
+SHARED_RATE_LIMITS = os.environ.get('SHARED_RATE_LIMITS', '').lower() in ('1', 'true', 'yes')
 
 def lambda_handler(event, context):
+    # Every S3 call the request makes has to fit in what is left of this invocation
+    deadline = Deadline.from_context(context)
+    try:
+        with Deadline.activate(deadline):
+            return route_request(event, context)
+    except DeadlineExceeded as e:
+        print(f"Out of time handling {event.get('rawPath')}: {str(e)}")
+        return get_deadline_exceeded_response(event)
+    finally:
+        # Raw vote logs may be buffered, and the container can be frozen as soon as we return.
+        # The flush gets whatever time is left, anything it cannot write waits for the next one
+        with Deadline.activate(deadline):
+            votelogger.flush()
+
+def route_request(event, context):
     print(str(event))
     # Extract HTTP method and path from the event
     http_method = event['requestContext']['http']['method']
@@ -27,8 +44,12 @@ def lambda_handler(event, context):
         community_board = query_string_params.get('cb', [''])[0]
         incoming_msg = query_params.get('Body', [''])[0]
         incoming_number = query_params.get('From', [''])[0]
+        message_sid = query_params.get('MessageSid', [''])[0]
+        handle_text = lambda: str(parse_incoming_text(incoming_number=incoming_number, incoming_msg=incoming_msg,
+                                                      community_board=community_board))
+        answer_text = lambda: admit_text(incoming_number, community_board, handle_text, shared_rate_limits=SHARED_RATE_LIMITS)
         return {
-            'body': str(parse_incoming_text(incoming_number, incoming_msg, community_board)),
+            'body': answer_text_once(message_sid, community_board, answer_text),
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/xml'
@@ -71,8 +92,9 @@ def lambda_handler(event, context):
             elif path == '/default/exportvotes':
                 body = json.loads(event['body'])
                 date = body.get('date')
+                gzip_body = 'gzip' in event['headers'].get('accept-encoding', '')
                 
-                return api_export_votes(date,community_board)
+                return api_export_votes(date,community_board,gzip_body=gzip_body)
             elif path == '/default/manualentry':
                 body = event['body']
                 data = json.loads(body)
@@ -86,12 +108,15 @@ def lambda_handler(event, context):
                 body = json.loads(event['body']) if event.get('body') else {}
                 return api_set_members(body,community_board)
         elif http_method == 'GET':
+            if_none_match = event['headers'].get('if-none-match')
             if path == '/default/results':
-                return api_get_results(community_board)
+                since = parse_qs(event.get('rawQueryString', '')).get('since', [None])[0]
+                return api_get_results(community_board, if_none_match=if_none_match,
+                                       since=parse_since(since) if since is not None else None)
             elif path == '/default/isvotingstarted':
-                return json.dumps(api_is_voting_started(community_board))
+                return get_wrapped_response(api_is_voting_started(community_board, if_none_match=if_none_match))
             elif path == '/default/members':
-                return json.dumps(api_get_members(community_board))
+                return get_wrapped_response(api_get_members(community_board, if_none_match=if_none_match))
         else:
             return {
                 'statusCode': 405,
@@ -106,6 +131,26 @@ def lambda_handler(event, context):
     
     
 
+def get_deadline_exceeded_response(event):
+    if event.get('rawPath') == '/default/incomingtext':
+        # Twilio gets a reply instead of a timeout, and the voter knows to text again
+        return {
+            'body': create_response_msg(NOT_CONFIRMED_MESSAGE),
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/xml'
+            }
+        }
+    return {
+        'statusCode': 503,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Retry-After': '1'
+        },
+        'body': json.dumps('Service Unavailable')
+    }
+
 def get_ok():
     response = {
         'statusCode': 200,
@@ -117,6 +162,22 @@ def get_ok():
     }
     return response
     
+def get_wrapped_response(result):
+    # The dashboard reads these responses whole, so the body stays the serialized result;
+    # the ETag and a 304 go out at the HTTP level
+    if result['statusCode'] == 304:
+        return result
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'ETag',
+            'ETag': result['headers']['ETag']
+        },
+        'body': json.dumps(result)
+    }
+
 def get_html_page():
     # Read your HTML file
     html_file_path = os.path.join(os.path.dirname(__file__), 'templates', 'index.html')
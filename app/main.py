@@ -1,62 +1,104 @@
 import json
 import csv
 import random
-from PersisterClass import PersisterS3,PersisterGlobalVariables
+import base64
+import gzip
+import hashlib
+import os
+from PersisterClass import PersisterS3,PersisterGlobalVariables,PersisterInMemory,PersisterSharedMemory,PersisterSQLite
 from VoterClass import Voter
 from VoteClass import Vote
 from VoteOptionsEnum import VoteOptions
-from twilio.twiml.messaging_response import MessagingResponse
-from VoteLoggingClass import LocalVoteLoggingClass, S3VoteLoggingClass
+from SessionStateClass import SessionState
+from RequestContextClass import RequestContext
+from EventBroadcasterClass import EventBroadcaster
+from LazySingletonClass import LazySingleton
+from VoteParserClass import VoteParser
+from TwimlClass import Twiml, TwimlTemplate
+from MessageDedupeClass import MessageDedupe
+from TextAdmissionClass import RateLimits, TextAdmission
+from VoteLoggingClass import LocalVoteLoggingClass, S3VoteLoggingClass, SQLiteVoteLoggingClass
 
 INSTRUCTIONS_MESSAGE = ' Welcome to Community Board text message voting. text yes to vote yes, no to vote no, abstain to vote abstain, cause to vote cause. '
 INVALID_INPUT_MESSAGE = 'Your vote was NOT RECORDED, your message was invalid. The only valid inputs are yes, no, abstain, cause with no caps'
 NOT_VOTING_MESSAGE = 'Not currently open for voting'
 NOT_VALID_NUMBER_MESSAGE = 'We dont have a record of your number, tell the board office your name and this number'
+AMBIGUOUS_VOTE_MESSAGE = 'Your vote was NOT RECORDED, your message matched more than one option: '
+NOT_CONFIRMED_MESSAGE = 'Your vote may NOT have been recorded, we could not confirm it in time. Please text your vote again'
 
+# The fixed replies are rendered to TwiML once, the confirmations only escape their values
+twiml = Twiml([INSTRUCTIONS_MESSAGE, INVALID_INPUT_MESSAGE, NOT_VOTING_MESSAGE, NOT_CONFIRMED_MESSAGE])
+ELECTION_CONFIRMATION = TwimlTemplate('Your vote has been recorded, you voted for {vote} for election {name}')
+RESOLUTION_CONFIRMATION = TwimlTemplate('Your vote has been recorded, you voted {vote} for resolution {name}')
+
+
+# The persister and logger are only built when first used, so importing this module (and a
+# Lambda cold start) does not pay for boto3 until a request needs S3
 
 # S3 Persister
-persister = PersisterS3()
+persister = LazySingleton(PersisterS3)
 #persister.load_members(community_board='7') # ONly run the first time
 
 # Local Persister
 #persister= PersisterGlobalVariables()
 #persister.load_members(community_board='7') 
 
+# In memory, kept per board and safe under a threaded Flask server
+#persister = PersisterInMemory()
+
+# Shared memory, for several gunicorn workers on one box
+#persister = LazySingleton(PersisterSharedMemory)
+
+# SQLite Persister, for self-hosted Flask deployments
+#persister = PersisterSQLite(db_path='cb_dashboard.db')
+
 
 # Local Vote Logger
 #votelogger = LocalVoteLoggingClass()
 
 # S3 Vote Logger
-votelogger = S3VoteLoggingClass()
+votelogger = LazySingleton(S3VoteLoggingClass)
 
-def get_vote_from_string(incoming_message, community_board):
-    vote_type = persister.get_vote_type(community_board)
+# SQLite Vote Logger, goes with the SQLite or the in memory Persister
+#votelogger = SQLiteVoteLoggingClass(persister)
 
-    if vote_type == "ELECTION":
-        candidates = persister.get_election_candidates(community_board)
-        for candidate in candidates:
-            if incoming_message.lower() == candidate.lower():
-                return candidate # Return the original casing of the candidate name
-        return None # No matching candidate found
-    else: # RESOLUTION or default
-        # Keep the existing logic for yes/no/abstain/cause
-        incoming_message_lower = incoming_message.lower()
-        if 'cause' in incoming_message_lower:
-            return VoteOptions.CAUSE
-        elif 'abstain' in incoming_message_lower:
-            return VoteOptions.ABSTAIN
-        elif 'yes' in incoming_message_lower:
-            return VoteOptions.YES
-        elif 'no' in incoming_message_lower:
-            return VoteOptions.NO
-        else:
-            return None
+# Live updates for dashboards connected to flask_app's /events stream
+events = EventBroadcaster()
+
+# Replies to recent texts by MessageSid, so a webhook Twilio retries is only answered once
+message_dedupe = MessageDedupe()
+
+# Rate limits, burst coalescing and a concurrency cap in front of parse_incoming_text. Flask
+# keeps the buckets in memory, Lambdas share them through the persister
+text_admission = TextAdmission()
+rate_limits = RateLimits()
+
+def get_request_context(community_board, ctx=None) -> RequestContext:
+    # Reuse the caller's request context so board state is only read once per request
+    return ctx if ctx is not None else RequestContext(persister, community_board)
+
+# Election names may also be matched by a unique leading part, or with up to this many typos
+VOTE_PREFIX_MATCHING = os.environ.get('VOTE_PREFIX_MATCHING', '').lower() in ('1', 'true', 'yes')
+VOTE_MAX_EDIT_DISTANCE = int(os.environ.get('VOTE_MAX_EDIT_DISTANCE', '0'))
+
+def get_vote_parser(ctx) -> VoteParser:
+    # Compiled once per session and reused for every text that comes in during it
+    session = ctx.get_session_state()
+    return VoteParser.for_session(session.vote_type, session.election_candidates,
+                                  prefix_matching=VOTE_PREFIX_MATCHING, max_edit_distance=VOTE_MAX_EDIT_DISTANCE)
 
-def summarize_votes(community_board):
-    vote_type = persister.get_vote_type(community_board)
+def get_vote_from_string(incoming_message, community_board, ctx=None):
+    # A VoteOptions for resolutions, the candidate's name as given for elections, or None
+    # when the message matches nothing or more than one option
+    ctx = get_request_context(community_board, ctx)
+    return get_vote_parser(ctx).get_vote(incoming_message)
+
+def summarize_votes(community_board, ctx=None):
+    ctx = get_request_context(community_board, ctx)
+    vote_type = ctx.get_vote_type()
 
     if vote_type == "ELECTION":
-        candidates = persister.get_election_candidates(community_board)
+        candidates = ctx.get_election_candidates()
         vote_summary = {candidate: [] for candidate in candidates}
         # Optionally, add an 'Other' category for unexpected votes, though get_vote_from_string should prevent this.
         # vote_summary['Other'] = []
@@ -68,7 +110,7 @@ def summarize_votes(community_board):
            VoteOptions.CAUSE:[]
         }
 
-    vote_log = persister.get_vote_log(community_board)
+    vote_log = ctx.get_vote_log()
     for voter_number in vote_log:
         vote_cast = vote_log[voter_number].voters_vote
         # Ensure the vote_cast key exists in vote_summary, especially if not using an 'Other' category for elections.
@@ -83,16 +125,17 @@ def summarize_votes(community_board):
 
     return vote_summary
 
-def get_summary(community_board):
-    vote_summary = summarize_votes(community_board)
-    vote_type = persister.get_vote_type(community_board)
-    pre_amble = '------------------ \nVote Summary for '+persister.get_current_vote_name(community_board) + '\n'
+def get_summary(community_board, ctx=None):
+    ctx = get_request_context(community_board, ctx)
+    vote_summary = summarize_votes(community_board, ctx=ctx)
+    vote_type = ctx.get_vote_type()
+    pre_amble = '------------------ \nVote Summary for '+ctx.get_current_vote_name() + '\n'
 
     results = 'Voting Summary:\n'
     log = '----Raw Log ----- \n'
 
     if vote_type == "ELECTION":
-        candidates = persister.get_election_candidates(community_board)
+        candidates = ctx.get_election_candidates()
         for candidate in candidates:
             results += f"{len(vote_summary.get(candidate, []))} votes for {candidate}\n"
         # Optional: Add 'Other' to summary if used
@@ -125,9 +168,8 @@ def check_if_instructions(incoming_msg):
         return True
 
 def create_response_msg(text_to_send):
-    r = MessagingResponse()
-    r.message(text_to_send)
-    return str(r)
+    # The same TwiML twilio's MessagingResponse would build, without importing twilio
+    return twiml.message(text_to_send)
 
 def extract_name_and_vote(text):
     parts = text.split('-')
@@ -144,23 +186,38 @@ def search_for_number_for_name(name_to_query,community_board):
             return voter[0]
     return None
 
+def answer_text_once(message_sid, community_board, answer_text):
+    # A retry gets the first delivery's reply, or no reply while that is still being worked out
+    return message_dedupe.answer(message_sid, community_board, persister, answer_text, Twiml.EMPTY_RESPONSE)
+
+def admit_text(incoming_number, community_board, answer_text, shared_rate_limits=False):
+    # Dropped texts get no reply at all, so a runaway phone does not get a text back for each one
+    return text_admission.answer(community_board, incoming_number, persister if shared_rate_limits else rate_limits,
+                                 answer_text, Twiml.EMPTY_RESPONSE, create_response_msg(NOT_CONFIRMED_MESSAGE))
+
 def parse_incoming_text(incoming_number,incoming_msg,community_board):
-    votelogger.log_raw_vote_to_file(incoming_number,incoming_msg,persister.get_current_vote_name(community_board),community_board)
+    ctx = RequestContext(persister, community_board)
+    # One read gives the vote name, whether voting is open, the vote type and the candidates
+    session = ctx.get_session_state()
+    votelogger.log_raw_vote_to_file(incoming_number,incoming_msg,session.current_vote_name,community_board)
 
-    members = persister.get_members(community_board)
+    members = ctx.get_members()
     if incoming_number not in members.keys():
         return create_response_msg(NOT_VALID_NUMBER_MESSAGE+' '+incoming_number)
 
     voting_member:Voter = members[incoming_number] or None
-    if not persister.get_currently_in_a_voting_session(community_board):
+    if not session.currently_in_a_voting_session:
         return create_response_msg(NOT_VOTING_MESSAGE)
     if check_if_instructions(incoming_msg):
         return create_response_msg(INSTRUCTIONS_MESSAGE)
-    vote_cast = get_vote_from_string(incoming_msg, community_board) # pass community_board
+    vote_cast = get_vote_from_string(incoming_msg, community_board, ctx=ctx) # pass community_board
     if vote_cast == None:
-        current_vote_type = persister.get_vote_type(community_board)
-        if current_vote_type == "ELECTION":
-            candidates = persister.get_election_candidates(community_board)
+        matches = get_vote_parser(ctx).parse(incoming_msg)
+        if len(matches) > 1:
+            options = ", ".join(match.value if isinstance(match, VoteOptions) else match for match in matches)
+            return create_response_msg(AMBIGUOUS_VOTE_MESSAGE + options + '. Text just one')
+        if session.vote_type == "ELECTION":
+            candidates = session.election_candidates
             candidate_names = ", ".join(candidates) if candidates else "No candidates listed"
             election_error_message = (
                 f"Your vote was NOT RECORDED, your message was invalid. "
@@ -172,107 +229,206 @@ def parse_incoming_text(incoming_number,incoming_msg,community_board):
             return create_response_msg(INVALID_INPUT_MESSAGE)
     
 
-    persister.add_to_vote_log(key=voting_member.sms_number,value=Vote(voting_member,vote_cast),community_board=community_board)
+    # Only dashboards listening for events need the voter's previous option
+    publish_events = events.has_subscribers(community_board)
+    previous_option = ctx.get_tally().voters.get(voting_member.sms_number) if publish_events else None
+    ctx.add_to_vote_log(key=voting_member.sms_number,value=Vote(voting_member,vote_cast))
+    if publish_events:
+        publish_vote_event(ctx, voting_member, previous_option)
 
-    r = MessagingResponse()
-    vote_type = persister.get_vote_type(community_board)
-    if vote_type == "ELECTION":
+    if session.vote_type == "ELECTION":
         # For elections, vote_cast is a string (candidate name)
-        r.message(f'Your vote has been recorded, you voted for {str(vote_cast)} for election {persister.get_current_vote_name(community_board)}')
+        return ELECTION_CONFIRMATION.render(vote=vote_cast, name=session.current_vote_name)
     else:
         # For resolutions, vote_cast is a VoteOptions enum
-        r.message(f'Your vote has been recorded, you voted {vote_cast.value} for resolution {persister.get_current_vote_name(community_board)}')
-    return str(r)
-
-def true_if_members_list_zero(community_board):
-    members = persister.get_members(community_board)
+        return RESOLUTION_CONFIRMATION.render(vote=vote_cast.value, name=session.current_vote_name)
+
+def publish_vote_event(ctx, voter, previous_option):
+    # Just the options the vote touched, dashboards patch them into the results they have
+    tally = ctx.get_tally()
+    option = tally.voters.get(voter.sms_number)
+    changed_options = {changed: tally.get_voters(changed) for changed in (previous_option, option) if changed is not None}
+    events.publish(ctx.community_board, 'vote', {'version': tally.version, 'voted': voter.name, 'options': changed_options})
+
+def publish_session_events(community_board, ctx):
+    if not events.has_subscribers(community_board):
+        return
+    events.publish(community_board, 'session', json.loads(api_is_voting_started(community_board, ctx=ctx)['body']))
+    events.publish(community_board, 'results', json.loads(api_get_results(community_board, ctx=ctx)['body']))
+
+def true_if_members_list_zero(community_board, ctx=None):
+    members = get_request_context(community_board, ctx).get_members()
     return len(members) == 0
 
 #### API SECTION ###
 
-def api_get_results(community_board):
-    from enum import Enum
-    custom_encoder = lambda obj: obj.value if isinstance(obj, Enum) else obj #TODO , shouldnt this be apart of the class
-    summary = summarize_votes(community_board)
-    converted_summary = {custom_encoder(key): value for key, value in summary.items()}
+def make_etag(*versions):
+    # Strong validator over the per-board state versions a response is built from
+    return '"' + hashlib.sha1(json.dumps(versions, sort_keys=True).encode('utf-8')).hexdigest() + '"'
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in (etag, '*'):
+            return True
+    return False
+
+def get_not_modified_response(etag):
+    return {
+        "statusCode": 304,
+        "headers": {
+            "ETag": etag,
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Expose-Headers": "ETag"
+        },
+        "body": ""
+    }
 
-    # Get all members and vote log
-    all_members_dict = persister.get_members(community_board)
-    vote_log_dict = persister.get_vote_log(community_board)
-    
-    # Determine who hasn't voted
-    voted_sms_numbers = set(vote_log_dict.keys())
-    not_voted_names = []
-    if all_members_dict: # Check if all_members_dict is not None and not empty
-        for sms_number, voter_object in all_members_dict.items():
-            if sms_number not in voted_sms_numbers:
-                not_voted_names.append(voter_object.name)
-            
-    converted_summary["not_voted"] = not_voted_names
+def api_get_results(community_board, ctx=None, if_none_match=None, since=None):
+    ctx = get_request_context(community_board, ctx)
+    session = ctx.get_session_state()
+    # Read counts and voter lists straight from the tally instead of rebuilding them from the vote log
+    tally = ctx.get_tally()
+    # The tally's version moves on with every vote and every cleared session
+    etag = make_etag('results', session.toJSON(), tally.version, ctx.get_members_version(), since)
+    if etag_matches(if_none_match, etag):
+        return get_not_modified_response(etag)
+
+    if session.vote_type == "ELECTION":
+        options = session.election_candidates
+    else: # RESOLUTION or default
+        options = [vote_option.value for vote_option in VoteOptions]
+
+    if since is None:
+        body = get_full_results(options, tally, ctx)
+    else:
+        body = get_results_since(since, options, tally, ctx)
 
     response = {
         "statusCode": 200,
         "headers": {
             "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*"
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Expose-Headers": "ETag",
+            "ETag": etag
         },
-        "body": json.dumps(converted_summary)
+        "body": json.dumps(body)
     }
     return response
 
+def parse_since(value) -> int:
+    # A missing or garbled sequence just means the caller gets the full results
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+def get_full_results(options, tally, ctx):
+    converted_summary = {option: tally.get_voters(option) for option in options}
+
+    # Determine who hasn't voted
+    all_members_dict = ctx.get_members()
+    not_voted_names = []
+    if all_members_dict: # Check if all_members_dict is not None and not empty
+        for sms_number, voter_object in all_members_dict.items():
+            if not tally.has_voted(sms_number):
+                not_voted_names.append(voter_object.name)
+
+    converted_summary["not_voted"] = not_voted_names
+    return converted_summary
+
+def get_results_since(since, options, tally, ctx):
+    # Votes are numbered by the tally version they landed at, so a dashboard that has seen
+    # everything up to since only needs the votes after it. It gets the full results
+    # instead when since is from another session or the tally cannot say what changed
+    body = {
+        "sequence": tally.version,
+        "members_version": ctx.get_members_version(),
+        "counts": {option: tally.get_count(option) for option in options}
+    }
+    if tally.first_version <= since <= tally.version and tally.has_sequences():
+        body["full"] = False
+        body["votes"] = tally.get_votes_since(since)
+    else:
+        body["full"] = True
+        body["results"] = get_full_results(options, tally, ctx)
+    return body
 
 def api_testing(number_sms,vote_to_send,community_board):
     return parse_incoming_text(number_sms, vote_to_send,community_board)
 
-def api_start_voting(title, community_board, vote_type="RESOLUTION", candidates=None):
-    persister.set_current_vote_name(title,community_board)
-    persister.set_vote_type(vote_type, community_board)
-    if vote_type == "ELECTION" and candidates:
-        persister.set_election_candidates(candidates, community_board)
-    elif vote_type == "RESOLUTION":
-        persister.set_election_candidates([], community_board)
-    persister.set_currently_in_a_voting_session(True,community_board)
-
-def api_stop_voting(community_board):
-    votelogger.log_vote_summary_to_file(current_vote_name=persister.get_current_vote_name(community_board),summary=get_summary(community_board),community_board=community_board)
-    persister.set_current_vote_name('',community_board)
-    persister.set_currently_in_a_voting_session(False,community_board)
-    persister.clear_vote_log(community_board)
-    # Reset vote type and clear candidates
-    persister.set_vote_type("RESOLUTION", community_board)
-    persister.set_election_candidates([], community_board)
-
-def api_is_voting_started(community_board):
-    vote_type = persister.get_vote_type(community_board)
-    candidates = persister.get_election_candidates(community_board)
+def api_start_voting(title, community_board, vote_type="RESOLUTION", candidates=None, ctx=None):
+    ctx = get_request_context(community_board, ctx)
+    # The whole session is written in one go so a text arriving mid-start never sees a mix of old and new state
+    session = SessionState(
+        current_vote_name=title,
+        currently_in_a_voting_session=True,
+        vote_type=vote_type,
+        election_candidates=candidates if vote_type == "ELECTION" and candidates else []
+    )
+    ctx.set_session_state(session)
+    publish_session_events(community_board, ctx)
+
+def api_stop_voting(community_board, ctx=None):
+    ctx = get_request_context(community_board, ctx)
+    votelogger.log_vote_summary_to_file(current_vote_name=ctx.get_current_vote_name(),summary=get_summary(community_board, ctx=ctx),community_board=community_board)
+    # Close the session and reset vote type and candidates in a single write
+    ctx.set_session_state(SessionState())
+    ctx.clear_vote_log()
+    publish_session_events(community_board, ctx)
+
+def api_is_voting_started(community_board, ctx=None, if_none_match=None):
+    session = get_request_context(community_board, ctx).get_session_state()
+    etag = make_etag('isvotingstarted', session.toJSON())
+    if etag_matches(if_none_match, etag):
+        return get_not_modified_response(etag)
     response_body = {
-        "isVotingStarted": persister.get_currently_in_a_voting_session(community_board),
-        "currentVoteName": persister.get_current_vote_name(community_board),
-        "voteType": vote_type,
-        "electionCandidates": candidates if vote_type == "ELECTION" else []
+        "isVotingStarted": session.currently_in_a_voting_session,
+        "currentVoteName": session.current_vote_name,
+        "voteType": session.vote_type,
+        "electionCandidates": session.election_candidates if session.vote_type == "ELECTION" else []
     }
     response = {
         "statusCode": 200,
         "headers": {
             "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*" # Added for consistency with other API endpoints
+            "Access-Control-Allow-Origin": "*", # Added for consistency with other API endpoints
+            "Access-Control-Expose-Headers": "ETag",
+            "ETag": etag
         },
         "body": json.dumps(response_body) # Ensure body is json string
     }
     return response
 
-def api_export_votes(date, community_board):
+def get_gzip_response(text, content_type="text/plain; charset=utf-8"):
+    # API Gateway passes binary bodies through base64 encoded
+    return {
+        "statusCode": 200,
+        "headers": {
+            "Content-Type": content_type,
+            "Content-Encoding": "gzip",
+        },
+        "body": base64.b64encode(gzip.compress(text.encode('utf-8'))).decode('ascii'),
+        "isBase64Encoded": True
+    }
+
+def api_export_votes(date, community_board, gzip_body=False):
     try:
         # Convert YYYY-MM-DD to YYYY_MM_DD format for file name prefix
         formatted_date = date.replace('-', '_')
         prefix = f'summaryvotelog/{community_board}/{formatted_date}'
         
         try:
-            # List all keys starting with the given prefix.
-            # Note: Adjust this to the appropriate method for your persister.
-            keys = persister.list_objects(prefix=prefix)
+            # Get the content of every object starting with the given prefix, in key order,
+            # including any that the nightly compaction has moved into the day's archive.
+            # The persister fetches them concurrently.
+            contents = [content for key, content in persister.iter_object_contents(prefix)]
             
-            if not keys:
+            if not contents:
                 return {
                     "statusCode": 404,
                     "headers": {
@@ -281,25 +437,30 @@ def api_export_votes(date, community_board):
                     "body": {'error': f'No vote summary found for {date}'}
                 }
             
-            aggregated_content = ""
-            # Loop through each file key, get its content, and concatenate it.
-            for key in keys:
-                file_content = persister.get_object(key=key)
-                aggregated_content += file_content + "\n"
-            
-            # Optionally, you could trim the trailing newline here.
-            aggregated_content = aggregated_content.strip()
+            aggregated_content = "\n".join(contents).strip()
             print(aggregated_content)
+            if gzip_body:
+                return get_gzip_response(aggregated_content)
             return aggregated_content
         
+        except NotImplementedError:
+            # PersisterSharedMemory only keeps the live vote, there are no logs to export
+            return {
+                "statusCode": 501,
+                "headers": {
+                    "Content-Type": "application/json",
+                },
+                "body": {'error': 'Exporting votes is not supported by this persister'}
+            }
         except Exception as inner_exception:
+            # Some summaries may already have been read, so this is not a missing day
             print(f"Error fetching files: {str(inner_exception)}")
             return {
-                "statusCode": 404,
+                "statusCode": 500,
                 "headers": {
                     "Content-Type": "application/json",
                 },
-                "body": {'error': f'No vote summary found for {date}'}
+                "body": {'error': f'Could not read every vote summary for {date}'}
             }
             
     except Exception as e:
@@ -312,8 +473,12 @@ def api_export_votes(date, community_board):
             "body": {'error': 'Internal server error'}
         }
 
-def api_get_members(community_board):
-    members = persister.get_members(community_board)
+def api_get_members(community_board, ctx=None, if_none_match=None):
+    ctx = get_request_context(community_board, ctx)
+    etag = make_etag('members', ctx.get_members_version())
+    if etag_matches(if_none_match, etag):
+        return get_not_modified_response(etag)
+    members = ctx.get_members()
     # Convert the members dictionary to a serializable format
     serialized_members = {}
     for number, voter in members.items():
@@ -326,13 +491,15 @@ def api_get_members(community_board):
         "statusCode": 200,
         "headers": {
             "Content-Type": "application/json",
-            "Access-Control-Allow-Origin": "*"
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Expose-Headers": "ETag",
+            "ETag": etag
         },
         "body": json.dumps(serialized_members)
     }
     return response
 
-def api_set_members(members_data,community_board):
+def api_set_members(members_data,community_board, ctx=None):
     try:
         # Convert the incoming JSON data back to Voter objects
         new_members = {}
@@ -343,7 +510,7 @@ def api_set_members(members_data,community_board):
             )
         
         # Update the members in the persister
-        persister.set_members(new_members,community_board)
+        get_request_context(community_board, ctx).set_members(new_members)
         
         response = {
             "statusCode": 200,
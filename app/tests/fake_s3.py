@@ -0,0 +1,160 @@
+import hashlib
+import io
+import threading
+import time
+from collections import Counter
+import boto3
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+
+class FakeS3:
+    '''
+    In-memory stand-in for the parts of the S3 API the app uses.
+
+    Exposes both a client-style interface (get_object, put_object, list_objects_v2, ...)
+    and a resource-style interface (Object(bucket, key).get()/put()), counts every
+    round-trip and can inject latency so tests and benchmarks can measure call counts
+    and wall-clock without touching AWS.
+    '''
+
+    def __init__(self, latency=0.0):
+        # latency is either a number of seconds or a callable(operation, key) -> seconds
+        self.latency = latency
+        self.objects = {}
+        self.tags = {}
+        self.calls = Counter()
+        # Round-trips per (operation, key), for asserting a key is fetched at most once
+        self.key_calls = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def round_trips(self):
+        return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls = Counter()
+            self.key_calls = Counter()
+
+    def _round_trip(self, operation, key=None):
+        with self.lock:
+            self.calls[operation] += 1
+            self.key_calls[(operation, key)] += 1
+        delay = self.latency(operation, key) if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+
+    def _error(self, code, operation, status):
+        return ClientError({'Error': {'Code': code, 'Message': code},
+                            'ResponseMetadata': {'HTTPStatusCode': status}}, operation)
+
+    def _etag(self, body):
+        return '"' + hashlib.md5(body).hexdigest() + '"'
+
+    # Client interface
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, IfMatch=None, **kwargs):
+        self._round_trip('get_object', Key)
+        with self.lock:
+            if Key not in self.objects:
+                raise self._error('NoSuchKey', 'GetObject', 404)
+            body = self.objects[Key]
+        etag = self._etag(body)
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise self._error('304', 'GetObject', 304)
+        if IfMatch is not None and IfMatch != etag:
+            raise self._error('PreconditionFailed', 'GetObject', 412)
+        return {'Body': io.BytesIO(body), 'ETag': etag, 'ContentLength': len(body)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._round_trip('head_object', Key)
+        with self.lock:
+            if Key not in self.objects:
+                raise self._error('404', 'HeadObject', 404)
+            body = self.objects[Key]
+        return {'ETag': self._etag(body), 'ContentLength': len(body)}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self._round_trip('put_object', Key)
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        with self.lock:
+            current = self.objects.get(Key)
+            if IfNoneMatch == '*' and current is not None:
+                raise self._error('PreconditionFailed', 'PutObject', 412)
+            if IfMatch is not None and (current is None or self._etag(current) != IfMatch):
+                raise self._error('PreconditionFailed', 'PutObject', 412)
+            self.objects[Key] = Body
+        return {'ETag': self._etag(Body)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._round_trip('delete_object', Key)
+        with self.lock:
+            self.objects.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._round_trip('delete_objects')
+        with self.lock:
+            for item in Delete['Objects']:
+                self.objects.pop(item['Key'], None)
+        return {'Deleted': Delete['Objects']}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, Delimiter=None, **kwargs):
+        self._round_trip('list_objects_v2', Prefix)
+        with self.lock:
+            # Like S3, the continuation token marks a position in key order, so deleting
+            # already-listed keys between pages does not skip anything
+            keys = sorted(key for key in self.objects
+                          if key.startswith(Prefix) and (ContinuationToken is None or key > ContinuationToken))
+            if Delimiter:
+                # Keys with the delimiter after the prefix roll up into one common prefix each
+                rolled_up = sorted({Prefix + key[len(Prefix):].split(Delimiter, 1)[0] + Delimiter
+                                    for key in keys if Delimiter in key[len(Prefix):]})
+                keys = [key for key in keys if Delimiter not in key[len(Prefix):]]
+            page = keys[:MaxKeys]
+            contents = [{'Key': key, 'Size': len(self.objects[key])} for key in page]
+        response = {'KeyCount': len(page), 'IsTruncated': len(keys) > MaxKeys}
+        if contents:
+            response['Contents'] = contents
+        if Delimiter and rolled_up:
+            response['CommonPrefixes'] = [{'Prefix': prefix} for prefix in rolled_up]
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def put_object_tagging(self, Bucket, Key, Tagging, **kwargs):
+        self._round_trip('put_object_tagging', Key)
+        with self.lock:
+            if Key not in self.objects:
+                raise self._error('NoSuchKey', 'PutObjectTagging', 404)
+            self.tags[Key] = {tag['Key']: tag['Value'] for tag in Tagging['TagSet']}
+        return {}
+
+    # Resource interface
+
+    def Object(self, bucket_name, key):
+        return FakeS3Object(self, bucket_name, key)
+
+
+class FakeS3Object:
+    def __init__(self, fake_s3, bucket_name, key):
+        self.fake_s3 = fake_s3
+        self.bucket_name = bucket_name
+        self.key = key
+
+    def get(self, **kwargs):
+        return self.fake_s3.get_object(Bucket=self.bucket_name, Key=self.key, **kwargs)
+
+    def put(self, Body, **kwargs):
+        return self.fake_s3.put_object(Bucket=self.bucket_name, Key=self.key, Body=Body, **kwargs)
+
+
+def stubbed_client():
+    '''
+    A real S3 client and a Stubber for it. Unlike FakeS3, the stubbed client rejects any
+    parameter the installed botocore does not know, e.g. IfMatch on put_object before 1.35.69
+    '''
+    client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test')
+    return client, Stubber(client)
@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import MagicMock
+from app.LazySingletonClass import LazySingleton
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Generous enough for a slow CI box, far below the half second boto3 and twilio used to cost
+IMPORT_BUDGET_SECONDS = 0.25
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import lambda_app
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": sorted(name for name in ("boto3", "twilio", "pytz") if name in sys.modules)}))
+'''
+
+
+class TestLambdaColdStart(unittest.TestCase):
+    def import_lambda_app(self):
+        # A fresh interpreter, so nothing another test imported is already loaded
+        env = dict(os.environ, API_KEY='test', TWILIO_API_KEY='test')
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=APP_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_import_does_not_load_boto3_twilio_or_pytz(self):
+        self.assertEqual(self.import_lambda_app()['modules'], [])
+
+    def test_reply_does_not_load_twilio(self):
+        env = dict(os.environ, API_KEY='test', TWILIO_API_KEY='test')
+        script = 'import sys, main; main.create_response_msg(main.NOT_VOTING_MESSAGE); print("twilio" in sys.modules)'
+        output = subprocess.run([sys.executable, '-c', script], cwd=APP_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip().splitlines()[-1], 'False')
+
+    def test_import_is_within_budget(self):
+        # Best of three, the first run also pays for compiling to .pyc
+        seconds = min(self.import_lambda_app()['seconds'] for _ in range(3))
+        self.assertLess(seconds, IMPORT_BUDGET_SECONDS)
+
+
+class TestLazySingleton(unittest.TestCase):
+    def test_instance_is_created_on_first_use_only(self):
+        factory = MagicMock()
+        singleton = LazySingleton(factory)
+        self.assertIsNone(singleton.peek())
+        factory.assert_not_called()
+
+        singleton.get_members('7')
+        singleton.get_members('8')
+
+        factory.assert_called_once_with()
+        self.assertIs(singleton.peek(), factory.return_value)
+        self.assertEqual(factory.return_value.get_members.call_count, 2)
+
+    def test_attributes_are_set_on_the_instance(self):
+        class Target:
+            bucket_name = 'default'
+        singleton = LazySingleton(Target)
+        singleton.bucket_name = 'test-bucket'
+        self.assertEqual(singleton.get().bucket_name, 'test-bucket')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from app import compact_logs
+from app import main
+from app.LogArchiveClass import LogArchive
+from app.PersisterClass import PersisterS3
+from fake_s3 import FakeS3
+
+
+class TestCompactLogs(unittest.TestCase):
+    def setUp(self):
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = PersisterS3()
+        self.fake_s3 = FakeS3()
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+
+    def seed_raw_log(self, community_board, day, count):
+        for i in range(count):
+            key = f'rawvotelog/{community_board}/{day}_20:{i // 60:02d}:{i % 60:02d}_+1555{i:07d}.txt'
+            self.fake_s3.objects[key] = f'{day}_20:00:00,+1555{i:07d},yes,Budget\n'.encode('utf-8')
+        batch_key = f'rawvotelog/{community_board}/{day}_21:00:00_0a1b2c.ndjson'
+        self.fake_s3.objects[batch_key] = (json.dumps({'incoming_number': '+1', 'incoming_msg': 'no'}) + '\n').encode('utf-8')
+
+    def contents(self, prefix):
+        return list(self.persister.iter_object_contents(prefix))
+
+    def test_compacts_a_day_into_one_archive(self):
+        self.seed_raw_log('7', '2024_05_01', 50)
+        self.seed_raw_log('7', '2024_05_02', 3)
+        before = self.contents('rawvotelog/7/2024_05_01')
+
+        result = compact_logs.compact_day(self.persister, '7', '2024-05-01')
+
+        self.assertEqual(result['compacted'], 51)
+        day_keys = [key for key in self.fake_s3.objects if key.startswith('rawvotelog/7/2024_05_01')]
+        self.assertEqual(day_keys, ['rawvotelog/7/2024_05_01.ndjson.gz'])
+        # Other days are left alone
+        self.assertEqual(len([key for key in self.fake_s3.objects if key.startswith('rawvotelog/7/2024_05_02')]), 4)
+        # And the originals read back exactly as they were
+        self.assertEqual(self.contents('rawvotelog/7/2024_05_01'), before)
+
+    def test_archive_starts_with_an_index_header(self):
+        self.seed_raw_log('7', '2024_05_01', 5)
+
+        compact_logs.compact_day(self.persister, '7', '2024_05_01')
+
+        lines = gzip.decompress(self.fake_s3.objects['rawvotelog/7/2024_05_01.ndjson.gz']).decode('utf-8').splitlines()
+        index = json.loads(lines[0])['index']
+        self.assertEqual(index['community_board'], '7')
+        self.assertEqual(index['day'], '2024_05_01')
+        self.assertEqual(index['object_count'], 6)
+        self.assertEqual(len(lines), 7)
+
+    def test_rerun_folds_in_objects_logged_since(self):
+        self.seed_raw_log('7', '2024_05_01', 5)
+        compact_logs.compact_day(self.persister, '7', '2024_05_01')
+        late_key = 'rawvotelog/7/2024_05_01_23:59:59_+15550000099.txt'
+        self.fake_s3.objects[late_key] = b'late,+15550000099,yes,Budget\n'
+
+        result = compact_logs.compact_day(self.persister, '7', '2024_05_01')
+
+        self.assertEqual(result['compacted'], 1)
+        self.assertEqual(result['object_count'], 7)
+        self.assertNotIn(late_key, self.fake_s3.objects)
+        self.assertIn((late_key, 'late,+15550000099,yes,Budget\n'), self.contents('rawvotelog/7/2024_05_01'))
+
+    def test_keep_originals_tags_instead_of_deleting(self):
+        self.seed_raw_log('7', '2024_05_01', 5)
+
+        compact_logs.compact_day(self.persister, '7', '2024_05_01', keep_originals=True)
+
+        originals = [key for key in self.fake_s3.objects if key.startswith('rawvotelog/7/2024_05_01_')]
+        self.assertEqual(len(originals), 6)
+        for key in originals:
+            self.assertEqual(self.fake_s3.tags[key], {'compacted': 'rawvotelog/7/2024_05_01.ndjson.gz'})
+        # Nothing is read twice when both the original and its archived copy exist
+        self.assertEqual(len(self.contents('rawvotelog/7/2024_05_01')), 6)
+        self.fake_s3.reset_calls()
+        result = compact_logs.compact_day(self.persister, '7', '2024_05_01', keep_originals=True)
+        self.assertEqual(result['compacted'], 0)
+        self.assertEqual(self.fake_s3.calls['put_object'], 0)
+
+    def test_compact_finds_every_board(self):
+        self.seed_raw_log('7', '2024_05_01', 2)
+        self.seed_raw_log('12', '2024_05_01', 2)
+
+        results = compact_logs.compact(self.persister, day='2024-05-01')
+
+        self.assertEqual(sorted(result['community_board'] for result in results), ['12', '7'])
+        self.assertIn('rawvotelog/12/2024_05_01.ndjson.gz', self.fake_s3.objects)
+        self.assertIn('rawvotelog/7/2024_05_01.ndjson.gz', self.fake_s3.objects)
+
+    def test_export_votes_reads_compacted_summaries(self):
+        for name in ('Budget', 'Parks'):
+            self.fake_s3.objects[f'summaryvotelog/7/2024_05_01_{name}_summary.txt'] = f'{name} summary'.encode('utf-8')
+        with patch.object(main, 'persister', self.persister):
+            expected = main.api_export_votes('2024-05-01', '7')
+            compact_logs.compact_day(self.persister, '7', '2024-05-01', folder='summaryvotelog/')
+            self.assertEqual(main.api_export_votes('2024-05-01', '7'), expected)
+        self.assertEqual(expected, 'Budget summary\nParks summary')
+
+    def test_export_votes_fails_on_an_unreadable_archive(self):
+        for name in ('Budget', 'Parks'):
+            self.fake_s3.objects[f'summaryvotelog/7/2024_05_01_{name}_summary.txt'] = f'{name} summary'.encode('utf-8')
+        compact_logs.compact_day(self.persister, '7', '2024-05-01', folder='summaryvotelog/')
+        archive_key = 'summaryvotelog/7/2024_05_01.ndjson.gz'
+        with patch.object(main, 'persister', self.persister):
+            self.fake_s3.objects[archive_key] = b'not gzip'
+            self.assertEqual(main.api_export_votes('2024-05-01', '7')['statusCode'], 500)
+            with patch.object(self.persister, 'get_object_bytes', return_value=None):
+                self.assertEqual(main.api_export_votes('2024-05-01', '7')['statusCode'], 500)
+
+    def test_extract_archives_restores_original_files(self):
+        archive = LogArchive(community_board='7', day='2024_05_01')
+        archive.add('rawvotelog/7/2024_05_01_20:00:00_+1.txt', '2024_05_01_20:00:00,+1,yes,Budget\n')
+        archive.add('rawvotelog/7/2024_05_01_21:00:00_abc.ndjson', '{"incoming_number": "+2"}\n')
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, '7'))
+            with open(os.path.join(directory, '7', '2024_05_01.ndjson.gz'), 'wb') as f:
+                f.write(archive.toBytes())
+
+            self.assertEqual(compact_logs.extract_archives(directory), 2)
+
+            self.assertEqual(sorted(os.listdir(os.path.join(directory, '7'))),
+                             ['2024_05_01_20:00:00_+1.txt', '2024_05_01_21:00:00_abc.ndjson'])
+            with open(os.path.join(directory, '7', '2024_05_01_20:00:00_+1.txt')) as f:
+                self.assertEqual(f.read(), '2024_05_01_20:00:00,+1,yes,Budget\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
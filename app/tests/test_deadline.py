@@ -0,0 +1,160 @@
+import base64
+import json
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from urllib.parse import urlencode
+from fake_s3 import FakeS3
+
+# lambda_app imports the app modules by their top-level names, so use the same ones here
+import lambda_app
+from DeadlineClass import Deadline, DeadlineExceeded
+
+
+def lambda_context(remaining_ms):
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = remaining_ms
+    return context
+
+
+def slow_writes(seconds):
+    # Reads are quick, the vote and its tally are slow to write
+    def latency(operation, key):
+        return seconds if operation == 'put_object' and key and ('tally' in key or 'vote_log/' in key) else 0
+    return latency
+
+
+class TestDeadline(unittest.TestCase):
+    def test_from_context_keeps_a_reserve(self):
+        deadline = Deadline.from_context(lambda_context(3000), reserve_ms=1000)
+        self.assertAlmostEqual(deadline.remaining(), 2.0, delta=0.1)
+        self.assertIsNone(Deadline.from_context(None))
+
+    def test_call_returns_the_result_in_time(self):
+        self.assertEqual(Deadline(1.0).call(lambda x: x * 2, 21), 42)
+
+    def test_call_is_cut_off_at_the_deadline(self):
+        start = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            Deadline(0.05).call(time.sleep, 1.0)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_expired_deadline_does_not_start_calls(self):
+        deadline = Deadline(0)
+        fn = MagicMock()
+        with self.assertRaises(DeadlineExceeded):
+            deadline.call(fn)
+        fn.assert_not_called()
+
+    def test_bind_carries_the_deadline_to_another_thread(self):
+        deadline = Deadline(1.0)
+        with Deadline.activate(deadline):
+            current = Deadline.bind(Deadline.current)
+        self.assertIsNone(Deadline.current())
+        self.assertIs(Deadline.get_executor().submit(current).result(), deadline)
+
+
+class TestDeadlineAwareLambda(unittest.TestCase):
+    def setUp(self):
+        self.fake_s3 = FakeS3()
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = lambda_app.PersisterS3()
+            # A long batch age so only the handler's flush writes, not the background worker
+            self.logger = lambda_app.S3VoteLoggingClass(buffered=False, max_batch_age=60)
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+        self.logger.s3_resource = self.fake_s3
+        self.community_board = 'cb_deadline'
+        self.persister.set_members({'+15550000001': lambda_app.Voter('Test User', '+15550000001')}, self.community_board)
+        self.persister.set_session_state(lambda_app.SessionState(current_vote_name='Budget', currently_in_a_voting_session=True),
+                                         self.community_board)
+        self.patchers = [patch('lambda_app.persister', new=self.persister),
+                         patch('main.persister', new=self.persister),
+                         patch('lambda_app.votelogger', new=self.logger),
+                         patch('main.votelogger', new=self.logger),
+                         patch('lambda_app.TWILIO_API_KEY', 'test_twilio_key'),
+                         patch('lambda_app.API_KEY', 'test_api_key')]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def text_event(self, body):
+        form = urlencode({'Body': body, 'From': '+15550000001'})
+        return {
+            'rawPath': '/default/incomingtext',
+            'rawQueryString': f'auth=test_twilio_key&cb={self.community_board}',
+            'requestContext': {'http': {'method': 'POST'}},
+            'headers': {},
+            'body': base64.b64encode(form.encode('utf-8')).decode('utf-8')
+        }
+
+    def results_event(self):
+        return {
+            'rawPath': '/default/results',
+            'rawQueryString': '',
+            'requestContext': {'http': {'method': 'GET'}},
+            'headers': {'x-api-key': 'test_api_key', 'x-community-board': self.community_board}
+        }
+
+    def raw_log_keys(self):
+        return [key for key in self.fake_s3.objects if key.startswith('rawvotelog/')]
+
+    def test_text_is_recorded_when_s3_is_quick(self):
+        response = lambda_app.lambda_handler(self.text_event('yes'), lambda_context(10000))
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertIn('Your vote has been recorded', response['body'])
+        self.assertEqual(len(self.raw_log_keys()), 1)
+
+    def test_slow_s3_gets_an_acknowledgement_before_the_deadline(self):
+        self.fake_s3.latency = slow_writes(2.0)
+
+        start = time.monotonic()
+        response = lambda_app.lambda_handler(self.text_event('yes'), lambda_context(1500))
+        elapsed = time.monotonic() - start
+
+        # 1500 ms left less the 1000 ms reserve, rather than the two seconds S3 takes
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['headers']['Content-Type'], 'application/xml')
+        self.assertIn(lambda_app.NOT_CONFIRMED_MESSAGE, response['body'])
+
+    def test_raw_logging_is_deferred_when_time_is_short(self):
+        self.fake_s3.latency = slow_writes(2.0)
+
+        lambda_app.lambda_handler(self.text_event('yes'), lambda_context(1500))
+
+        # Nothing was written in the request, the line waits in the buffer instead
+        self.assertEqual(self.raw_log_keys(), [])
+        self.assertEqual(self.logger.deferred, 1)
+        self.assertEqual([record['incoming_msg'] for _, record in self.logger.buffer], ['yes'])
+        # And goes out with the next flush that has time for it
+        self.logger.flush()
+        self.assertEqual(len(self.raw_log_keys()), 1)
+
+    def test_slow_results_are_a_503(self):
+        self.fake_s3.latency = 2.0
+
+        start = time.monotonic()
+        response = lambda_app.lambda_handler(self.results_event(), lambda_context(1500))
+
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(response['statusCode'], 503)
+        self.assertEqual(response['headers']['Retry-After'], '1')
+
+    def test_flush_out_of_time_keeps_the_batch(self):
+        self.logger.buffered = True
+        self.logger.log_raw_vote_to_file('+15550000001', 'no', 'Budget', self.community_board)
+        self.fake_s3.latency = 2.0
+
+        with Deadline.activate(Deadline(0.05)):
+            self.logger.flush()
+
+        self.assertEqual(len(self.logger.buffer), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
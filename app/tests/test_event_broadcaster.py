@@ -0,0 +1,154 @@
+import json
+import unittest
+from unittest.mock import MagicMock, patch
+from app import main
+from app.EventBroadcasterClass import EventBroadcaster
+
+
+def parse_message(message):
+    fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+    return fields['event'], json.loads(fields['data'])
+
+
+class TestEventBroadcaster(unittest.TestCase):
+    def setUp(self):
+        self.broadcaster = EventBroadcaster(heartbeat_interval=0.05, max_queued_events=3)
+
+    def test_publish_reaches_every_subscriber_of_the_board_only(self):
+        first = self.broadcaster.subscribe('7')
+        second = self.broadcaster.subscribe('7')
+        other_board = self.broadcaster.subscribe('8')
+
+        self.assertEqual(self.broadcaster.publish('7', 'vote', {'voted': 'Alice'}), 2)
+
+        message = first.get_nowait()
+        self.assertEqual(parse_message(message), ('vote', {'voted': 'Alice'}))
+        # The same encoded message is shared by every subscriber
+        self.assertIs(second.get_nowait(), message)
+        self.assertTrue(other_board.empty())
+
+    def test_stream_sends_heartbeats_and_unsubscribes_when_closed(self):
+        subscription = self.broadcaster.subscribe('7')
+        stream = self.broadcaster.stream('7', subscription)
+
+        self.assertEqual(next(stream), 'retry: 5000\n\n')
+        self.assertEqual(parse_message(next(stream)), ('heartbeat', {}))
+        self.broadcaster.publish('7', 'results', {'Yes': []})
+        self.assertEqual(parse_message(next(stream)), ('results', {'Yes': []}))
+
+        stream.close()
+        self.assertFalse(self.broadcaster.has_subscribers('7'))
+
+    def test_slow_subscriber_is_disconnected(self):
+        slow = self.broadcaster.subscribe('7')
+        stream = self.broadcaster.stream('7', slow)
+        next(stream)
+        for i in range(4):
+            self.broadcaster.publish('7', 'vote', {'version': i})
+
+        self.assertFalse(self.broadcaster.has_subscribers('7'))
+        self.assertEqual(self.broadcaster.stats['dropped'], 1)
+        # Its stream ends, so the browser reconnects and starts from fresh results
+        self.assertEqual(list(stream), [])
+
+
+class TestMainEvents(unittest.TestCase):
+    def setUp(self):
+        self.persister = main.PersisterGlobalVariables()
+        self.community_board = "cb_events"
+        self.members = {number: main.Voter(name, number) for name, number in [("Alice", "+1"), ("Bob", "+2")]}
+        self.persister.set_members(self.members, self.community_board)
+        self.events = EventBroadcaster()
+        patchers = [patch('app.main.persister', new=self.persister), patch('app.main.events', new=self.events),
+                    patch('app.main.votelogger', new=MagicMock())]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def drain(self, subscription):
+        messages = []
+        while not subscription.empty():
+            messages.append(parse_message(subscription.get_nowait()))
+        return messages
+
+    def test_votes_publish_only_the_options_they_change(self):
+        subscription = self.events.subscribe(self.community_board)
+        main.api_start_voting("Budget", self.community_board)
+        self.drain(subscription)
+
+        main.parse_incoming_text("+1", "yes", self.community_board)
+        main.parse_incoming_text("+1", "no", self.community_board)
+
+        first, second = self.drain(subscription)
+        self.assertEqual(first, ('vote', {'version': 1, 'voted': 'Alice',
+                                          'options': {'Yes': [{'voter': 'Alice', 'votes_vote': 'Yes'}]}}))
+        self.assertEqual(second, ('vote', {'version': 2, 'voted': 'Alice',
+                                           'options': {'Yes': [], 'No': [{'voter': 'Alice', 'votes_vote': 'No'}]}}))
+
+    def test_start_and_stop_publish_session_and_results(self):
+        subscription = self.events.subscribe(self.community_board)
+
+        main.api_start_voting("Budget", self.community_board)
+        session, results = self.drain(subscription)
+        self.assertEqual(session[0], 'session')
+        self.assertTrue(session[1]['isVotingStarted'])
+        self.assertEqual(results, ('results', {'Yes': [], 'No': [], 'Abstain': [], 'Ineligible for Cause': [],
+                                               'not_voted': ['Alice', 'Bob']}))
+
+        main.api_stop_voting(self.community_board)
+        session, results = self.drain(subscription)
+        self.assertFalse(session[1]['isVotingStarted'])
+
+    def test_fan_out_cost_does_not_grow_with_subscribers(self):
+        main.api_start_voting("Budget", self.community_board)
+        reads = []
+        for subscriber_count in (1, 25):
+            subscriptions = [self.events.subscribe(self.community_board) for _ in range(subscriber_count)]
+            with patch.object(self.persister, 'get_tally', wraps=self.persister.get_tally) as get_tally:
+                main.parse_incoming_text("+2", "yes", self.community_board)
+            reads.append(get_tally.call_count)
+            for subscription in subscriptions:
+                self.assertEqual(self.drain(subscription)[0][0], 'vote')
+                self.events.unsubscribe(self.community_board, subscription)
+        self.assertEqual(reads[0], reads[1])
+
+    def test_no_subscribers_no_extra_reads(self):
+        main.api_start_voting("Budget", self.community_board)
+        with patch.object(self.persister, 'get_tally', wraps=self.persister.get_tally) as get_tally:
+            main.parse_incoming_text("+1", "yes", self.community_board)
+        get_tally.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestFlaskEventsAuth(unittest.TestCase):
+    def setUp(self):
+        import flask_app
+        self.flask_app = flask_app
+        patcher = patch.dict('os.environ', {'API_KEY': 'test_key'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = flask_app.app.test_client()
+
+    def open_stream(self, query):
+        response = self.client.get('/events?' + query)
+        response.close()
+        return response.status_code
+
+    def test_stream_opens_with_a_token_for_its_board_only(self):
+        token = self.client.post('/eventstoken', headers={'x-api-key': 'test_key', 'x-community-board': '7'}).get_json()['token']
+
+        self.assertEqual(self.open_stream(f'cb=7&token={token}'), 200)
+        self.assertEqual(self.open_stream(f'cb=8&token={token}'), 401)
+
+    def test_key_in_the_query_string_is_refused(self):
+        self.assertEqual(self.open_stream('cb=7&key=test_key'), 401)
+
+    def test_expired_token_is_refused(self):
+        with patch.object(self.flask_app, 'EVENTS_TOKEN_SECONDS', -1):
+            token = self.client.post('/eventstoken', headers={'x-api-key': 'test_key', 'x-community-board': '7'}).get_json()['token']
+
+        self.assertEqual(self.open_stream(f'cb=7&token={token}'), 401)
+        self.assertEqual(self.client.post('/eventstoken', headers={'x-api-key': 'wrong', 'x-community-board': '7'}).status_code, 401)
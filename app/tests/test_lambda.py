@@ -185,7 +185,29 @@ class TestLambdaFunction(unittest.TestCase):
         response = lambda_handler(event, None)
 
         self.assertEqual(response, mock_api_get_results.return_value)
-        mock_api_get_results.assert_called_once_with('test_cb_lambda')
+        mock_api_get_results.assert_called_once_with('test_cb_lambda', if_none_match=None, since=None)
+
+    @patch('lambda_app.API_KEY', 'test_api_key_lambda')
+    @patch('lambda_app.api_is_voting_started')
+    def test_is_voting_started_passes_etag_through(self, mock_api_is_voting_started):
+        result = {"statusCode": 200, "headers": {"ETag": '"abc"'}, "body": json.dumps({"isVotingStarted": True})}
+        mock_api_is_voting_started.return_value = result
+        event = self._create_event(path='/default/isvotingstarted', method='GET')
+
+        response = lambda_handler(event, None)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['headers']['ETag'], '"abc"')
+        # The dashboard still gets the whole result as the body
+        self.assertEqual(json.loads(response['body']), result)
+
+        mock_api_is_voting_started.return_value = {"statusCode": 304, "headers": {"ETag": '"abc"'}, "body": ""}
+        event = self._create_event(path='/default/isvotingstarted', method='GET', headers={'if-none-match': '"abc"'})
+
+        response = lambda_handler(event, None)
+
+        self.assertEqual(response['statusCode'], 304)
+        mock_api_is_voting_started.assert_called_with('test_cb_lambda', if_none_match='"abc"')
 
     # Test for incoming text message
     @patch('lambda_app.parse_incoming_text')
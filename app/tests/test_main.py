@@ -1,6 +1,8 @@
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 import json
+import base64
+import gzip
 
 # Before importing main, set up mocks for its global persister and votelogger
 # This is one way to ensure main.py uses our mocks when its functions are called
@@ -35,10 +37,21 @@ from app import main  # Import the module to be tested
 from app.VoteOptionsEnum import VoteOptions
 from app.VoteClass import Vote
 from app.VoterClass import Voter
+from app.SessionStateClass import SessionState
 from twilio.twiml.messaging_response import MessagingResponse # For checking response types
+from fake_s3 import FakeS3
 
 
 class TestMainApiStartVoting(unittest.TestCase):
+    def assert_session_saved(self, community_board, title, vote_type, candidates):
+        mock_persister_instance.set_session_state.assert_called_once()
+        session, saved_community_board = mock_persister_instance.set_session_state.call_args[0]
+        self.assertEqual(saved_community_board, community_board)
+        self.assertEqual(session.current_vote_name, title)
+        self.assertTrue(session.currently_in_a_voting_session)
+        self.assertEqual(session.vote_type, vote_type)
+        self.assertEqual(session.election_candidates, candidates)
+
     @patch('app.main.persister', new=mock_persister_instance) # Patch the global persister in main.py
     def test_api_start_voting_resolution(self):
         mock_persister_instance.reset_mock() # Reset mock for this test
@@ -47,10 +60,10 @@ class TestMainApiStartVoting(unittest.TestCase):
 
         main.api_start_voting(title=title, community_board=community_board, vote_type="RESOLUTION")
 
-        mock_persister_instance.set_current_vote_name.assert_called_once_with(title, community_board)
-        mock_persister_instance.set_vote_type.assert_called_once_with("RESOLUTION", community_board)
-        mock_persister_instance.set_election_candidates.assert_called_once_with([], community_board)
-        mock_persister_instance.set_currently_in_a_voting_session.assert_called_once_with(True, community_board)
+        # The whole session is written in a single call
+        self.assert_session_saved(community_board, title, "RESOLUTION", [])
+        mock_persister_instance.set_current_vote_name.assert_not_called()
+        mock_persister_instance.set_currently_in_a_voting_session.assert_not_called()
 
     @patch('app.main.persister', new=mock_persister_instance)
     def test_api_start_voting_election(self):
@@ -61,29 +74,19 @@ class TestMainApiStartVoting(unittest.TestCase):
 
         main.api_start_voting(title=title, community_board=community_board, vote_type="ELECTION", candidates=candidates)
 
-        mock_persister_instance.set_current_vote_name.assert_called_once_with(title, community_board)
-        mock_persister_instance.set_vote_type.assert_called_once_with("ELECTION", community_board)
-        mock_persister_instance.set_election_candidates.assert_called_once_with(candidates, community_board)
-        mock_persister_instance.set_currently_in_a_voting_session.assert_called_once_with(True, community_board)
+        self.assert_session_saved(community_board, title, "ELECTION", candidates)
 
     @patch('app.main.persister', new=mock_persister_instance)
     def test_api_start_voting_election_no_candidates_uses_default_none(self):
-        # This test ensures that if vote_type is ELECTION but candidates is None (e.g. not provided by flask app if logic error),
-        # it still passes None to set_election_candidates, relying on Persister's logic (though our main.py adds specific handling)
-        # The main.api_start_voting function *itself* ensures candidates becomes [] if vote_type is RESOLUTION.
-        # If vote_type is ELECTION and candidates is None, it passes None along.
+        # If vote_type is ELECTION but candidates is None (e.g. not provided by flask app if logic error),
+        # the session is saved with an empty candidate list rather than keeping a previous session's candidates.
         mock_persister_instance.reset_mock()
         title = "Test Election Vote No Cands"
         community_board = "cb3"
 
         main.api_start_voting(title=title, community_board=community_board, vote_type="ELECTION", candidates=None)
 
-        mock_persister_instance.set_current_vote_name.assert_called_once_with(title, community_board)
-        mock_persister_instance.set_vote_type.assert_called_once_with("ELECTION", community_board)
-        # main.py's api_start_voting: if vote_type == "ELECTION" and candidates: ...
-        # So if candidates is None, set_election_candidates is called with None.
-        mock_persister_instance.set_election_candidates.assert_called_once_with(None, community_board)
-        mock_persister_instance.set_currently_in_a_voting_session.assert_called_once_with(True, community_board)
+        self.assert_session_saved(community_board, title, "ELECTION", [])
 
 
 class TestMainGetVoteFromString(unittest.TestCase):
@@ -91,7 +94,7 @@ class TestMainGetVoteFromString(unittest.TestCase):
     def test_get_vote_from_string_resolution(self):
         mock_persister_instance.reset_mock()
         community_board = "cb_res_test"
-        mock_persister_instance.get_vote_type.return_value = "RESOLUTION"
+        mock_persister_instance.get_session_state.return_value = SessionState(vote_type="RESOLUTION")
 
         self.assertEqual(main.get_vote_from_string("yes", community_board), VoteOptions.YES)
         self.assertEqual(main.get_vote_from_string("YES", community_board), VoteOptions.YES)
@@ -104,7 +107,7 @@ class TestMainGetVoteFromString(unittest.TestCase):
         self.assertIsNone(main.get_vote_from_string("invalid", community_board))
         self.assertIsNone(main.get_vote_from_string("yess", community_board))
 
-        mock_persister_instance.get_vote_type.assert_called_with(community_board) # Called each time
+        mock_persister_instance.get_session_state.assert_called_with(community_board) # Called each time
 
     @patch('app.main.persister', new=mock_persister_instance)
     def test_get_vote_from_string_election(self):
@@ -112,8 +115,7 @@ class TestMainGetVoteFromString(unittest.TestCase):
         community_board = "cb_elec_test"
         candidates = ["Alice Smith", "Bob Johnson", "Charlie Brown"]
 
-        mock_persister_instance.get_vote_type.return_value = "ELECTION"
-        mock_persister_instance.get_election_candidates.return_value = candidates
+        mock_persister_instance.get_session_state.return_value = SessionState(vote_type="ELECTION", election_candidates=candidates)
 
         self.assertEqual(main.get_vote_from_string("Alice Smith", community_board), "Alice Smith")
         self.assertEqual(main.get_vote_from_string("alice smith", community_board), "Alice Smith") # Case-insensitive match
@@ -122,9 +124,8 @@ class TestMainGetVoteFromString(unittest.TestCase):
         self.assertIsNone(main.get_vote_from_string("David", community_board)) # Non-candidate
         self.assertIsNone(main.get_vote_from_string("Alice", community_board)) # Partial match not enough
 
-        # Verify get_vote_type and get_election_candidates were called
-        mock_persister_instance.get_vote_type.assert_called_with(community_board)
-        mock_persister_instance.get_election_candidates.assert_called_with(community_board)
+        # Verify the vote type and candidates were read from the session state
+        mock_persister_instance.get_session_state.assert_called_with(community_board)
 
     @patch('app.main.persister', new=mock_persister_instance)
     def test_get_vote_from_string_election_various_casings(self):
@@ -132,8 +133,7 @@ class TestMainGetVoteFromString(unittest.TestCase):
         community_board = "cb_elec_case_test"
         # Candidates stored with specific casing
         candidates = ["Alice Wonderland", "Bob The Builder", "Charlie Chaplin"]
-        mock_persister_instance.get_vote_type.return_value = "ELECTION"
-        mock_persister_instance.get_election_candidates.return_value = candidates
+        mock_persister_instance.get_session_state.return_value = SessionState(vote_type="ELECTION", election_candidates=candidates)
 
         # Test various casings for "Alice Wonderland"
         self.assertEqual(main.get_vote_from_string("alice wonderland", community_board), "Alice Wonderland")
@@ -151,8 +151,7 @@ class TestMainGetVoteFromString(unittest.TestCase):
         self.assertIsNone(main.get_vote_from_string("Non Existent", community_board))
 
         # Ensure underlying mocks were called as expected (at least once for each successful group if logic changes)
-        self.assertTrue(mock_persister_instance.get_vote_type.call_count >= 1)
-        self.assertTrue(mock_persister_instance.get_election_candidates.call_count >= 1)
+        self.assertTrue(mock_persister_instance.get_session_state.call_count >= 1)
 
 
 class TestMainSummarizeVotes(unittest.TestCase):
@@ -160,7 +159,7 @@ class TestMainSummarizeVotes(unittest.TestCase):
     def test_summarize_votes_resolution(self):
         mock_persister_instance.reset_mock()
         community_board = "cb_sum_res"
-        mock_persister_instance.get_vote_type.return_value = "RESOLUTION"
+        mock_persister_instance.get_session_state.return_value = SessionState(vote_type="RESOLUTION")
 
         voter1 = Voter("Voter1", "1")
         voter2 = Voter("Voter2", "2")
@@ -189,8 +188,8 @@ class TestMainSummarizeVotes(unittest.TestCase):
         self.assertTrue(any(v['voter'] == "Voter3" for v in summary[VoteOptions.YES]))
         self.assertTrue(any(v['voter'] == "Voter2" for v in summary[VoteOptions.NO]))
 
-        mock_persister_instance.get_vote_type.assert_called_once_with(community_board)
-        mock_persister_instance.get_vote_log.assert_called_once_with(community_board)
+        mock_persister_instance.get_session_state.assert_called_once_with(community_board)
+        mock_persister_instance.get_vote_log.assert_called_once_with(community_board, vote_type="RESOLUTION")
 
     @patch('app.main.persister', new=mock_persister_instance)
     def test_summarize_votes_election(self):
@@ -198,8 +197,7 @@ class TestMainSummarizeVotes(unittest.TestCase):
         community_board = "cb_sum_elec"
         candidates = ["CandidateX", "CandidateY"]
 
-        mock_persister_instance.get_vote_type.return_value = "ELECTION"
-        mock_persister_instance.get_election_candidates.return_value = candidates
+        mock_persister_instance.get_session_state.return_value = SessionState(vote_type="ELECTION", election_candidates=candidates)
 
         voter_alice = Voter("Alice", "sms_alice")
         voter_bob = Voter("Bob", "sms_bob")
@@ -223,9 +221,8 @@ class TestMainSummarizeVotes(unittest.TestCase):
         self.assertTrue(any(v['voter'] == "Charlie" for v in summary["CandidateX"]))
         self.assertTrue(any(v['voter'] == "Bob" for v in summary["CandidateY"]))
 
-        mock_persister_instance.get_vote_type.assert_called_once_with(community_board)
-        mock_persister_instance.get_election_candidates.assert_called_once_with(community_board)
-        mock_persister_instance.get_vote_log.assert_called_once_with(community_board)
+        mock_persister_instance.get_session_state.assert_called_once_with(community_board)
+        mock_persister_instance.get_vote_log.assert_called_once_with(community_board, vote_type="ELECTION")
 
     @patch('app.main.persister', new=mock_persister_instance)
     def test_summarize_votes_election_no_votes_for_candidate(self):
@@ -233,8 +230,7 @@ class TestMainSummarizeVotes(unittest.TestCase):
         community_board = "cb_sum_elec_novote"
         candidates = ["CandidateA", "CandidateB", "CandidateC"]
 
-        mock_persister_instance.get_vote_type.return_value = "ELECTION"
-        mock_persister_instance.get_election_candidates.return_value = candidates
+        mock_persister_instance.get_session_state.return_value = SessionState(vote_type="ELECTION", election_candidates=candidates)
 
         voter_dave = Voter("Dave", "sms_dave")
         vote_log_data = {
@@ -256,8 +252,7 @@ class TestMainGetSummary(unittest.TestCase):
         community_board = "cb_getsum_res"
         vote_title = "Resolution XYZ"
 
-        mock_persister_instance.get_vote_type.return_value = "RESOLUTION"
-        mock_persister_instance.get_current_vote_name.return_value = vote_title
+        mock_persister_instance.get_session_state.return_value = SessionState(current_vote_name=vote_title, vote_type="RESOLUTION")
 
         # Mock the output of summarize_votes directly
         mock_summary_data = {
@@ -278,9 +273,8 @@ class TestMainGetSummary(unittest.TestCase):
         self.assertIn('Voter2 voted No', summary_text)
         self.assertIn('Voter3 voted Yes', summary_text)
 
-        mock_persister_instance.get_vote_type.assert_called_once_with(community_board)
-        mock_persister_instance.get_current_vote_name.assert_called_once_with(community_board)
-        mock_summarize_votes.assert_called_once_with(community_board)
+        mock_persister_instance.get_session_state.assert_called_once_with(community_board)
+        mock_summarize_votes.assert_called_once_with(community_board, ctx=ANY)
 
     @patch('app.main.persister', new=mock_persister_instance)
     @patch('app.main.summarize_votes')
@@ -290,9 +284,8 @@ class TestMainGetSummary(unittest.TestCase):
         vote_title = "Election ABC"
         candidates = ["CandidateX", "CandidateY"]
 
-        mock_persister_instance.get_vote_type.return_value = "ELECTION"
-        mock_persister_instance.get_election_candidates.return_value = candidates
-        mock_persister_instance.get_current_vote_name.return_value = vote_title
+        mock_persister_instance.get_session_state.return_value = SessionState(
+            current_vote_name=vote_title, vote_type="ELECTION", election_candidates=candidates)
 
         mock_summary_data = {
             "CandidateX": [{'voter': 'Alice'}, {'voter': 'Charlie'}],
@@ -309,10 +302,8 @@ class TestMainGetSummary(unittest.TestCase):
         self.assertIn('Bob voted for CandidateY', summary_text)
         self.assertIn('Charlie voted for CandidateX', summary_text)
 
-        mock_persister_instance.get_vote_type.assert_called_once_with(community_board)
-        mock_persister_instance.get_election_candidates.assert_called_once_with(community_board)
-        mock_persister_instance.get_current_vote_name.assert_called_once_with(community_board)
-        mock_summarize_votes.assert_called_once_with(community_board)
+        mock_persister_instance.get_session_state.assert_called_once_with(community_board)
+        mock_summarize_votes.assert_called_once_with(community_board, ctx=ANY)
 
 
 class TestMainParseIncomingText(unittest.TestCase):
@@ -324,8 +315,8 @@ class TestMainParseIncomingText(unittest.TestCase):
 
         # Default mock behaviors good for most tests
         mock_persister_instance.get_members.return_value = {"+1112223333": Voter("Test User", "+1112223333")}
-        mock_persister_instance.get_currently_in_a_voting_session.return_value = True
-        mock_persister_instance.get_current_vote_name.return_value = "Current Vote Name"
+        self.session = SessionState(current_vote_name="Current Vote Name", currently_in_a_voting_session=True)
+        mock_persister_instance.get_session_state.return_value = self.session
 
     @patch('app.main.persister', new=mock_persister_instance)
     @patch('app.main.votelogger', new=mock_votelogger_instance)
@@ -335,7 +326,7 @@ class TestMainParseIncomingText(unittest.TestCase):
         incoming_number = "+1112223333"
         incoming_msg = "yes"
 
-        mock_persister_instance.get_vote_type.return_value = "RESOLUTION"
+        self.session.vote_type = "RESOLUTION"
         mock_get_vote_from_string.return_value = VoteOptions.YES # Simulate successful vote parsing
 
         response_str = main.parse_incoming_text(incoming_number, incoming_msg, community_board)
@@ -355,7 +346,7 @@ class TestMainParseIncomingText(unittest.TestCase):
         self.assertEqual(logged_vote_object.voters_vote, VoteOptions.YES)
 
         mock_votelogger_instance.log_raw_vote_to_file.assert_called_once()
-        mock_get_vote_from_string.assert_called_once_with(incoming_msg, community_board)
+        mock_get_vote_from_string.assert_called_once_with(incoming_msg, community_board, ctx=ANY)
 
     @patch('app.main.persister', new=mock_persister_instance)
     @patch('app.main.votelogger', new=mock_votelogger_instance)
@@ -366,7 +357,7 @@ class TestMainParseIncomingText(unittest.TestCase):
         candidate_name = "Alice Candidate"
         incoming_msg = candidate_name # User texts candidate name
 
-        mock_persister_instance.get_vote_type.return_value = "ELECTION"
+        self.session.vote_type = "ELECTION"
         # mock_persister_instance.get_election_candidates.return_value = [candidate_name, "Bob Candidate"] # Not directly used by parse_incoming_text if get_vote_from_string handles it
         mock_get_vote_from_string.return_value = candidate_name # Simulate successful vote parsing
 
@@ -382,7 +373,7 @@ class TestMainParseIncomingText(unittest.TestCase):
         self.assertIsInstance(logged_vote_object.voters_vote, str)
 
         mock_votelogger_instance.log_raw_vote_to_file.assert_called_once()
-        mock_get_vote_from_string.assert_called_once_with(incoming_msg, community_board)
+        mock_get_vote_from_string.assert_called_once_with(incoming_msg, community_board, ctx=ANY)
 
     @patch('app.main.persister', new=mock_persister_instance)
     @patch('app.main.votelogger', new=mock_votelogger_instance)
@@ -392,8 +383,8 @@ class TestMainParseIncomingText(unittest.TestCase):
         incoming_number = "+1112223333"
         incoming_msg = "NonExistent Candidate"
 
-        mock_persister_instance.get_vote_type.return_value = "ELECTION"
-        # mock_persister_instance.get_election_candidates.return_value = ["Alice", "Bob"] # For get_vote_from_string's internal logic
+        self.session.vote_type = "ELECTION"
+        # self.session.election_candidates = ["Alice", "Bob"] # For get_vote_from_string's internal logic
         mock_get_vote_from_string.return_value = None # Simulate candidate not found
 
         response_str = main.parse_incoming_text(incoming_number, incoming_msg, community_board)
@@ -403,8 +394,8 @@ class TestMainParseIncomingText(unittest.TestCase):
         mock_votelogger_instance.log_raw_vote_to_file.assert_called_once() # Raw attempt is logged
 
         # Assert the election-specific error message
-        # Re-configure mock for get_election_candidates as it's called inside the tested logic
-        mock_persister_instance.get_election_candidates.return_value = ["Specific Candidate", "Other Guy"]
+        # Re-configure the session's candidates as they are used inside the tested logic
+        self.session.election_candidates = ["Specific Candidate", "Other Guy"]
         # Call the function again or ensure the previous call to parse_incoming_text uses these candidates
         # For simplicity, we can check the message content based on the setup for this test.
         # This test was originally checking for main.INVALID_INPUT_MESSAGE, now it should check the election one.
@@ -412,18 +403,16 @@ class TestMainParseIncomingText(unittest.TestCase):
         # Re-trigger with mocks properly set for THIS test's expectation for message content.
         # Note: setUp method for the class already configures some mocks. This test might need to override.
         mock_persister_instance.get_members.return_value = {incoming_number: Voter("Test User", incoming_number)}
-        mock_persister_instance.get_currently_in_a_voting_session.return_value = True
-        mock_persister_instance.get_vote_type.return_value = "ELECTION" # Crucial for this path
+        self.session.vote_type = "ELECTION" # Crucial for this path
         mock_get_vote_from_string.return_value = None # Invalid vote
-        mock_persister_instance.get_election_candidates.reset_mock() # Reset because it might have been called by other tests or earlier in this one.
-        mock_persister_instance.get_election_candidates.return_value = ["Alice", "Bob"] # Candidates for the message
+        self.session.election_candidates = ["Alice", "Bob"] # Candidates for the message
 
         response_str = main.parse_incoming_text(incoming_number, incoming_msg, community_board)
 
         self.assertIn("Your vote was NOT RECORDED, your message was invalid.", response_str)
         self.assertIn("For this election, you must enter one of the candidate names.", response_str)
         self.assertIn("The available candidates are: Alice, Bob.", response_str)
-        mock_persister_instance.get_election_candidates.assert_called_once_with(community_board) # Called to create the message
+        mock_persister_instance.get_session_state.assert_called_with(community_board) # Candidates come from the session
 
 
     @patch('app.main.persister', new=mock_persister_instance)
@@ -436,11 +425,10 @@ class TestMainParseIncomingText(unittest.TestCase):
 
         # Setup mocks for this specific scenario - note setUp already does some of this.
         mock_persister_instance.get_members.return_value = {incoming_number: Voter("Test User", incoming_number)}
-        mock_persister_instance.get_currently_in_a_voting_session.return_value = True
-        mock_persister_instance.get_vote_type.return_value = "RESOLUTION" # Crucial for this path
+        self.session.vote_type = "RESOLUTION" # Crucial for this path
         mock_get_vote_from_string.return_value = None # Simulate invalid vote string for resolution
-        # Ensure get_election_candidates is not called or its result not used for RESOLUTION message
-        mock_persister_instance.get_election_candidates.reset_mock()
+        # Ensure the candidates are not used for RESOLUTION message
+        self.session.election_candidates = ["Alice", "Bob"]
 
         response_str = main.parse_incoming_text(incoming_number, incoming_msg, community_board)
 
@@ -449,11 +437,10 @@ class TestMainParseIncomingText(unittest.TestCase):
         self.assertNotIn("The available candidates are:", response_str)
         mock_persister_instance.add_to_vote_log.assert_not_called()
         mock_votelogger_instance.log_raw_vote_to_file.assert_called_once()
-        mock_persister_instance.get_election_candidates.assert_not_called() # Should not be called for RESOLUTION type error message
 
 
     def test_parse_incoming_text_not_in_voting_session(self):
-        mock_persister_instance.get_currently_in_a_voting_session.return_value = False
+        self.session.currently_in_a_voting_session = False
         response_str = main.parse_incoming_text("+1112223333", "yes", "cb_parse_notin")
         self.assertIn(main.NOT_VOTING_MESSAGE, response_str)
 
@@ -475,12 +462,8 @@ class TestMainApiIsVotingStarted(unittest.TestCase):
         community_board = "cb_isvoting_res"
         vote_name = "Resolution Vote Test"
 
-        mock_persister_instance.get_currently_in_a_voting_session.return_value = True
-        mock_persister_instance.get_current_vote_name.return_value = vote_name
-        mock_persister_instance.get_vote_type.return_value = "RESOLUTION"
-        # get_election_candidates should not be strictly necessary to mock if vote_type is RESOLUTION,
-        # as the code logic might short-circuit, but good to be explicit.
-        mock_persister_instance.get_election_candidates.return_value = []
+        mock_persister_instance.get_session_state.return_value = SessionState(
+            current_vote_name=vote_name, currently_in_a_voting_session=True, vote_type="RESOLUTION")
 
         response = main.api_is_voting_started(community_board)
 
@@ -494,14 +477,12 @@ class TestMainApiIsVotingStarted(unittest.TestCase):
         self.assertEqual(body_data["voteType"], "RESOLUTION")
         self.assertEqual(body_data["electionCandidates"], [])
 
-        mock_persister_instance.get_currently_in_a_voting_session.assert_called_once_with(community_board)
-        mock_persister_instance.get_current_vote_name.assert_called_once_with(community_board)
-        mock_persister_instance.get_vote_type.assert_called_once_with(community_board)
-        # Depending on exact logic in api_is_voting_started, get_election_candidates might not be called
-        # if vote_type is RESOLUTION. If it is, the call needs to be asserted.
-        # Based on the provided implementation: `candidates if vote_type == "ELECTION" else []`
-        # This means get_election_candidates IS called before this conditional.
-        mock_persister_instance.get_election_candidates.assert_called_once_with(community_board)
+        # The whole state comes from a single session read
+        mock_persister_instance.get_session_state.assert_called_once_with(community_board)
+        mock_persister_instance.get_currently_in_a_voting_session.assert_not_called()
+        mock_persister_instance.get_current_vote_name.assert_not_called()
+        mock_persister_instance.get_vote_type.assert_not_called()
+        mock_persister_instance.get_election_candidates.assert_not_called()
 
 
     @patch('app.main.persister', new=mock_persister_instance)
@@ -511,10 +492,9 @@ class TestMainApiIsVotingStarted(unittest.TestCase):
         vote_name = "Election Vote Test"
         candidates = ["Candidate A", "Candidate B"]
 
-        mock_persister_instance.get_currently_in_a_voting_session.return_value = True
-        mock_persister_instance.get_current_vote_name.return_value = vote_name
-        mock_persister_instance.get_vote_type.return_value = "ELECTION"
-        mock_persister_instance.get_election_candidates.return_value = candidates
+        mock_persister_instance.get_session_state.return_value = SessionState(
+            current_vote_name=vote_name, currently_in_a_voting_session=True, vote_type="ELECTION",
+            election_candidates=candidates)
 
         response = main.api_is_voting_started(community_board)
         body_data = json.loads(response["body"])
@@ -524,17 +504,15 @@ class TestMainApiIsVotingStarted(unittest.TestCase):
         self.assertEqual(body_data["voteType"], "ELECTION")
         self.assertEqual(body_data["electionCandidates"], candidates)
 
-        mock_persister_instance.get_election_candidates.assert_called_once_with(community_board)
+        mock_persister_instance.get_session_state.assert_called_once_with(community_board)
 
     @patch('app.main.persister', new=mock_persister_instance)
     def test_api_is_voting_not_started(self):
         mock_persister_instance.reset_mock()
         community_board = "cb_isvoting_not"
 
-        mock_persister_instance.get_currently_in_a_voting_session.return_value = False
-        mock_persister_instance.get_current_vote_name.return_value = "" # Usually empty if not started
-        mock_persister_instance.get_vote_type.return_value = "RESOLUTION" # Default or last state
-        mock_persister_instance.get_election_candidates.return_value = []
+        # Usually empty if not started, and the type is the default or last state
+        mock_persister_instance.get_session_state.return_value = SessionState()
 
         response = main.api_is_voting_started(community_board)
         body_data = json.loads(response["body"])
@@ -557,7 +535,7 @@ class TestMainApiStopVoting(unittest.TestCase):
         current_vote_name = "Vote To Be Stopped"
         summary_text_output = "This is the vote summary."
 
-        mock_persister_instance.get_current_vote_name.return_value = current_vote_name
+        mock_persister_instance.get_session_state.return_value = SessionState(current_vote_name=current_vote_name, currently_in_a_voting_session=True)
         mock_get_summary.return_value = summary_text_output
 
         main.api_stop_voting(community_board)
@@ -569,18 +547,278 @@ class TestMainApiStopVoting(unittest.TestCase):
             community_board=community_board
         )
 
-        # Verify persister state changes
-        mock_persister_instance.set_current_vote_name.assert_called_once_with('', community_board)
-        mock_persister_instance.set_currently_in_a_voting_session.assert_called_once_with(False, community_board)
+        # Verify persister state changes: the session is closed and the vote type and candidates reset in one write
+        mock_persister_instance.set_session_state.assert_called_once()
+        session, saved_community_board = mock_persister_instance.set_session_state.call_args[0]
+        self.assertEqual(saved_community_board, community_board)
+        self.assertEqual(session.current_vote_name, '')
+        self.assertFalse(session.currently_in_a_voting_session)
+        self.assertEqual(session.vote_type, "RESOLUTION")
+        self.assertEqual(session.election_candidates, [])
         mock_persister_instance.clear_vote_log.assert_called_once_with(community_board)
 
-        # Verify new calls for resetting vote type and candidates
-        mock_persister_instance.set_vote_type.assert_called_once_with("RESOLUTION", community_board)
-        mock_persister_instance.set_election_candidates.assert_called_once_with([], community_board)
+        mock_get_summary.assert_called_once_with(community_board, ctx=ANY)
+
+
+class TestMainApiGetResults(unittest.TestCase):
+    def setUp(self):
+        self.persister = main.PersisterGlobalVariables()
+        self.community_board = "cb_results"
+        self.members = {number: main.Voter(name, number) for name, number in
+                        [("Alice", "+1"), ("Bob", "+2"), ("Carol", "+3")]}
+        self.persister.set_members(self.members, self.community_board)
+
+    def test_api_get_results_resolution(self):
+        with patch('app.main.persister', new=self.persister):
+            main.api_start_voting("Budget", self.community_board)
+            self.persister.add_to_vote_log("+1", main.Vote(self.members["+1"], main.VoteOptions.YES), self.community_board)
+            self.persister.add_to_vote_log("+2", main.Vote(self.members["+2"], main.VoteOptions.NO), self.community_board)
+            # Alice changes her mind
+            self.persister.add_to_vote_log("+1", main.Vote(self.members["+1"], main.VoteOptions.ABSTAIN), self.community_board)
+
+            response = main.api_get_results(self.community_board)
 
-        mock_get_summary.assert_called_once_with(community_board)
+        self.assertEqual(response["statusCode"], 200)
+        self.assertEqual(json.loads(response["body"]), {
+            "Yes": [],
+            "No": [{"voter": "Bob", "votes_vote": "No"}],
+            "Abstain": [{"voter": "Alice", "votes_vote": "Abstain"}],
+            "Ineligible for Cause": [],
+            "not_voted": ["Carol"],
+        })
+
+    def test_api_get_results_election(self):
+        with patch('app.main.persister', new=self.persister):
+            main.api_start_voting("Chair", self.community_board, vote_type="ELECTION", candidates=["Dana", "Eve"])
+            self.persister.add_to_vote_log("+3", main.Vote(self.members["+3"], "Eve"), self.community_board)
+
+            body = json.loads(main.api_get_results(self.community_board)["body"])
+
+        self.assertEqual(body, {"Dana": [], "Eve": [{"voter": "Carol", "votes_vote": "Eve"}], "not_voted": ["Alice", "Bob"]})
+
+    def test_api_get_results_matches_summarize_votes(self):
+        with patch('app.main.persister', new=self.persister):
+            main.api_start_voting("Budget", self.community_board)
+            for number, option in [("+1", main.VoteOptions.YES), ("+2", main.VoteOptions.YES), ("+3", main.VoteOptions.CAUSE)]:
+                self.persister.add_to_vote_log(number, main.Vote(self.members[number], option), self.community_board)
+
+            body = json.loads(main.api_get_results(self.community_board)["body"])
+            summary = main.summarize_votes(self.community_board)
+
+        for option, votes in summary.items():
+            self.assertEqual(body[option.value], votes)
+
+
+    def test_api_get_results_not_modified(self):
+        with patch('app.main.persister', new=self.persister):
+            main.api_start_voting("Budget", self.community_board)
+            first = main.api_get_results(self.community_board)
+            etag = first["headers"]["ETag"]
+
+            again = main.api_get_results(self.community_board, if_none_match=etag)
+            self.assertEqual(again["statusCode"], 304)
+            self.assertEqual(again["headers"]["ETag"], etag)
+            self.assertEqual(again["body"], "")
+
+            # Any vote, a new session or a new member list changes the ETag
+            self.persister.add_to_vote_log("+1", main.Vote(self.members["+1"], main.VoteOptions.YES), self.community_board)
+            after_vote = main.api_get_results(self.community_board, if_none_match=etag)
+            self.assertEqual(after_vote["statusCode"], 200)
+            self.assertNotEqual(after_vote["headers"]["ETag"], etag)
+
+            with patch('app.main.votelogger', new=MagicMock()):
+                main.api_stop_voting(self.community_board)
+            main.api_start_voting("Budget", self.community_board)
+            restarted = main.api_get_results(self.community_board, if_none_match=etag)
+            self.assertEqual(restarted["statusCode"], 200)
+            self.assertNotIn(restarted["headers"]["ETag"], (etag, after_vote["headers"]["ETag"]))
+
+            main.api_set_members({"+4": {"name": "Dave", "sms_number": "+4"}}, self.community_board)
+            new_members = main.api_get_results(self.community_board, if_none_match=restarted["headers"]["ETag"])
+            self.assertEqual(new_members["statusCode"], 200)
+            self.assertEqual(json.loads(new_members["body"])["not_voted"], ["Dave"])
+
+    def test_is_voting_started_and_members_not_modified(self):
+        with patch('app.main.persister', new=self.persister):
+            started = main.api_is_voting_started(self.community_board)
+            members = main.api_get_members(self.community_board)
+
+            self.assertEqual(main.api_is_voting_started(self.community_board, if_none_match=started["headers"]["ETag"])["statusCode"], 304)
+            self.assertEqual(main.api_get_members(self.community_board, if_none_match='W/' + members["headers"]["ETag"])["statusCode"], 304)
+
+            main.api_start_voting("Budget", self.community_board)
+            self.assertEqual(main.api_is_voting_started(self.community_board, if_none_match=started["headers"]["ETag"])["statusCode"], 200)
+            self.assertEqual(main.api_get_members(self.community_board, if_none_match=members["headers"]["ETag"])["statusCode"], 304)
+
+    def test_api_get_results_since(self):
+        with patch('app.main.persister', new=self.persister):
+            main.api_start_voting("Budget", self.community_board)
+            first = json.loads(main.api_get_results(self.community_board, since=-1)["body"])
+            self.assertTrue(first["full"])
+            self.assertEqual(first["results"]["not_voted"], ["Alice", "Bob", "Carol"])
+
+            self.persister.add_to_vote_log("+1", main.Vote(self.members["+1"], main.VoteOptions.YES), self.community_board)
+            self.persister.add_to_vote_log("+2", main.Vote(self.members["+2"], main.VoteOptions.NO), self.community_board)
+            delta = json.loads(main.api_get_results(self.community_board, since=first["sequence"])["body"])
+            self.assertFalse(delta["full"])
+            self.assertNotIn("results", delta)
+            self.assertEqual([(vote["voter"], vote["votes_vote"]) for vote in delta["votes"]], [("Alice", "Yes"), ("Bob", "No")])
+            self.assertEqual(delta["counts"], {"Yes": 1, "No": 1, "Abstain": 0, "Ineligible for Cause": 0})
+
+            # Only what changed after the last sequence seen
+            self.persister.add_to_vote_log("+1", main.Vote(self.members["+1"], main.VoteOptions.ABSTAIN), self.community_board)
+            later = json.loads(main.api_get_results(self.community_board, since=delta["sequence"])["body"])
+            self.assertEqual([(vote["voter"], vote["votes_vote"]) for vote in later["votes"]], [("Alice", "Abstain")])
+            self.assertEqual(later["sequence"], delta["sequence"] + 1)
+
+            # A sequence from an earlier session gets the full results of the new one
+            with patch('app.main.votelogger', new=MagicMock()):
+                main.api_stop_voting(self.community_board)
+            main.api_start_voting("Parks", self.community_board)
+            restarted = json.loads(main.api_get_results(self.community_board, since=later["sequence"])["body"])
+            self.assertTrue(restarted["full"])
+            self.assertEqual(restarted["results"]["Yes"], [])
+
+class TestMainRequestScopedReads(unittest.TestCase):
+    # Drives the real PersisterS3 against the in-memory S3 stand-in and counts GETs per key
+    def setUp(self):
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = main.PersisterS3()
+        self.fake_s3 = FakeS3()
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+        self.community_board = "cb_request_scope"
+        self.persister.set_members({"+1112223333": main.Voter("Test User", "+1112223333"),
+                                    "+1444555666": main.Voter("Other User", "+1444555666")}, self.community_board)
+
+    def assert_each_key_fetched_at_most_once(self):
+        gets = {key: count for (operation, key), count in self.fake_s3.key_calls.items() if operation == 'get_object'}
+        self.assertTrue(gets)
+        for key, count in gets.items():
+            self.assertLessEqual(count, 1, f'{key} was fetched {count} times in one request')
+
+    def test_parse_incoming_text_election_vote(self):
+        self.persister.set_session_state(main.SessionState(current_vote_name="Chair", currently_in_a_voting_session=True,
+                                                           vote_type="ELECTION", election_candidates=["Alice", "Bob"]),
+                                         self.community_board)
+        self.fake_s3.reset_calls()
+
+        with patch('app.main.persister', new=self.persister), patch('app.main.votelogger', new=MagicMock()):
+            response_str = main.parse_incoming_text("+1112223333", "alice", self.community_board)
+
+        self.assertIn('you voted for Alice for election Chair', response_str)
+        self.assert_each_key_fetched_at_most_once()
+
+    def test_parse_incoming_text_invalid_election_vote(self):
+        self.persister.set_session_state(main.SessionState(current_vote_name="Chair", currently_in_a_voting_session=True,
+                                                           vote_type="ELECTION", election_candidates=["Alice", "Bob"]),
+                                         self.community_board)
+        self.fake_s3.reset_calls()
+
+        with patch('app.main.persister', new=self.persister), patch('app.main.votelogger', new=MagicMock()):
+            response_str = main.parse_incoming_text("+1112223333", "carol", self.community_board)
+
+        self.assertIn('The available candidates are: Alice, Bob.', response_str)
+        self.assert_each_key_fetched_at_most_once()
+
+    def test_api_get_results_and_stop_voting(self):
+        with patch('app.main.persister', new=self.persister):
+            main.api_start_voting("Budget", self.community_board)
+            self.persister.add_to_vote_log("+1112223333", main.Vote(main.Voter("Test User", "+1112223333"), main.VoteOptions.YES), self.community_board)
+
+            self.fake_s3.reset_calls()
+            body = json.loads(main.api_get_results(self.community_board)["body"])
+            self.assertEqual(body["Yes"], [{'voter': 'Test User', 'votes_vote': 'Yes'}])
+            self.assertEqual(body["not_voted"], ["Other User"])
+            self.assert_each_key_fetched_at_most_once()
+            # Results come from the tally, not a walk over the vote log
+            self.assertEqual(self.fake_s3.calls['list_objects_v2'], 0)
+
+            self.fake_s3.reset_calls()
+            with patch('app.main.votelogger', new=MagicMock()):
+                main.api_stop_voting(self.community_board)
+            self.assert_each_key_fetched_at_most_once()
+
+    def test_request_context_memoizes_reads(self):
+        ctx = main.RequestContext(self.persister, self.community_board)
+
+        ctx.get_vote_type()
+        ctx.get_current_vote_name()
+        ctx.get_election_candidates()
+        ctx.get_members()
+        ctx.get_members()
+
+        self.assertEqual(ctx.fetch_counts['session_state'], 1)
+        self.assertEqual(ctx.fetch_counts['members'], 1)
 
 
 if __name__ == '__main__':
     # This allows running tests directly from this file
     unittest.main()
+
+
+class TestMainApiExportVotes(unittest.TestCase):
+    def setUp(self):
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = main.PersisterS3()
+        self.fake_s3 = FakeS3()
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+        for i in range(250):
+            self.fake_s3.objects[f'summaryvotelog/7/2024_05_01_vote{i:03d}_summary.txt'] = f'Vote {i}\nYes: 3\n'.encode('utf-8')
+        self.fake_s3.objects['summaryvotelog/7/2024_05_02_other_summary.txt'] = b'Other'
+
+    def test_export_votes_joins_summaries_in_key_order(self):
+        with patch('app.main.persister', new=self.persister):
+            result = main.api_export_votes('2024-05-01', '7')
+
+        self.assertEqual(result, '\n'.join(f'Vote {i}\nYes: 3\n' for i in range(250)).strip())
+        self.assertEqual(self.fake_s3.calls['get_object'], 250)
+
+    def test_export_votes_gzip_body(self):
+        with patch('app.main.persister', new=self.persister):
+            plain = main.api_export_votes('2024-05-01', '7')
+            response = main.api_export_votes('2024-05-01', '7', gzip_body=True)
+
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        self.assertTrue(response['isBase64Encoded'])
+        self.assertEqual(gzip.decompress(base64.b64decode(response['body'])).decode('utf-8'), plain)
+
+    def test_export_votes_missing_day(self):
+        with patch('app.main.persister', new=self.persister):
+            response = main.api_export_votes('2024-06-01', '7')
+
+        self.assertEqual(response['statusCode'], 404)
+
+    def test_export_votes_listing_failing_partway_is_an_error(self):
+        for i in range(250, 1500):
+            self.fake_s3.objects[f'summaryvotelog/7/2024_05_01_vote{i:04d}_summary.txt'] = b'Vote\n'
+        list_objects_v2 = self.fake_s3.list_objects_v2
+
+        def second_page_fails(**kwargs):
+            if kwargs.get('ContinuationToken'):
+                raise Exception('connection reset')
+            return list_objects_v2(**kwargs)
+
+        with patch.object(self.fake_s3, 'list_objects_v2', side_effect=second_page_fails), \
+                patch('app.main.persister', new=self.persister):
+            response = main.api_export_votes('2024-05-01', '7')
+
+        self.assertEqual(response['statusCode'], 500)
+
+
+    def test_export_votes_unreadable_summary_is_an_error(self):
+        get_object = self.fake_s3.get_object
+
+        def one_summary_fails(**kwargs):
+            if kwargs['Key'].endswith('vote123_summary.txt'):
+                raise self.fake_s3._error('SlowDown', 'GetObject', 503)
+            return get_object(**kwargs)
+
+        with patch.object(self.fake_s3, 'get_object', side_effect=one_summary_fails), \
+                patch('app.main.persister', new=self.persister):
+            response = main.api_export_votes('2024-05-01', '7')
+
+        self.assertEqual(response['statusCode'], 500)
+        self.assertEqual(response['body'], {'error': 'Could not read every vote summary for 2024-05-01'})
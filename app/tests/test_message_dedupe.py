@@ -0,0 +1,238 @@
+import base64
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from urllib.parse import urlencode
+import io
+import json
+from botocore.response import StreamingBody
+from fake_s3 import FakeS3, stubbed_client
+
+# lambda_app imports the app modules by their top-level names, so use the same ones here
+import lambda_app
+from MessageDedupeClass import MessageDedupe
+from PersisterClass import PersisterSQLite
+from TwimlClass import Twiml
+
+
+def lambda_context(remaining_ms):
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = remaining_ms
+    return context
+
+
+class TestMessageDedupe(unittest.TestCase):
+    def setUp(self):
+        self.dedupe = MessageDedupe(max_size=2, durable=True)
+        self.persister = MagicMock()
+        self.persister.claim_message.return_value = None
+
+    def test_answers_once_and_replays_the_reply(self):
+        answer_text = MagicMock(return_value='reply')
+        replies = [self.dedupe.answer('SM1', 'cb', self.persister, answer_text, 'pending') for _ in range(3)]
+
+        self.assertEqual(replies, ['reply'] * 3)
+        answer_text.assert_called_once_with()
+        self.persister.set_message_reply.assert_called_once_with('SM1', 'reply', 'cb')
+        self.assertEqual(self.dedupe.get_stats(), {'answered': 1, 'memory_hits': 2, 'cached': 1})
+
+    def test_least_recently_used_reply_is_dropped(self):
+        for sid in ('SM1', 'SM2', 'SM3'):
+            self.dedupe.answer(sid, 'cb', self.persister, lambda: sid, 'pending')
+
+        self.assertEqual(list(self.dedupe.replies), [('cb', 'SM2'), ('cb', 'SM3')])
+
+    def test_durable_marker_catches_retries_this_process_has_not_seen(self):
+        answer_text = MagicMock()
+        self.persister.claim_message.return_value = 'first reply'
+        self.assertEqual(self.dedupe.answer('SM1', 'cb', self.persister, answer_text, 'pending'), 'first reply')
+
+        self.persister.claim_message.return_value = ''
+        self.assertEqual(self.dedupe.answer('SM2', 'cb', self.persister, answer_text, 'pending'), 'pending')
+
+        answer_text.assert_not_called()
+        self.assertEqual(self.dedupe.get_stats()['durable_hits'], 2)
+
+    def test_markers_are_off_by_default(self):
+        replies = [MessageDedupe().answer('SM1', 'cb', self.persister, lambda: 'reply', 'pending') for _ in range(2)]
+
+        self.assertEqual(replies, ['reply', 'reply'])
+        self.persister.claim_message.assert_not_called()
+        self.persister.set_message_reply.assert_not_called()
+
+    def test_texts_without_a_sid_are_always_answered(self):
+        answer_text = MagicMock(return_value='reply')
+        self.dedupe.answer('', 'cb', self.persister, answer_text, 'pending')
+        self.dedupe.answer(None, 'cb', self.persister, answer_text, 'pending')
+
+        self.assertEqual(answer_text.call_count, 2)
+        self.persister.claim_message.assert_not_called()
+
+    def test_unreachable_marker_store_still_answers(self):
+        self.persister.claim_message.side_effect = Exception('S3 down')
+        self.assertEqual(self.dedupe.answer('SM1', 'cb', self.persister, lambda: 'reply', 'pending'), 'reply')
+        self.assertEqual(self.dedupe.get_stats()['claim_errors'], 1)
+
+
+class TestRetryStorms(unittest.TestCase):
+    def setUp(self):
+        self.fake_s3 = FakeS3()
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = lambda_app.PersisterS3()
+            self.logger = lambda_app.S3VoteLoggingClass(buffered=False, max_batch_age=60)
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+        self.logger.s3_resource = self.fake_s3
+        self.community_board = 'cb_retries'
+        self.persister.set_members({'+15550000001': lambda_app.Voter('Test User', '+15550000001')}, self.community_board)
+        self.persister.set_session_state(lambda_app.SessionState(current_vote_name='Budget', currently_in_a_voting_session=True),
+                                         self.community_board)
+        self.dedupe = MessageDedupe(durable=True)
+        self.patchers = [patch('main.persister', new=self.persister),
+                         patch('main.votelogger', new=self.logger),
+                         patch('lambda_app.votelogger', new=self.logger),
+                         patch('main.message_dedupe', new=self.dedupe),
+                         patch('lambda_app.TWILIO_API_KEY', 'test_twilio_key')]
+        for patcher in self.patchers:
+            patcher.start()
+        self.fake_s3.reset_calls()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def text_event(self, body, message_sid='SM0001'):
+        form = urlencode({'Body': body, 'From': '+15550000001', 'MessageSid': message_sid})
+        return {
+            'rawPath': '/default/incomingtext',
+            'rawQueryString': f'auth=test_twilio_key&cb={self.community_board}',
+            'requestContext': {'http': {'method': 'POST'}},
+            'headers': {},
+            'body': base64.b64encode(form.encode('utf-8')).decode('utf-8')
+        }
+
+    def vote_writes(self):
+        return self.fake_s3.key_calls[('put_object', f'vote_log/{self.community_board}/+15550000001')]
+
+    def raw_log_keys(self):
+        return [key for key in self.fake_s3.objects if key.startswith('rawvotelog/')]
+
+    def test_concurrent_retries_record_the_vote_once(self):
+        # The vote is slow to write, so every retry arrives while the first is still on it
+        self.fake_s3.latency = lambda operation, key: 0.2 if operation == 'put_object' and 'vote_log/' in (key or '') else 0
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            responses = list(executor.map(lambda _: lambda_app.lambda_handler(self.text_event('yes'), lambda_context(10000)), range(10)))
+
+        self.assertEqual({response['body'] for response in responses}, {responses[0]['body']})
+        self.assertIn('Your vote has been recorded', responses[0]['body'])
+        self.assertEqual(self.vote_writes(), 1)
+        self.assertEqual(len(self.raw_log_keys()), 1)
+        stats = self.dedupe.get_stats()
+        self.assertEqual(stats['answered'], 1)
+        self.assertEqual(stats.get('in_flight_hits', 0) + stats.get('memory_hits', 0), 9)
+
+    def test_retries_on_other_lambdas_get_the_first_reply(self):
+        first = lambda_app.lambda_handler(self.text_event('yes'), lambda_context(10000))
+        # A fresh container knows nothing of the first delivery but the marker in S3
+        for _ in range(5):
+            with patch('main.message_dedupe', new=MessageDedupe(durable=True)):
+                retry = lambda_app.lambda_handler(self.text_event('yes'), lambda_context(10000))
+            self.assertEqual(retry['body'], first['body'])
+
+        self.assertEqual(self.vote_writes(), 1)
+        self.assertEqual(len(self.raw_log_keys()), 1)
+
+    def test_retry_while_another_lambda_answers_gets_no_reply(self):
+        self.assertIsNone(self.persister.claim_message('SM0001', self.community_board))
+
+        response = lambda_app.lambda_handler(self.text_event('yes'), lambda_context(10000))
+
+        self.assertEqual(response['body'], Twiml.EMPTY_RESPONSE)
+        self.assertEqual(self.vote_writes(), 0)
+
+    def test_claim_of_a_lambda_that_died_is_taken_over(self):
+        self.assertIsNone(self.persister.claim_message('SM0001', self.community_board))
+        self.persister.message_claim_timeout = 0
+
+        response = lambda_app.lambda_handler(self.text_event('yes'), lambda_context(10000))
+
+        self.assertIn('Your vote has been recorded', response['body'])
+        self.assertEqual(self.vote_writes(), 1)
+
+    def test_claims_are_accepted_by_the_s3_client(self):
+        client, stubber = stubbed_client()
+        self.persister.s3 = client
+        key = f'messages/{self.community_board}/SM0001'
+        stale = json.dumps({'claimed_at': 0, 'reply': None}).encode('utf-8')
+        stubber.add_client_error('put_object', 'PreconditionFailed', http_status_code=412,
+                                 expected_params={'Bucket': self.persister.bucket_name, 'Key': key, 'Body': unittest.mock.ANY, 'IfNoneMatch': '*'})
+        stubber.add_response('get_object', {'Body': StreamingBody(io.BytesIO(stale), len(stale)), 'ETag': '"1"'})
+        stubber.add_response('put_object', {}, {'Bucket': self.persister.bucket_name, 'Key': key, 'Body': unittest.mock.ANY, 'IfMatch': '"1"'})
+
+        with stubber:
+            self.assertIsNone(self.persister.claim_message('SM0001', self.community_board))
+        stubber.assert_no_pending_responses()
+
+    def test_different_messages_are_all_answered(self):
+        lambda_app.lambda_handler(self.text_event('yes', 'SM0001'), lambda_context(10000))
+        response = lambda_app.lambda_handler(self.text_event('no', 'SM0002'), lambda_context(10000))
+
+        self.assertIn('you voted No', response['body'])
+        self.assertEqual(self.vote_writes(), 2)
+
+
+class TestFlaskRetries(unittest.TestCase):
+    def setUp(self):
+        import flask_app
+        self.persister = lambda_app.PersisterInMemory()
+        self.persister.set_members({'+15550000001': lambda_app.Voter('Test User', '+15550000001')}, '7')
+        self.persister.set_session_state(lambda_app.SessionState(current_vote_name='Budget', currently_in_a_voting_session=True), '7')
+        self.votelogger = MagicMock()
+        self.dedupe = MessageDedupe()
+        self.patchers = [patch('main.persister', new=self.persister), patch('main.votelogger', new=self.votelogger),
+                         patch('main.message_dedupe', new=self.dedupe)]
+        for patcher in self.patchers:
+            patcher.start()
+        self.client = flask_app.app.test_client()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_retries_replay_the_reply(self):
+        form = {'Body': 'yes', 'From': '+15550000001', 'MessageSid': 'SM0001'}
+        responses = [self.client.post('/incomingtext', data=form).get_data(as_text=True) for _ in range(5)]
+
+        self.assertEqual(set(responses), {responses[0]})
+        self.assertIn('Your vote has been recorded', responses[0])
+        self.assertEqual(self.votelogger.log_raw_vote_to_file.call_count, 1)
+        self.assertEqual(self.persister.get_tally('7').version, 1)
+        self.assertEqual(self.dedupe.get_stats()['memory_hits'], 4)
+
+
+class TestPersisterSQLiteMessages(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.persister = PersisterSQLite(db_path=os.path.join(self.temp_dir.name, 'test.db'))
+
+    def tearDown(self):
+        self.persister.close()
+        self.temp_dir.cleanup()
+
+    def test_claim_reply_and_take_over(self):
+        self.assertIsNone(self.persister.claim_message('SM1', 'cb'))
+        self.assertEqual(self.persister.claim_message('SM1', 'cb'), '')
+        self.assertIsNone(self.persister.claim_message('SM1', 'other_cb'))
+
+        self.persister.set_message_reply('SM1', 'reply', 'cb')
+        self.assertEqual(self.persister.claim_message('SM1', 'cb'), 'reply')
+
+        self.persister.message_claim_timeout = 0
+        self.assertIsNone(self.persister.claim_message('SM2', 'cb'))
+        self.assertIsNone(self.persister.claim_message('SM2', 'cb'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -43,6 +43,19 @@ class TestPersisterGlobalVariables(unittest.TestCase):
         self.assertEqual(vote_log[voter2.sms_number].voters_vote, "CandidateX")
         self.assertIsInstance(vote_log[voter2.sms_number].voters_vote, str)
 
+    def test_tally_follows_vote_log(self):
+        voter1 = Voter("Voter One", "111")
+        self.persister.add_to_vote_log(voter1.sms_number, Vote(voter1, VoteOptions.YES), self.community_board)
+        self.persister.add_to_vote_log(voter1.sms_number, Vote(voter1, VoteOptions.NO), self.community_board)
+
+        tally = self.persister.get_tally(self.community_board)
+        self.assertEqual(tally.get_count("Yes"), 0)
+        self.assertEqual(tally.get_count("No"), 1)
+        self.assertTrue(self.persister.check_tally(self.community_board))
+
+        self.persister.clear_vote_log(self.community_board)
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {})
+
     def test_default_vote_type_and_candidates(self):
         # Test default values upon initialization if not explicitly set by other tests first
         # For PersisterGlobalVariables, these are set in __init__
@@ -53,6 +66,22 @@ class TestPersisterGlobalVariables(unittest.TestCase):
 from unittest.mock import patch, MagicMock
 import json
 from app.PersisterClass import PersisterS3
+from app.SessionStateClass import SessionState
+import app.PersisterClass as persister_module
+from app.VoteLoggingClass import SQLiteVoteLoggingClass
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fake_s3 import FakeS3, stubbed_client
+from botocore.exceptions import ParamValidationError
+from botocore.response import StreamingBody
+import io
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
 
 class TestPersisterS3(unittest.TestCase):
     def setUp(self):
@@ -68,6 +97,8 @@ class TestPersisterS3(unittest.TestCase):
         self.mock_s3_resource.return_value.Object.return_value = self.mock_s3_object
         self.mock_s3_client_instance = self.mock_s3_client.return_value
 
+        # Make the shared client come from the mocks above rather than an earlier test
+        persister_module.S3Clients.reset()
         self.persister = PersisterS3()
          # Override bucket name for tests if necessary, or ensure persister uses a test bucket
         self.persister.bucket_name = 'test-bucket'
@@ -76,15 +107,21 @@ class TestPersisterS3(unittest.TestCase):
     def tearDown(self):
         self.patcher_resource.stop()
         self.patcher_client.stop()
+        persister_module.S3Clients.reset()
+
+    def mock_session_document(self, **fields):
+        session_document = SessionState(**fields).toJSON()
+        self.mock_s3_object.get.return_value = {
+            'Body': MagicMock(read=MagicMock(return_value=json.dumps(session_document).encode('utf-8')))
+        }
+        return session_document
 
     def test_get_vote_type_s3(self):
         expected_vote_type = "ELECTION"
-        s3_key = f'/{self.community_board}/{self.persister.vote_type_key}'
+        s3_key = f'/{self.community_board}/{self.persister.session_key}'
 
-        # Simulate S3 get_object response
-        self.mock_s3_object.get.return_value = {
-            'Body': MagicMock(read=MagicMock(return_value=json.dumps(expected_vote_type).encode('utf-8')))
-        }
+        # Simulate S3 get_object response for the session document
+        self.mock_session_document(vote_type=expected_vote_type)
 
         vote_type = self.persister.get_vote_type(self.community_board)
 
@@ -93,8 +130,8 @@ class TestPersisterS3(unittest.TestCase):
         self.assertEqual(vote_type, expected_vote_type)
 
     def test_get_vote_type_s3_default_resolution(self):
-        s3_key = f'/{self.community_board}/{self.persister.vote_type_key}'
-        # Simulate an error (e.g., object not found)
+        s3_key = f'/{self.community_board}/{self.persister.session_key}'
+        # Simulate an error (e.g., access denied)
         self.mock_s3_object.get.side_effect = Exception("S3 error")
 
         vote_type = self.persister.get_vote_type(self.community_board)
@@ -104,20 +141,21 @@ class TestPersisterS3(unittest.TestCase):
 
     def test_set_vote_type_s3(self):
         vote_type_to_set = "ELECTION"
-        s3_key = f'/{self.community_board}/{self.persister.vote_type_key}'
+        s3_key = f'/{self.community_board}/{self.persister.session_key}'
+        session_document = self.mock_session_document(current_vote_name="Vote", currently_in_a_voting_session=True)
 
         self.persister.set_vote_type(vote_type_to_set, self.community_board)
 
+        # The rest of the session is preserved
+        session_document['vote_type'] = vote_type_to_set
         self.mock_s3_resource.return_value.Object.assert_called_with(self.persister.bucket_name, s3_key)
-        self.mock_s3_object.put.assert_called_once_with(Body=json.dumps(vote_type_to_set))
+        self.mock_s3_object.put.assert_called_once_with(Body=json.dumps(session_document))
 
     def test_get_election_candidates_s3(self):
         expected_candidates = ["CandidateA", "CandidateB"]
-        s3_key = f'/{self.community_board}/{self.persister.election_candidates_key}'
+        s3_key = f'/{self.community_board}/{self.persister.session_key}'
 
-        self.mock_s3_object.get.return_value = {
-            'Body': MagicMock(read=MagicMock(return_value=json.dumps(expected_candidates).encode('utf-8')))
-        }
+        self.mock_session_document(vote_type="ELECTION", election_candidates=expected_candidates)
 
         candidates = self.persister.get_election_candidates(self.community_board)
 
@@ -125,7 +163,7 @@ class TestPersisterS3(unittest.TestCase):
         self.assertEqual(candidates, expected_candidates)
 
     def test_get_election_candidates_s3_default_empty(self):
-        s3_key = f'/{self.community_board}/{self.persister.election_candidates_key}'
+        s3_key = f'/{self.community_board}/{self.persister.session_key}'
         self.mock_s3_object.get.side_effect = Exception("S3 error")
 
         candidates = self.persister.get_election_candidates(self.community_board)
@@ -135,12 +173,14 @@ class TestPersisterS3(unittest.TestCase):
 
     def test_set_election_candidates_s3(self):
         candidates_to_set = ["CandidateX", "CandidateY"]
-        s3_key = f'/{self.community_board}/{self.persister.election_candidates_key}'
+        s3_key = f'/{self.community_board}/{self.persister.session_key}'
+        session_document = self.mock_session_document(vote_type="ELECTION")
 
         self.persister.set_election_candidates(candidates_to_set, self.community_board)
 
+        session_document['election_candidates'] = candidates_to_set
         self.mock_s3_resource.return_value.Object.assert_called_with(self.persister.bucket_name, s3_key)
-        self.mock_s3_object.put.assert_called_once_with(Body=json.dumps(candidates_to_set))
+        self.mock_s3_object.put.assert_called_once_with(Body=json.dumps(session_document))
 
     def test_get_vote_log_s3_election_type(self):
         # Mock get_vote_type to return "ELECTION"
@@ -162,11 +202,13 @@ class TestPersisterS3(unittest.TestCase):
                 {'Key': f'{self.persister.vote_log_folder}/{self.community_board}/0987654321'},
             ]
         }
-        # Simulate S3 get_object responses
-        self.mock_s3_client_instance.get_object.side_effect = [
-            {'Body': MagicMock(read=MagicMock(return_value=json.dumps(mock_vote_data_candidate_a).encode('utf-8')))},
-            {'Body': MagicMock(read=MagicMock(return_value=json.dumps(mock_vote_data_candidate_b).encode('utf-8')))},
-        ]
+        # Simulate S3 get_object responses, keyed by object since the log is fetched concurrently
+        vote_data_by_key = {
+            f'{self.persister.vote_log_folder}/{self.community_board}/1234567890': mock_vote_data_candidate_a,
+            f'{self.persister.vote_log_folder}/{self.community_board}/0987654321': mock_vote_data_candidate_b,
+        }
+        self.mock_s3_client_instance.get_object.side_effect = lambda Bucket, Key: \
+            {'Body': MagicMock(read=MagicMock(return_value=json.dumps(vote_data_by_key[Key]).encode('utf-8')))}
 
         vote_log = self.persister.get_vote_log(self.community_board)
 
@@ -211,6 +253,866 @@ class TestPersisterS3(unittest.TestCase):
 
         self.persister.get_vote_type.assert_called_with(self.community_board)
 
+    def test_get_vote_log_s3_resolves_vote_type_once(self):
+        fake_s3 = FakeS3()
+        self.persister.s3 = fake_s3
+        self.persister.s3_resource = fake_s3
+        fake_s3.objects[f'/{self.community_board}/{self.persister.session_key}'] = json.dumps(SessionState().toJSON()).encode('utf-8')
+        for i in range(50):
+            sms_number = f'+1555000{i:04d}'
+            vote = {'voter': f'Voter {i}', 'votes_vote': 'Yes' if i % 2 else 'No'}
+            fake_s3.objects[f'{self.persister.vote_log_folder}/{self.community_board}/{sms_number}'] = json.dumps(vote).encode('utf-8')
+
+        vote_log = self.persister.get_vote_log(self.community_board)
+
+        self.assertEqual(len(vote_log), 50)
+        self.assertEqual(vote_log['+15550000001'].voters_vote.value, 'Yes')
+        self.assertEqual(vote_log['+15550000002'].voter.name, 'Voter 2')
+        # One listing, one session lookup and one GET per voter
+        self.assertEqual(fake_s3.calls['list_objects_v2'], 1)
+        self.assertEqual(fake_s3.calls['get_object'], 51)
+
+    def test_get_vote_log_s3_empty(self):
+        fake_s3 = FakeS3()
+        self.persister.s3 = fake_s3
+        self.persister.s3_resource = fake_s3
+
+        self.assertEqual(self.persister.get_vote_log(self.community_board), {})
+        self.assertEqual(fake_s3.round_trips, 1)
+
+
+class TestPersisterS3Listing(unittest.TestCase):
+    def setUp(self):
+        self.community_board = "test_s3_listing"
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = PersisterS3()
+        self.fake_s3 = FakeS3()
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+
+    def seed_vote_log(self, count):
+        for i in range(count):
+            key = f'{self.persister.vote_log_folder}/{self.community_board}/+1555{i:07d}'
+            self.fake_s3.objects[key] = json.dumps({'voter': f'Voter {i}', 'votes_vote': 'Yes'}).encode('utf-8')
+
+    def test_list_objects_follows_continuation_tokens(self):
+        for i in range(2100):
+            self.fake_s3.objects[f'summaryvotelog/{self.community_board}/2024_05_01_vote{i:05d}_summary.txt'] = b'summary'
+        self.fake_s3.objects[f'summaryvotelog/{self.community_board}/2024_05_02_other_summary.txt'] = b'summary'
+
+        keys = self.persister.list_objects(prefix=f'summaryvotelog/{self.community_board}/2024_05_01')
+
+        self.assertEqual(len(keys), 2100)
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(self.fake_s3.calls['list_objects_v2'], 3)
+
+    def test_iter_objects_is_lazy(self):
+        for i in range(2500):
+            self.fake_s3.objects[f'rawvotelog/{self.community_board}/{i:05d}.txt'] = b'line'
+
+        keys = self.persister.iter_objects(f'rawvotelog/{self.community_board}/')
+        first_page = [next(keys) for _ in range(1000)]
+
+        self.assertEqual(len(first_page), 1000)
+        self.assertEqual(self.fake_s3.calls['list_objects_v2'], 1)
+        self.assertEqual(len(list(keys)), 1500)
+        self.assertEqual(self.fake_s3.calls['list_objects_v2'], 3)
+
+    def test_get_vote_log_over_one_page(self):
+        self.fake_s3.objects[f'/{self.community_board}/{self.persister.session_key}'] = json.dumps(SessionState().toJSON()).encode('utf-8')
+        self.seed_vote_log(1500)
+
+        vote_log = self.persister.get_vote_log(self.community_board)
+
+        self.assertEqual(len(vote_log), 1500)
+        self.assertIn('+15550001499', vote_log)
+        self.assertEqual(self.fake_s3.calls['list_objects_v2'], 2)
+
+    def test_clear_vote_log_over_one_page(self):
+        self.seed_vote_log(2500)
+        self.fake_s3.objects[f'{self.persister.vote_log_folder}/other_board/+15550000000'] = b'{}'
+
+        self.persister.clear_vote_log(self.community_board)
+
+        remaining = [key for key in self.fake_s3.objects if key.startswith(f'{self.persister.vote_log_folder}/')]
+        self.assertEqual(remaining, [f'{self.persister.vote_log_folder}/other_board/+15550000000'])
+        self.assertEqual(self.fake_s3.calls['delete_objects'], 3)
+
+
+    def test_iter_object_contents_keeps_key_order_with_bounded_concurrency(self):
+        for i in range(60):
+            self.fake_s3.objects[f'summaryvotelog/{self.community_board}/2024_05_01_vote{i:03d}_summary.txt'] = f'summary {i}'.encode('utf-8')
+        in_flight = {'now': 0, 'max': 0}
+        lock = threading.Lock()
+
+        def latency(operation, key):
+            if operation != 'get_object':
+                return 0
+            with lock:
+                in_flight['now'] += 1
+                in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            # Earlier keys take longer, so completion order is the reverse of key order
+            time.sleep(0.002 * (60 - int(key[-15:-12])) / 10)
+            with lock:
+                in_flight['now'] -= 1
+            return 0
+        self.fake_s3.latency = latency
+        self.persister.object_fetch_max_workers = 4
+
+        contents = [content for key, content in self.persister.iter_object_contents(f'summaryvotelog/{self.community_board}/2024_05_01')]
+
+        self.assertEqual(contents, [f'summary {i}' for i in range(60)])
+        self.assertLessEqual(in_flight['max'], 4)
+        self.assertGreater(in_flight['max'], 1)
+
+class TestPersisterS3SessionState(unittest.TestCase):
+    def setUp(self):
+        self.community_board = "test_s3_session"
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = PersisterS3()
+        self.fake_s3 = FakeS3()
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+
+    def test_session_state_round_trip_is_one_put_and_one_get(self):
+        session = SessionState(current_vote_name="Budget", currently_in_a_voting_session=True,
+                               vote_type="ELECTION", election_candidates=["Alice", "Bob"])
+
+        self.persister.set_session_state(session, self.community_board)
+        self.assertEqual(self.fake_s3.calls['put_object'], 1)
+
+        self.fake_s3.reset_calls()
+        loaded = self.persister.get_session_state(self.community_board)
+
+        self.assertEqual(self.fake_s3.round_trips, 1)
+        self.assertEqual(loaded.toJSON(), session.toJSON())
+        self.assertEqual(loaded.toJSON()['version'], SessionState.VERSION)
+
+    def test_getters_are_served_from_the_session_document(self):
+        self.persister.set_session_state(SessionState(current_vote_name="Budget", currently_in_a_voting_session=True),
+                                         self.community_board)
+
+        self.assertEqual(self.persister.get_current_vote_name(self.community_board), "Budget")
+        self.assertTrue(self.persister.get_currently_in_a_voting_session(self.community_board))
+        self.assertNotIn(f'/{self.community_board}/{self.persister.current_vote_name_key}', self.fake_s3.objects)
+
+    def test_migrates_legacy_keys(self):
+        legacy_values = {
+            self.persister.current_vote_name_key: "Old Vote",
+            self.persister.currently_in_a_voting_session_key: True,
+            self.persister.vote_type_key: "ELECTION",
+            self.persister.election_candidates_key: ["Alice", "Bob"],
+        }
+        for key, value in legacy_values.items():
+            self.fake_s3.objects[f'/{self.community_board}/{key}'] = json.dumps(value).encode('utf-8')
+
+        session = self.persister.get_session_state(self.community_board)
+
+        self.assertEqual(session.current_vote_name, "Old Vote")
+        self.assertTrue(session.currently_in_a_voting_session)
+        self.assertEqual(session.vote_type, "ELECTION")
+        self.assertEqual(session.election_candidates, ["Alice", "Bob"])
+        self.assertIn(f'/{self.community_board}/{self.persister.session_key}', self.fake_s3.objects)
+
+        # Once migrated, the session is a single GET
+        self.fake_s3.reset_calls()
+        self.assertEqual(self.persister.get_session_state(self.community_board).current_vote_name, "Old Vote")
+        self.assertEqual(self.fake_s3.round_trips, 1)
+
+    def test_board_without_any_state_gets_defaults(self):
+        session = self.persister.get_session_state(self.community_board)
+
+        self.assertEqual(session.current_vote_name, '')
+        self.assertFalse(session.currently_in_a_voting_session)
+        self.assertEqual(session.vote_type, "RESOLUTION")
+        self.assertEqual(session.election_candidates, [])
+
+
+class TestPersisterS3MembersCache(unittest.TestCase):
+    def setUp(self):
+        self.community_board = "test_s3_members"
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = PersisterS3()
+        self.fake_s3 = FakeS3()
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+        self.members_key = f'/{self.community_board}/{self.persister.members_key}'
+        self.persister.set_members({'+15550000001': Voter('Alice', '+15550000001')}, self.community_board)
+        # Start cold, as a fresh container would
+        PersisterS3.clear_members_cache()
+        self.fake_s3.reset_calls()
+
+    def tearDown(self):
+        PersisterS3.clear_members_cache()
+
+    def test_warm_reads_are_served_from_cache(self):
+        first = self.persister.get_members(self.community_board)
+        second = self.persister.get_members(self.community_board)
+
+        self.assertEqual(first['+15550000001'].name, 'Alice')
+        self.assertEqual(second['+15550000001'].name, 'Alice')
+        self.assertEqual(self.fake_s3.calls['get_object'], 1)
+        self.assertEqual(PersisterS3.get_members_cache_stats(),
+                         {'hits': 1, 'misses': 1, 'revalidations': 0, 'not_modified': 0})
+
+    def test_cache_survives_new_persister_instances(self):
+        self.persister.get_members(self.community_board)
+        with patch('boto3.resource'), patch('boto3.client'):
+            other_persister = PersisterS3()
+        other_persister.s3 = self.fake_s3
+
+        self.assertEqual(other_persister.get_members(self.community_board)['+15550000001'].name, 'Alice')
+        self.assertEqual(self.fake_s3.calls['get_object'], 1)
+
+    def test_expired_entry_is_revalidated_with_etag(self):
+        self.persister.members_cache_ttl = 0
+        self.persister.get_members(self.community_board)
+
+        members = self.persister.get_members(self.community_board)
+
+        self.assertEqual(members['+15550000001'].name, 'Alice')
+        self.assertEqual(self.fake_s3.calls['get_object'], 2)
+        stats = PersisterS3.get_members_cache_stats()
+        self.assertEqual(stats['revalidations'], 1)
+        self.assertEqual(stats['not_modified'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_expired_entry_picks_up_changes_made_elsewhere(self):
+        self.persister.members_cache_ttl = 0
+        self.persister.get_members(self.community_board)
+        # Another Lambda container updates the roster
+        self.fake_s3.objects[self.members_key] = json.dumps(
+            {'+15550000002': {'name': 'Bob', 'sms_number': '+15550000002'}}).encode('utf-8')
+
+        members = self.persister.get_members(self.community_board)
+
+        self.assertEqual(list(members), ['+15550000002'])
+        self.assertEqual(PersisterS3.get_members_cache_stats()['not_modified'], 0)
+
+    def test_set_members_invalidates_immediately(self):
+        self.persister.get_members(self.community_board)
+
+        self.persister.set_members({'+15550000002': Voter('Bob', '+15550000002')}, self.community_board)
+
+        self.assertEqual(list(self.persister.get_members(self.community_board)), ['+15550000002'])
+
+    def test_set_members_caches_the_written_roster(self):
+        self.persister.set_members({'+15550000002': Voter('Bob', '+15550000002')}, self.community_board)
+
+        self.assertEqual(list(self.persister.get_members(self.community_board)), ['+15550000002'])
+        self.assertEqual(self.fake_s3.calls['get_object'], 0)
+        self.assertEqual(self.persister.get_members_version(self.community_board, {}),
+                         self.fake_s3.head_object(Bucket=self.persister.bucket_name, Key=self.members_key)['ETag'])
+
+    def test_download_started_before_set_members_does_not_replace_it(self):
+        get_object = self.fake_s3.get_object
+
+        def roster_changes_during_download(**kwargs):
+            response = get_object(**kwargs)
+            self.persister.set_members({'+15550000002': Voter('Bob', '+15550000002')}, self.community_board)
+            return response
+
+        with patch.object(self.fake_s3, 'get_object', side_effect=roster_changes_during_download):
+            self.assertEqual(list(self.persister.get_members(self.community_board)), ['+15550000001'])
+
+        self.assertEqual(list(self.persister.get_members(self.community_board)), ['+15550000002'])
+
+    def test_failed_revalidation_serves_the_cached_roster(self):
+        self.persister.members_cache_ttl = 0
+        self.persister.get_members(self.community_board)
+
+        with patch.object(self.fake_s3, 'get_object', side_effect=self.fake_s3._error('SlowDown', 'GetObject', 503)):
+            members = self.persister.get_members(self.community_board)
+
+        self.assertEqual(list(members), ['+15550000001'])
+
+    def test_callers_cannot_modify_cached_roster(self):
+        self.persister.get_members(self.community_board).clear()
+
+        self.assertEqual(len(self.persister.get_members(self.community_board)), 1)
+
+
+class TestPersisterS3Tally(unittest.TestCase):
+    # Votes are built from the classes PersisterClass itself imports so they serialize the same way
+    def setUp(self):
+        self.community_board = "test_s3_tally"
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = PersisterS3()
+        self.fake_s3 = FakeS3()
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+        self.persister.set_session_state(SessionState(current_vote_name="Budget", currently_in_a_voting_session=True), self.community_board)
+
+    def vote(self, number, option):
+        self.persister.add_to_vote_log(number, persister_module.Vote(persister_module.Voter(f'Voter {number}', number), option), self.community_board)
+
+    def test_add_to_vote_log_updates_tally(self):
+        self.vote('+1', persister_module.VoteOptions.YES)
+        self.vote('+2', persister_module.VoteOptions.YES)
+        self.vote('+1', persister_module.VoteOptions.NO)
+
+        tally = self.persister.get_tally(self.community_board)
+
+        self.assertEqual(tally.get_count("Yes"), 1)
+        self.assertEqual(tally.get_count("No"), 1)
+        self.assertEqual(tally.get_voters("No"), [{'voter': 'Voter +1', 'votes_vote': 'No'}])
+        self.assertEqual(tally.version, 3)
+
+    def test_concurrent_votes_are_all_counted(self):
+        # Slow S3 so the read-modify-write of the tally overlaps between threads
+        self.fake_s3.latency = 0.002
+        self.persister.tally_update_attempts = 100
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: self.vote(f'+{i}', persister_module.VoteOptions.YES), range(40)))
+
+        self.assertEqual(self.persister.get_tally(self.community_board).get_count("Yes"), 40)
+        self.assertTrue(self.persister.check_tally(self.community_board))
+
+    def test_check_tally_rebuilds_from_the_vote_log(self):
+        self.vote('+1', persister_module.VoteOptions.YES)
+        self.vote('+2', persister_module.VoteOptions.ABSTAIN)
+        # Lose the second update, as if the Lambda died between the two writes
+        self.persister.set_tally(persister_module.Tally.fromVoteLog({'+1': persister_module.Vote(persister_module.Voter('Voter +1', '+1'), persister_module.VoteOptions.YES)}, version=1), self.community_board)
+
+        self.assertFalse(self.persister.check_tally(self.community_board))
+        tally = self.persister.get_tally(self.community_board)
+        self.assertEqual(tally.get_count("Abstain"), 1)
+        self.assertEqual(tally.version, 2)
+        self.assertTrue(self.persister.check_tally(self.community_board))
+
+    def test_missing_tally_is_built_from_the_vote_log(self):
+        self.vote('+1', persister_module.VoteOptions.CAUSE)
+        del self.fake_s3.objects[f'/{self.community_board}/{self.persister.tally_key}']
+
+        self.assertEqual(self.persister.get_tally(self.community_board).get_count("Ineligible for Cause"), 1)
+        self.assertIn(f'/{self.community_board}/{self.persister.tally_key}', self.fake_s3.objects)
+
+    def test_first_tally_write_counts_the_existing_vote_log(self):
+        for i, option in enumerate(['Yes', 'Yes', 'Abstain', 'No']):
+            self.fake_s3.objects[f'{self.persister.vote_log_folder}/{self.community_board}/+{i}'] = json.dumps(
+                {'voter': f'Voter +{i}', 'votes_vote': option}).encode('utf-8')
+
+        self.vote('+3', persister_module.VoteOptions.YES)
+
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {'Yes': 3, 'Abstain': 1})
+        self.assertTrue(self.persister.check_tally(self.community_board))
+
+    def test_clear_vote_log_resets_tally(self):
+        self.vote('+1', persister_module.VoteOptions.YES)
+
+        self.persister.clear_vote_log(self.community_board)
+
+        self.fake_s3.reset_calls()
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {})
+        self.assertEqual(self.fake_s3.calls['list_objects_v2'], 0)
+
+
+    def test_tally_puts_are_accepted_by_the_s3_client(self):
+        client, stubber = stubbed_client()
+        self.persister.s3 = client
+        tally_key = f'/{self.community_board}/{self.persister.tally_key}'
+        body = json.dumps(persister_module.Tally().toJSON()).encode('utf-8')
+        stubber.add_client_error('get_object', 'NoSuchKey', http_status_code=404)
+        stubber.add_response('list_objects_v2', {'KeyCount': 0, 'IsTruncated': False})
+        stubber.add_response('put_object', {}, {'Bucket': self.persister.bucket_name, 'Key': tally_key,
+                                                'Body': unittest.mock.ANY, 'IfNoneMatch': '*'})
+        stubber.add_response('get_object', {'Body': StreamingBody(io.BytesIO(body), len(body)), 'ETag': '"1"'})
+        stubber.add_response('put_object', {}, {'Bucket': self.persister.bucket_name, 'Key': tally_key,
+                                                'Body': unittest.mock.ANY, 'IfMatch': '"1"'})
+
+        with stubber:
+            self.persister.update_tally(persister_module.Vote(persister_module.Voter('Voter +1', '+1'), persister_module.VoteOptions.YES), self.community_board)
+            self.persister.update_tally(persister_module.Vote(persister_module.Voter('Voter +1', '+1'), persister_module.VoteOptions.YES), self.community_board)
+        stubber.assert_no_pending_responses()
+
+    def tally_puts_fail_with(self, error):
+        put_object = self.fake_s3.put_object
+
+        def tally_put_fails(**kwargs):
+            if kwargs['Key'].endswith(self.persister.tally_key):
+                raise error
+            return put_object(**kwargs)
+        return patch.object(self.fake_s3, 'put_object', side_effect=tally_put_fails)
+
+    def test_tally_is_dropped_when_it_cannot_be_updated(self):
+        self.vote('+1', persister_module.VoteOptions.YES)
+        for error in (self.fake_s3._error('PreconditionFailed', 'PutObject', 412),
+                      self.fake_s3._error('InternalError', 'PutObject', 500),
+                      ParamValidationError(report='Unknown parameter "IfMatch"')):
+            with self.tally_puts_fail_with(error):
+                self.vote('+2', persister_module.VoteOptions.NO)
+            self.assertNotIn(f'/{self.community_board}/{self.persister.tally_key}', self.fake_s3.objects)
+            # Rebuilt from the log on the next read
+            self.assertEqual(self.persister.get_tally(self.community_board).counts, {'Yes': 1, 'No': 1})
+
+    def test_rejected_tally_put_is_raised(self):
+        with patch.object(self.fake_s3, 'put_object', side_effect=ParamValidationError(report='Unknown parameter "IfNoneMatch"')):
+            with self.assertRaises(ParamValidationError):
+                self.persister.update_tally(persister_module.Vote(persister_module.Voter('Voter +1', '+1'), persister_module.VoteOptions.YES), self.community_board)
+
+
+class TestPersisterS3HedgedReads(unittest.TestCase):
+    def setUp(self):
+        self.community_board = "test_s3_hedging"
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = PersisterS3()
+        self.persister.hedge_reads = True
+        self.persister.hedge_after = 0.05
+        # Only the first GET of each key is a straggler
+        self.slow_keys = set()
+        def latency(operation, key):
+            if operation == 'get_object' and key in self.slow_keys:
+                self.slow_keys.discard(key)
+                return 1.0
+            return 0
+        self.fake_s3 = FakeS3(latency=latency)
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+        self.session_key = f'/{self.community_board}/{self.persister.session_key}'
+        self.persister.set_session_state(SessionState(current_vote_name='Budget', currently_in_a_voting_session=True), self.community_board)
+        PersisterS3.clear_hedge_stats()
+        self.fake_s3.reset_calls()
+
+    def tearDown(self):
+        PersisterS3.clear_hedge_stats()
+
+    def test_slow_read_is_hedged(self):
+        self.slow_keys.add(self.session_key)
+
+        start = time.monotonic()
+        session = self.persister.get_session_state(self.community_board)
+
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(session.current_vote_name, 'Budget')
+        self.assertEqual(self.fake_s3.key_calls[('get_object', self.session_key)], 2)
+        self.assertEqual(PersisterS3.get_hedge_stats(), {'reads': 1, 'hedges_issued': 1, 'hedges_won': 1})
+
+    def test_quick_read_is_not_hedged(self):
+        self.assertEqual(self.persister.get_session_state(self.community_board).current_vote_name, 'Budget')
+
+        self.assertEqual(self.fake_s3.key_calls[('get_object', self.session_key)], 1)
+        self.assertEqual(PersisterS3.get_hedge_stats(), {'reads': 1, 'hedges_issued': 0, 'hedges_won': 0})
+
+    def test_errors_are_not_hedged_into_answers(self):
+        # A missing tally is answered straight away, and still rebuilt from the (empty) log
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {})
+        self.assertEqual(PersisterS3.get_hedge_stats()['hedges_issued'], 0)
+
+    def test_hedge_delay_follows_recent_latencies(self):
+        PersisterS3.read_latencies.extend([0.01] * 95 + [0.5] * 5)
+        self.persister.hedge_percentile = 90
+        self.assertEqual(self.persister.get_hedge_delay(), 0.01)
+        self.persister.hedge_percentile = 99
+        self.assertEqual(self.persister.get_hedge_delay(), 0.5)
+
+    def test_off_by_default(self):
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.assertFalse(PersisterS3().hedge_reads)
+        self.persister.hedge_reads = False
+        self.slow_keys.add(self.session_key)
+
+        self.persister.get_session_state(self.community_board)
+
+        self.assertEqual(self.fake_s3.key_calls[('get_object', self.session_key)], 1)
+        self.assertEqual(PersisterS3.get_hedge_stats()['reads'], 0)
+
+
+class TestPersisterSQLite(unittest.TestCase):
+    # Votes are built from the classes PersisterClass itself imports so they serialize the same way
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.persister = persister_module.PersisterSQLite(db_path=os.path.join(self.temp_dir.name, 'test.db'))
+        self.community_board = "test_sqlite_board"
+
+    def tearDown(self):
+        self.persister.close()
+        self.temp_dir.cleanup()
+
+    def vote(self, number, option, community_board=None):
+        vote = persister_module.Vote(persister_module.Voter(f'Voter {number}', number), option)
+        self.persister.add_to_vote_log(number, vote, community_board or self.community_board)
+
+    def test_uses_wal_mode(self):
+        journal_mode = self.persister.connection().execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(journal_mode, 'wal')
+
+    def test_session_state_and_getters(self):
+        self.assertEqual(self.persister.get_vote_type(self.community_board), "RESOLUTION")
+
+        self.persister.set_session_state(SessionState(current_vote_name="Chair", currently_in_a_voting_session=True,
+                                                      vote_type="ELECTION", election_candidates=["Alice", "Bob"]),
+                                         self.community_board)
+        self.persister.set_current_vote_name("Vice Chair", self.community_board)
+
+        session = self.persister.get_session_state(self.community_board)
+        self.assertEqual(session.current_vote_name, "Vice Chair")
+        self.assertTrue(self.persister.get_currently_in_a_voting_session(self.community_board))
+        self.assertEqual(self.persister.get_election_candidates(self.community_board), ["Alice", "Bob"])
+
+    def test_members_round_trip(self):
+        self.persister.set_members({'+1': persister_module.Voter('Alice', '+1'), '+2': persister_module.Voter('Bob', '+2')},
+                                   self.community_board)
+        self.persister.set_members({'+3': persister_module.Voter('Carol', '+3')}, self.community_board)
+
+        members = self.persister.get_members(self.community_board)
+        self.assertEqual(list(members), ['+3'])
+        self.assertEqual(members['+3'].name, 'Carol')
+
+    def test_vote_log_and_tally(self):
+        self.vote('+1', persister_module.VoteOptions.YES)
+        self.vote('+2', persister_module.VoteOptions.NO)
+        self.vote('+1', persister_module.VoteOptions.ABSTAIN)
+
+        vote_log = self.persister.get_vote_log(self.community_board)
+        self.assertEqual(vote_log['+1'].voters_vote, persister_module.VoteOptions.ABSTAIN)
+        tally = self.persister.get_tally(self.community_board)
+        self.assertEqual(tally.counts, {"No": 1, "Abstain": 1})
+        self.assertTrue(self.persister.check_tally(self.community_board))
+
+        self.persister.clear_vote_log(self.community_board)
+        self.assertEqual(self.persister.get_vote_log(self.community_board), {})
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {})
+
+    def test_election_votes_stay_strings(self):
+        self.persister.set_vote_type("ELECTION", self.community_board)
+        self.vote('+1', "CandidateX")
+
+        self.assertEqual(self.persister.get_vote_log(self.community_board)['+1'].voters_vote, "CandidateX")
+
+    def test_boards_are_isolated(self):
+        self.vote('+1', persister_module.VoteOptions.YES, community_board="board_a")
+        self.persister.set_current_vote_name("A vote", "board_a")
+
+        self.assertEqual(self.persister.get_vote_log("board_b"), {})
+        self.assertEqual(self.persister.get_current_vote_name("board_b"), '')
+
+    def test_concurrent_votes_from_many_threads(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: self.vote(f'+{i}', persister_module.VoteOptions.YES, f'board_{i % 4}'), range(200)))
+
+        for board in range(4):
+            self.assertEqual(self.persister.get_tally(f'board_{board}').get_count("Yes"), 50)
+            self.assertEqual(len(self.persister.get_vote_log(f'board_{board}')), 50)
+
+    def test_summary_logs_list_and_get(self):
+        logger = SQLiteVoteLoggingClass(self.persister)
+        logger.log_vote_summary_to_file("Budget", "summary one", self.community_board)
+        logger.log_vote_summary_to_file("Parks", "summary two", self.community_board)
+        logger.log_vote_summary_to_file("Budget", "other board", "another_board")
+
+        keys = self.persister.list_objects(prefix=f'summaryvotelog/{self.community_board}/{logger.get_day_for_timestamp()}')
+
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(sorted(self.persister.get_object(key) for key in keys), ["summary one", "summary two"])
+        self.assertIsNone(self.persister.get_object('summaryvotelog/missing'))
+
+    def test_raw_log_lines_are_appended(self):
+        logger = SQLiteVoteLoggingClass(self.persister)
+        logger.log_raw_vote_to_file('+1', 'yes', 'Budget', self.community_board)
+        logger.log_raw_vote_to_file('+2', 'no', 'Budget', self.community_board)
+
+        (key,) = self.persister.list_objects(prefix=f'rawvotelog/{self.community_board}/')
+        self.assertEqual(self.persister.get_object(key).count('\n'), 2)
+
+
+class TestPersisterInMemory(unittest.TestCase):
+    def setUp(self):
+        self.persister = persister_module.PersisterInMemory()
+        self.community_board = "test_memory_board"
+
+    def vote(self, number, option, community_board=None):
+        vote = persister_module.Vote(persister_module.Voter(f'Voter {number}', number), option)
+        self.persister.add_to_vote_log(number, vote, community_board or self.community_board)
+
+    def test_session_state_and_getters(self):
+        self.assertEqual(self.persister.get_vote_type(self.community_board), "RESOLUTION")
+
+        self.persister.set_session_state(SessionState(current_vote_name="Chair", currently_in_a_voting_session=True,
+                                                      vote_type="ELECTION", election_candidates=["Alice", "Bob"]),
+                                         self.community_board)
+        self.persister.set_current_vote_name("Vice Chair", self.community_board)
+
+        session = self.persister.get_session_state(self.community_board)
+        self.assertEqual(session.current_vote_name, "Vice Chair")
+        self.assertTrue(self.persister.get_currently_in_a_voting_session(self.community_board))
+        # Changing what was handed out does not change what is stored
+        session.election_candidates.append("Carol")
+        self.assertEqual(self.persister.get_election_candidates(self.community_board), ["Alice", "Bob"])
+
+    def test_boards_are_isolated(self):
+        self.vote('+1', persister_module.VoteOptions.YES, community_board="board_a")
+        self.persister.set_current_vote_name("A vote", "board_a")
+        self.persister.set_members({'+1': persister_module.Voter('Alice', '+1')}, "board_a")
+        self.persister.clear_vote_log("board_b")
+
+        self.assertEqual(self.persister.get_vote_log("board_b"), {})
+        self.assertEqual(self.persister.get_current_vote_name("board_b"), '')
+        self.assertEqual(self.persister.get_members("board_b"), {})
+        self.assertEqual(self.persister.get_tally("board_a").get_count("Yes"), 1)
+        self.assertEqual(sorted(self.persister.get_boards()), ["board_a", "board_b"])
+
+    def test_vote_log_and_tally(self):
+        self.vote('+1', persister_module.VoteOptions.YES)
+        self.vote('+2', persister_module.VoteOptions.NO)
+        self.vote('+1', persister_module.VoteOptions.ABSTAIN)
+
+        self.assertEqual(self.persister.get_vote_log(self.community_board)['+1'].voters_vote, persister_module.VoteOptions.ABSTAIN)
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {"No": 1, "Abstain": 1})
+        self.assertTrue(self.persister.check_tally(self.community_board))
+
+        self.persister.clear_vote_log(self.community_board)
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {})
+
+    def test_a_busy_board_does_not_hold_up_others(self):
+        # One shard, so the two boards share it and only their own locks keep them apart
+        self.persister = persister_module.PersisterInMemory(shards=1)
+        holding = threading.Event()
+        release = threading.Event()
+
+        def hold_board():
+            with self.persister.transaction("busy_board"):
+                holding.set()
+                release.wait(5)
+
+        holder = threading.Thread(target=hold_board)
+        holder.start()
+        try:
+            holding.wait(5)
+            start = time.monotonic()
+            self.vote('+1', persister_module.VoteOptions.YES, community_board="quiet_board")
+            self.assertEqual(self.persister.get_tally("quiet_board").get_count("Yes"), 1)
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            release.set()
+            holder.join()
+
+    def test_stress_many_boards_from_many_threads(self):
+        boards = [f'board_{board}' for board in range(12)]
+        options = [persister_module.VoteOptions.YES, persister_module.VoteOptions.NO, persister_module.VoteOptions.ABSTAIN]
+        voters_per_board = 150
+        changes_per_voter = 5
+        stop = threading.Event()
+        torn_reads = []
+
+        def voter(i):
+            # Each voter changes their vote a few times; the last one is option i % 3
+            board = boards[i % len(boards)]
+            for change in range(changes_per_voter):
+                self.vote(f'+{i}', options[(i + change - changes_per_voter + 1) % len(options)], board)
+
+        def reader():
+            # Whatever a reader catches has to be a consistent tally
+            while not stop.is_set():
+                for board in boards:
+                    tally = self.persister.get_tally(board)
+                    if sum(tally.counts.values()) != len(tally.voters):
+                        torn_reads.append(board)
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        try:
+            with ThreadPoolExecutor(max_workers=32) as executor:
+                list(executor.map(voter, range(len(boards) * voters_per_board)))
+        finally:
+            stop.set()
+            for thread in readers:
+                thread.join()
+
+        self.assertEqual(torn_reads, [])
+        for board_index, board in enumerate(boards):
+            numbers = [i for i in range(len(boards) * voters_per_board) if i % len(boards) == board_index]
+            expected = {}
+            for i in numbers:
+                expected[options[i % len(options)].value] = expected.get(options[i % len(options)].value, 0) + 1
+            tally = self.persister.get_tally(board)
+            self.assertEqual(tally.counts, expected)
+            self.assertEqual(tally.version, voters_per_board * changes_per_voter)
+            self.assertEqual(len(self.persister.get_vote_log(board)), voters_per_board)
+            self.assertTrue(self.persister.check_tally(board))
+
+    def test_summary_logs_are_exported(self):
+        from app import main
+        logger = SQLiteVoteLoggingClass(self.persister)
+        logger.log_vote_summary_to_file("Budget", "summary one", self.community_board)
+        logger.log_vote_summary_to_file("Parks", "summary two", self.community_board)
+        logger.log_raw_vote_to_file('+1', 'yes', 'Budget', self.community_board)
+        logger.log_raw_vote_to_file('+2', 'no', 'Budget', self.community_board)
+        day = logger.get_day_for_timestamp().replace('_', '-')
+
+        with patch('app.main.persister', new=self.persister):
+            self.assertEqual(main.api_export_votes(day, self.community_board), "summary one\nsummary two")
+            self.assertEqual(main.api_export_votes('2001-01-01', self.community_board)['statusCode'], 404)
+        (raw_key,) = self.persister.list_objects(prefix=f'rawvotelog/{self.community_board}/')
+        self.assertEqual(self.persister.get_object(raw_key).count('\n'), 2)
+
+
+class TestPersisterSharedMemory(unittest.TestCase):
+    # Each worker process attaches by name, votes for its own members and changes its mind once
+    WORKER_SCRIPT = '''
+import sys
+from PersisterClass import PersisterSharedMemory, Vote, Voter, VoteOptions
+name, lock_path, first, last = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+persister = PersisterSharedMemory(name=name, boards=4, max_members=200, lock_path=lock_path)
+for i in range(first, last):
+    for option in (VoteOptions.NO, VoteOptions.YES if i % 2 else VoteOptions.ABSTAIN):
+        persister.add_to_vote_log(f'+{i}', Vote(Voter(f'Voter {i}', f'+{i}'), option), f'board_{i % 3}')
+persister.close()
+'''
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.name = f'cb_test_{os.getpid()}_{id(self)}'
+        self.lock_path = os.path.join(self.temp_dir.name, 'shm.lock')
+        self.persister = self.attach()
+        self.community_board = "test_shm_board"
+        self.members = {f'+{i}': persister_module.Voter(f'Voter {i}', f'+{i}') for i in range(120)}
+        self.persister.set_members(self.members, self.community_board)
+
+    def tearDown(self):
+        self.persister.unlink()
+        self.persister.close()
+        self.temp_dir.cleanup()
+
+    def attach(self, **layout):
+        layout = dict(dict(boards=4, max_members=200), **layout)
+        return persister_module.PersisterSharedMemory(name=self.name, lock_path=self.lock_path, **layout)
+
+    def vote(self, number, option, community_board=None, persister=None):
+        vote = persister_module.Vote(self.members[number], option)
+        (persister or self.persister).add_to_vote_log(number, vote, community_board or self.community_board)
+
+    def test_state_is_shared_between_attachments(self):
+        other = self.attach()
+        try:
+            self.persister.set_session_state(SessionState(current_vote_name="Chair", currently_in_a_voting_session=True,
+                                                          vote_type="ELECTION", election_candidates=["Alice", "Bob"]),
+                                             self.community_board)
+            self.vote('+1', "Bob", persister=other)
+            self.vote('+2', "Alice")
+
+            self.assertEqual(other.get_current_vote_name(self.community_board), "Chair")
+            self.assertEqual(other.get_members(self.community_board)['+5'].name, 'Voter 5')
+            self.assertEqual(self.persister.get_vote_log(self.community_board)['+1'].voters_vote, "Bob")
+            self.assertEqual(other.get_tally(self.community_board).counts, {"Bob": 1, "Alice": 1})
+            self.assertEqual(self.persister.get_counts(self.community_board), {"Bob": 1, "Alice": 1})
+        finally:
+            other.close()
+
+    def test_vote_log_and_tally(self):
+        self.vote('+1', persister_module.VoteOptions.YES)
+        self.vote('+2', persister_module.VoteOptions.NO)
+        self.vote('+1', persister_module.VoteOptions.ABSTAIN)
+
+        self.assertEqual(self.persister.get_vote_log(self.community_board)['+1'].voters_vote, persister_module.VoteOptions.ABSTAIN)
+        tally = self.persister.get_tally(self.community_board)
+        self.assertEqual(tally.counts, {"No": 1, "Abstain": 1})
+        self.assertEqual([vote['voter'] for vote in tally.get_votes_since(1)], ['Voter 2', 'Voter 1'])
+        self.assertTrue(self.persister.check_tally(self.community_board))
+
+        self.persister.clear_vote_log(self.community_board)
+        self.assertEqual(self.persister.get_vote_log(self.community_board), {})
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {})
+        self.assertEqual(self.persister.get_tally(self.community_board).version, 4)
+
+    def test_votes_follow_members_when_the_list_changes(self):
+        self.vote('+1', persister_module.VoteOptions.YES)
+        self.vote('+2', persister_module.VoteOptions.NO)
+        self.persister.set_members({'+2': self.members['+2'], '+9': self.members['+9']}, self.community_board)
+
+        self.assertEqual(self.persister.get_tally(self.community_board).voters, {'+2': "No"})
+        self.assertEqual(self.persister.get_counts(self.community_board), {"No": 1})
+
+    def test_only_members_can_vote(self):
+        with self.assertRaises(KeyError):
+            self.persister.add_to_vote_log('+999', persister_module.Vote(persister_module.Voter('Stranger', '+999'),
+                                                                         persister_module.VoteOptions.YES), self.community_board)
+
+    def test_boards_are_isolated(self):
+        self.persister.set_members(self.members, "board_b")
+        self.vote('+1', persister_module.VoteOptions.YES)
+        self.persister.set_current_vote_name("A vote", self.community_board)
+
+        self.assertEqual(self.persister.get_vote_log("board_b"), {})
+        self.assertEqual(self.persister.get_current_vote_name("board_b"), '')
+
+    def election(self, candidates):
+        self.persister.set_session_state(SessionState(current_vote_name="Chair", currently_in_a_voting_session=True,
+                                                      vote_type="ELECTION", election_candidates=candidates),
+                                         self.community_board)
+
+    def test_stopping_an_election_leaves_nothing_to_misread(self):
+        from app import main
+        self.election(["A", "B", "C"])
+        self.vote('+1', "C")
+        other = self.attach()
+        try:
+            # What other workers see between api_stop_voting's two writes
+            self.persister.set_session_state(SessionState(), self.community_board)
+            self.assertEqual(other.get_tally(self.community_board).counts, {})
+            self.assertEqual(other.get_vote_log(self.community_board), {})
+            with patch('app.main.persister', new=other):
+                self.assertEqual(main.api_get_results(self.community_board)['statusCode'], 200)
+        finally:
+            other.close()
+
+    def test_new_candidates_do_not_inherit_votes(self):
+        self.election(["A", "B", "C"])
+        self.vote('+1', "C")
+        self.vote('+2', "A")
+        version = self.persister.get_tally(self.community_board).version
+
+        self.election(["X", "Y", "Z"])
+
+        self.assertEqual(self.persister.get_tally(self.community_board).counts, {})
+        self.assertEqual(self.persister.get_counts(self.community_board), {})
+        self.assertGreater(self.persister.get_tally(self.community_board).version, version)
+        # Renaming the vote keeps the votes
+        self.vote('+1', "Z")
+        self.persister.set_current_vote_name("Vice Chair", self.community_board)
+        self.assertEqual(self.persister.get_tally(self.community_board).voters, {'+1': "Z"})
+
+    def test_codes_without_a_candidate_are_skipped(self):
+        self.election(["A", "B", "C"])
+        self.vote('+1', "C")
+        slot = self.persister.board_slot(self.community_board)
+        self.persister.codes(slot)[2] = self.persister.CANDIDATE_CODE_BASE + 50
+
+        self.assertEqual(self.persister.get_tally(self.community_board).voters, {'+1': "C"})
+        self.assertEqual(list(self.persister.get_vote_log(self.community_board)), ['+1'])
+
+    def test_export_says_it_is_not_supported(self):
+        from app import main
+        import flask_app
+        with patch('app.main.persister', new=self.persister):
+            response = main.api_export_votes('2024-05-01', self.community_board)
+        with patch('main.persister', new=self.persister), patch.dict('os.environ', {'API_KEY': 'test_key'}):
+            flask_response = flask_app.app.test_client().post('/exportvotes', json={'date': '2024-05-01'},
+                                                              headers={'x-api-key': 'test_key', 'x-community-board': self.community_board})
+
+        self.assertEqual(response['statusCode'], 501)
+        self.assertEqual(flask_response.status_code, 501)
+
+    def test_a_different_layout_is_refused(self):
+        with self.assertRaises(ValueError):
+            self.attach(max_members=50)
+
+    def test_concurrent_votes_from_many_processes(self):
+        for board in range(3):
+            self.persister.set_members({number: voter for number, voter in self.members.items() if int(number[1:]) % 3 == board},
+                                       f'board_{board}')
+        workers = [subprocess.Popen([sys.executable, '-c', self.WORKER_SCRIPT, self.name, self.lock_path, str(first), str(first + 30)],
+                                    cwd=APP_DIR) for first in range(0, 120, 30)]
+        self.assertEqual([worker.wait(timeout=60) for worker in workers], [0] * len(workers))
+
+        for board in range(3):
+            tally = self.persister.get_tally(f'board_{board}')
+            numbers = [i for i in range(120) if i % 3 == board]
+            self.assertEqual(tally.counts, {"Yes": sum(i % 2 for i in numbers), "Abstain": sum(1 - i % 2 for i in numbers)})
+            self.assertEqual(tally.version, 2 * len(numbers))
+            self.assertEqual(self.persister.get_counts(f'board_{board}'), tally.counts)
+            self.assertTrue(self.persister.check_tally(f'board_{board}'))
+
 
 if __name__ == '__main__':
     unittest.main()
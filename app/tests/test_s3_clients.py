@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import ANY, patch
+from app.S3ClientsClass import S3Clients
+
+
+class SlowS3Handler(BaseHTTPRequestHandler):
+    # Answers every GetObject with a small body after a delay, like a distant S3
+    protocol_version = 'HTTP/1.1'
+    delay = 0.05
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        body = b'yes'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"etag"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestS3Clients(unittest.TestCase):
+    def setUp(self):
+        S3Clients.reset()
+
+    def tearDown(self):
+        S3Clients.reset()
+
+    def test_one_client_is_shared(self):
+        with patch('boto3.client') as mock_client, patch('boto3.resource') as mock_resource:
+            client = S3Clients.client()
+            self.assertIs(S3Clients.client(), client)
+            resource = S3Clients.resource()
+            self.assertIs(S3Clients.resource(), resource)
+        mock_client.assert_called_once_with('s3', config=ANY, endpoint_url=None)
+        mock_resource.assert_called_once_with('s3', config=ANY, endpoint_url=None)
+        # The resource sends its requests through the shared client
+        self.assertIs(resource.meta.client, client)
+
+    def test_config_defaults(self):
+        with patch.dict(os.environ, {}, clear=True):
+            config = S3Clients.config()
+        self.assertEqual(config.max_pool_connections, 50)
+        self.assertEqual(config.connect_timeout, 2.0)
+        self.assertEqual(config.read_timeout, 5.0)
+        self.assertEqual(config.retries, {'mode': 'adaptive', 'max_attempts': 3})
+        self.assertTrue(config.tcp_keepalive)
+
+    def test_config_from_environment(self):
+        environment = {
+            'S3_MAX_POOL_CONNECTIONS': '8',
+            'S3_CONNECT_TIMEOUT': '0.5',
+            'S3_READ_TIMEOUT': '1',
+            'S3_RETRY_MODE': 'standard',
+            'S3_MAX_ATTEMPTS': '5',
+            'S3_TCP_KEEPALIVE': '0',
+        }
+        with patch.dict(os.environ, environment, clear=True):
+            config = S3Clients.config()
+        self.assertEqual(config.max_pool_connections, 8)
+        self.assertEqual(config.connect_timeout, 0.5)
+        self.assertEqual(config.read_timeout, 1.0)
+        self.assertEqual(config.retries, {'mode': 'standard', 'max_attempts': 5})
+        self.assertFalse(config.tcp_keepalive)
+
+    def test_counts_requests_that_wait_for_the_pool(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SlowS3Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        environment = {
+            'S3_ENDPOINT_URL': f'http://127.0.0.1:{server.server_port}',
+            'S3_MAX_POOL_CONNECTIONS': '2',
+            'AWS_ACCESS_KEY_ID': 'test',
+            'AWS_SECRET_ACCESS_KEY': 'test',
+            'AWS_DEFAULT_REGION': 'us-east-1',
+        }
+        try:
+            with patch.dict(os.environ, environment):
+                client = S3Clients.client()
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    bodies = list(executor.map(
+                        lambda i: client.get_object(Bucket='cb-dashboard-data-store', Key=f'key{i}')['Body'].read(),
+                        range(8)))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(bodies, [b'yes'] * 8)
+        stats = S3Clients.get_stats()
+        self.assertEqual(stats['requests'], 8)
+        self.assertEqual(stats['in_flight'], 0)
+        self.assertEqual(stats['max_pool_connections'], 2)
+        self.assertGreater(stats['in_flight_peak'], 2)
+        self.assertGreater(stats['pool_waits'], 0)
+        self.assertGreater(stats['pool_discards'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
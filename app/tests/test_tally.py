@@ -0,0 +1,86 @@
+import unittest
+from app.TallyClass import Tally
+from app.VoteClass import Vote
+from app.VoterClass import Voter
+from app.VoteOptionsEnum import VoteOptions
+
+class TestTallyClass(unittest.TestCase):
+
+    def setUp(self):
+        self.alice = Voter(name="Alice", sms_number="+1")
+        self.bob = Voter(name="Bob", sms_number="+2")
+
+    def test_record_vote_counts_and_voters(self):
+        tally = Tally()
+        tally.record_vote(Vote(self.alice, VoteOptions.YES))
+        tally.record_vote(Vote(self.bob, VoteOptions.YES))
+
+        self.assertEqual(tally.get_count("Yes"), 2)
+        self.assertEqual(tally.get_count("No"), 0)
+        self.assertEqual(tally.get_voters("Yes"), [{'voter': 'Alice', 'votes_vote': 'Yes'},
+                                                   {'voter': 'Bob', 'votes_vote': 'Yes'}])
+        self.assertTrue(tally.has_voted("+1"))
+        self.assertEqual(tally.version, 2)
+
+    def test_changed_vote_moves_voter(self):
+        tally = Tally()
+        tally.record_vote(Vote(self.alice, VoteOptions.YES))
+
+        previous_option = tally.record_vote(Vote(self.alice, VoteOptions.NO))
+
+        self.assertEqual(previous_option, "Yes")
+        self.assertEqual(tally.get_count("Yes"), 0)
+        self.assertEqual(tally.get_voters("Yes"), [])
+        self.assertEqual(tally.get_count("No"), 1)
+
+    def test_candidate_votes(self):
+        tally = Tally()
+        tally.record_vote(Vote(self.alice, "Dana"))
+
+        self.assertEqual(tally.get_voters("Dana"), [{'voter': 'Alice', 'votes_vote': 'Dana'}])
+
+    def test_json_round_trip(self):
+        tally = Tally()
+        tally.record_vote(Vote(self.alice, VoteOptions.YES))
+        tally.record_vote(Vote(self.bob, VoteOptions.CAUSE))
+
+        loaded = Tally.fromJSON(tally.toJSON())
+
+        self.assertEqual(loaded.counts, tally.counts)
+        self.assertEqual(loaded.get_voters("Ineligible for Cause"), tally.get_voters("Ineligible for Cause"))
+        self.assertEqual(loaded.version, tally.version)
+
+    def test_from_vote_log(self):
+        vote_log = {"+1": Vote(self.alice, VoteOptions.YES), "+2": Vote(self.bob, VoteOptions.NO)}
+
+        tally = Tally.fromVoteLog(vote_log, version=7)
+
+        self.assertEqual(tally.counts, {"Yes": 1, "No": 1})
+        self.assertEqual(tally.version, 7)
+        # Nothing is known about the order, so it all counts as new from version 7
+        self.assertEqual(tally.first_version, 7)
+        self.assertEqual(tally.sequences, {"+1": 7, "+2": 7})
+
+    def test_votes_since(self):
+        tally = Tally(version=10)
+        tally.record_vote(Vote(self.alice, VoteOptions.YES))
+        tally.record_vote(Vote(self.bob, VoteOptions.NO))
+        tally.record_vote(Vote(self.alice, VoteOptions.ABSTAIN))
+
+        self.assertEqual(tally.first_version, 10)
+        self.assertEqual(tally.get_votes_since(11), [{'voter': 'Bob', 'votes_vote': 'No', 'sequence': 12},
+                                                     {'voter': 'Alice', 'votes_vote': 'Abstain', 'sequence': 13}])
+        self.assertEqual(tally.get_votes_since(13), [])
+
+        loaded = Tally.fromJSON(tally.toJSON())
+        self.assertEqual(loaded.get_votes_since(11), tally.get_votes_since(11))
+        self.assertEqual(loaded.first_version, 10)
+        self.assertTrue(loaded.has_sequences())
+
+    def test_tally_saved_before_sequences(self):
+        loaded = Tally.fromJSON({'version': 3, 'voters': {'+1': 'Yes'}, 'names': {'+1': 'Alice'}})
+
+        self.assertFalse(loaded.has_sequences())
+
+if __name__ == '__main__':
+    unittest.main()
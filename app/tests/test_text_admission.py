@@ -0,0 +1,188 @@
+import base64
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from urllib.parse import urlencode
+import io
+import json
+from botocore.response import StreamingBody
+from fake_s3 import FakeS3, stubbed_client
+
+# lambda_app imports the app modules by their top-level names, so use the same ones here
+import lambda_app
+from MessageDedupeClass import MessageDedupe
+from TextAdmissionClass import RateLimits, TextAdmission
+
+
+def lambda_context(remaining_ms):
+    context = MagicMock()
+    context.get_remaining_time_in_millis.return_value = remaining_ms
+    return context
+
+
+class TestTextAdmission(unittest.TestCase):
+    def answer(self, admission, rate_limits, reply='reply', number='+1'):
+        return admission.answer('cb', number, rate_limits, lambda: reply, 'dropped', 'busy')
+
+    def test_token_bucket(self):
+        admission = TextAdmission(burst=3, rate_per_minute=60, coalesce_window=0)
+        state = {}
+        self.assertEqual([admission.take_token(state, 100.0)[0] for _ in range(4)], [True, True, True, False])
+        # A token a second
+        self.assertFalse(admission.take_token(state, 100.5)[0])
+        self.assertTrue(admission.take_token(state, 101.0)[0])
+        self.assertFalse(admission.take_token(state, 101.0)[0])
+
+    def test_texts_beyond_the_bucket_are_dropped_per_number(self):
+        admission = TextAdmission(burst=2, rate_per_minute=1, coalesce_window=0)
+        rate_limits = RateLimits()
+        replies = [self.answer(admission, rate_limits) for _ in range(4)]
+
+        self.assertEqual(replies, ['reply', 'reply', 'dropped', 'dropped'])
+        self.assertEqual(self.answer(admission, rate_limits, number='+2'), 'reply')
+        self.assertEqual(admission.get_stats(), {'admitted': 3, 'rate_limited': 2})
+
+    def test_bursts_keep_the_first_and_latest_text(self):
+        admission = TextAdmission(burst=10, coalesce_window=0.2)
+        rate_limits = RateLimits()
+        answered = []
+        replies = {}
+
+        def text(i):
+            replies[i] = admission.answer('cb', '+1', rate_limits, lambda: answered.append(i) or f'reply {i}', 'dropped', 'busy')
+
+        threads = []
+        for i in range(5):
+            threads.append(threading.Thread(target=text, args=(i,)))
+            threads[-1].start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(answered), [0, 4])
+        self.assertEqual(replies, {0: 'reply 0', 1: 'dropped', 2: 'dropped', 3: 'dropped', 4: 'reply 4'})
+        self.assertEqual(admission.get_stats()['coalesced'], 3)
+
+    def test_concurrency_cap(self):
+        admission = TextAdmission(coalesce_window=0, max_concurrent=2, max_wait=0.05)
+        rate_limits = RateLimits()
+        release = threading.Event()
+        threads = [threading.Thread(target=admission.answer, args=('cb', f'+{i}', rate_limits, lambda: release.wait(5), None, None))
+                   for i in range(2)]
+        for thread in threads:
+            thread.start()
+        try:
+            time.sleep(0.05)
+            self.assertEqual(self.answer(admission, rate_limits, number='+3'), 'busy')
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(self.answer(admission, rate_limits, number='+3'), 'reply')
+
+    def test_rate_limits_evict_the_least_recently_used_number(self):
+        rate_limits = RateLimits(max_numbers=2)
+        for number in ('+1', '+2', '+1', '+3'):
+            rate_limits.update_rate_limit('cb', number, lambda state: state.setdefault('latest', 1))
+
+        self.assertEqual(list(rate_limits.states), [('cb', '+1'), ('cb', '+3')])
+
+    def test_unreachable_store_lets_texts_through(self):
+        rate_limits = MagicMock()
+        rate_limits.update_rate_limit.side_effect = Exception('S3 down')
+        admission = TextAdmission(coalesce_window=0)
+        self.assertEqual(self.answer(admission, rate_limits), 'reply')
+        self.assertEqual(admission.get_stats(), {'limiter_errors': 1, 'admitted': 1})
+
+
+class TestSharedRateLimits(unittest.TestCase):
+    def setUp(self):
+        self.fake_s3 = FakeS3()
+        with patch('boto3.resource'), patch('boto3.client'):
+            self.persister = lambda_app.PersisterS3()
+            self.logger = lambda_app.S3VoteLoggingClass(buffered=False, max_batch_age=60)
+        self.persister.s3 = self.fake_s3
+        self.persister.s3_resource = self.fake_s3
+        self.logger.s3_resource = self.fake_s3
+        self.community_board = 'cb_admission'
+        self.persister.set_members({'+15550000001': lambda_app.Voter('Test User', '+15550000001')}, self.community_board)
+        self.persister.set_session_state(lambda_app.SessionState(current_vote_name='Budget', currently_in_a_voting_session=True),
+                                         self.community_board)
+        self.patchers = [patch('main.persister', new=self.persister),
+                         patch('main.votelogger', new=self.logger),
+                         patch('lambda_app.votelogger', new=self.logger),
+                         patch('main.message_dedupe', new=MessageDedupe()),
+                         patch('lambda_app.TWILIO_API_KEY', 'test_twilio_key'),
+                         patch('lambda_app.SHARED_RATE_LIMITS', True)]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def text_event(self, body, message_sid):
+        form = urlencode({'Body': body, 'From': '+15550000001', 'MessageSid': message_sid})
+        return {
+            'rawPath': '/default/incomingtext',
+            'rawQueryString': f'auth=test_twilio_key&cb={self.community_board}',
+            'requestContext': {'http': {'method': 'POST'}},
+            'headers': {},
+            'body': base64.b64encode(form.encode('utf-8')).decode('utf-8')
+        }
+
+    def test_lambdas_share_the_bucket(self):
+        # Each admission stands for a separate Lambda container
+        replies = [TextAdmission(burst=2, rate_per_minute=1, coalesce_window=0).answer(
+            self.community_board, '+15550000001', self.persister, lambda: 'reply', 'dropped', 'busy') for _ in range(3)]
+
+        self.assertEqual(replies, ['reply', 'reply', 'dropped'])
+
+    def test_rate_limit_puts_are_accepted_by_the_s3_client(self):
+        client, stubber = stubbed_client()
+        self.persister.s3 = client
+        key = f'ratelimit/{self.community_board}/+15550000001'
+        state = json.dumps({'tokens': 3}).encode('utf-8')
+        stubber.add_client_error('get_object', 'NoSuchKey', http_status_code=404)
+        stubber.add_response('put_object', {}, {'Bucket': self.persister.bucket_name, 'Key': key, 'Body': unittest.mock.ANY, 'IfNoneMatch': '*'})
+        stubber.add_response('get_object', {'Body': StreamingBody(io.BytesIO(state), len(state)), 'ETag': '"1"'})
+        stubber.add_response('put_object', {}, {'Bucket': self.persister.bucket_name, 'Key': key, 'Body': unittest.mock.ANY, 'IfMatch': '"1"'})
+
+        with stubber:
+            for _ in range(2):
+                self.persister.update_rate_limit(self.community_board, '+15550000001', lambda state: state.setdefault('latest', 1))
+        stubber.assert_no_pending_responses()
+
+    def test_lambda_keeps_the_buckets_in_process_by_default(self):
+        with patch('lambda_app.SHARED_RATE_LIMITS', False), patch('main.rate_limits', new=RateLimits()) as rate_limits:
+            lambda_app.lambda_handler(self.text_event('yes', 'SM1'), lambda_context(10000))
+
+        self.assertEqual(rate_limits.get_rate_limit(self.community_board, '+15550000001')['latest'], 1)
+        self.assertFalse([key for operation, key in self.fake_s3.key_calls if key and key.startswith('ratelimit/')])
+
+    def test_burst_through_the_handler_persists_the_latest_vote(self):
+        responses = {}
+
+        def send(i, body):
+            responses[i] = lambda_app.lambda_handler(self.text_event(body, f'SM{i}'), lambda_context(10000))['body']
+
+        with patch('main.text_admission', new=TextAdmission(burst=20, coalesce_window=0.3)):
+            threads = []
+            for i, body in enumerate(['yes', 'yes', 'abstain', 'yes', 'no']):
+                threads.append(threading.Thread(target=send, args=(i, body)))
+                threads[-1].start()
+                time.sleep(0.02)
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(self.persister.get_tally(self.community_board).voters, {'+15550000001': 'No'})
+        self.assertEqual(self.fake_s3.key_calls[('put_object', f'vote_log/{self.community_board}/+15550000001')], 2)
+        self.assertEqual(sum(count for (operation, key), count in self.fake_s3.key_calls.items()
+                             if operation == 'put_object' and key.startswith('rawvotelog/')), 2)
+        self.assertIn('you voted No', responses[4])
+        self.assertEqual([responses[i] for i in (1, 2, 3)], [lambda_app.Twiml.EMPTY_RESPONSE] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from twilio.twiml.messaging_response import MessagingResponse
+from app import main
+from app.TwimlClass import Twiml, TwimlTemplate
+
+TEXTS = [
+    'Not currently open for voting',
+    'a & b < c > d',
+    'Quotes "double" and \'single\' stay as they are',
+    'Already escaped &amp; &lt;tag&gt;',
+    'Ünïcödé, emoji 🗳️ and 中文',
+    'Line one\nline two\ttabbed',
+    ' leading and trailing spaces ',
+    '<Message>nested</Message>',
+    '{braces} and {{doubled}}',
+    '',
+]
+
+
+def twilio_reply(text):
+    r = MessagingResponse()
+    r.message(text)
+    return str(r)
+
+
+class TestTwiml(unittest.TestCase):
+    def test_matches_twilio_byte_for_byte(self):
+        twiml = Twiml()
+        for text in TEXTS:
+            self.assertEqual(twiml.message(text).encode('utf-8'), twilio_reply(text).encode('utf-8'), text)
+
+    def test_constant_replies_are_rendered_once(self):
+        twiml = Twiml(['Not currently open for voting'])
+        self.assertIs(twiml.message('Not currently open for voting'), twiml.message('Not currently open for voting'))
+        self.assertEqual(twiml.message('Not currently open for voting'), twilio_reply('Not currently open for voting'))
+
+    def test_templates_match_twilio(self):
+        template = TwimlTemplate('Your vote has been recorded, you voted for {vote} for election {name} & more')
+        for vote in TEXTS:
+            for name in ('Chair <2024>', 'Budget & Parks', ''):
+                expected = twilio_reply(f'Your vote has been recorded, you voted for {vote} for election {name} & more')
+                self.assertEqual(template.render(vote=vote, name=name), expected)
+
+    def test_every_main_reply_matches_twilio(self):
+        for text in (main.INSTRUCTIONS_MESSAGE, main.INVALID_INPUT_MESSAGE, main.NOT_VOTING_MESSAGE,
+                     main.NOT_CONFIRMED_MESSAGE, main.NOT_VALID_NUMBER_MESSAGE + ' +15550000001'):
+            self.assertEqual(main.create_response_msg(text), twilio_reply(text))
+        self.assertEqual(main.RESOLUTION_CONFIRMATION.render(vote='Ineligible for Cause', name='Budget "FY25"'),
+                         twilio_reply('Your vote has been recorded, you voted Ineligible for Cause for resolution Budget "FY25"'))
+        self.assertEqual(main.ELECTION_CONFIRMATION.render(vote='José Álvarez', name='Chair & Vice Chair'),
+                         twilio_reply('Your vote has been recorded, you voted for José Álvarez for election Chair & Vice Chair'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from app.VoteLoggingClass import S3VoteLoggingClass
+from fake_s3 import FakeS3
+
+
+class TestS3VoteLoggingClass(unittest.TestCase):
+
+    def make_logger(self, **kwargs):
+        with patch('boto3.resource'):
+            logger = S3VoteLoggingClass(**kwargs)
+        logger.s3_resource = self.fake_s3
+        return logger
+
+    def setUp(self):
+        self.fake_s3 = FakeS3()
+
+    def raw_records(self):
+        records = []
+        for key, body in sorted(self.fake_s3.objects.items()):
+            self.assertTrue(key.startswith('rawvotelog/'))
+            records.extend(json.loads(line) for line in body.decode('utf-8').splitlines())
+        return records
+
+    def wait_for(self, condition, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_unbuffered_puts_each_message(self):
+        logger = self.make_logger(buffered=False)
+        logger.log_raw_vote_to_file('+1', 'yes', 'Budget', '7')
+        logger.log_raw_vote_to_file('+2', 'no', 'Budget', '7')
+
+        self.assertEqual(self.fake_s3.calls['put_object'], 2)
+
+    def test_buffered_writes_nothing_until_flushed(self):
+        logger = self.make_logger(buffered=True, max_batch_lines=1000, max_batch_age=60)
+        logger.log_raw_vote_to_file('+1', 'yes', 'Budget', '7')
+        logger.log_raw_vote_to_file('+2', 'no', 'Budget', '7')
+        logger.log_raw_vote_to_file('+3', 'yes', 'Parks', '8')
+
+        self.assertEqual(self.fake_s3.calls['put_object'], 0)
+
+        logger.flush()
+
+        # One NDJSON object per board
+        self.assertEqual(self.fake_s3.calls['put_object'], 2)
+        self.assertTrue(all(key.endswith('.ndjson') for key in self.fake_s3.objects))
+        records = self.raw_records()
+        self.assertEqual(sorted(record['incoming_number'] for record in records), ['+1', '+2', '+3'])
+        self.assertEqual(records[0]['current_vote_name'], 'Budget')
+
+    def test_worker_flushes_full_batches(self):
+        logger = self.make_logger(buffered=True, max_batch_lines=5, max_batch_age=60)
+        for i in range(5):
+            logger.log_raw_vote_to_file(f'+{i}', 'yes', 'Budget', '7')
+
+        self.assertTrue(self.wait_for(lambda: self.fake_s3.calls['put_object'] == 1))
+        self.assertEqual(len(self.raw_records()), 5)
+
+    def test_worker_flushes_old_lines(self):
+        logger = self.make_logger(buffered=True, max_batch_lines=1000, max_batch_age=0.05)
+        logger.log_raw_vote_to_file('+1', 'yes', 'Budget', '7')
+
+        self.assertTrue(self.wait_for(lambda: self.fake_s3.calls['put_object'] == 1))
+
+    def test_flush_loses_nothing_under_concurrent_logging(self):
+        self.fake_s3.latency = 0.001
+        logger = self.make_logger(buffered=True, max_batch_lines=7, max_batch_age=0.01)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: logger.log_raw_vote_to_file(f'+{i}', 'yes', 'Budget', str(i % 3)), range(300)))
+
+        logger.flush()
+
+        self.assertEqual(sorted(int(record['incoming_number'][1:]) for record in self.raw_records()), list(range(300)))
+
+    def test_lambda_handler_flushes_before_returning(self):
+        import lambda_app
+        logger = self.make_logger(buffered=True, max_batch_lines=1000, max_batch_age=60)
+
+        def route_request(event, context):
+            logger.log_raw_vote_to_file('+1', 'yes', 'Budget', '7')
+            raise RuntimeError('handler failed')
+
+        with patch('lambda_app.votelogger', new=logger), patch('lambda_app.route_request', side_effect=route_request):
+            with self.assertRaises(RuntimeError):
+                lambda_app.lambda_handler({}, None)
+
+        self.assertEqual(len(self.raw_records()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from app import main
+from app.SessionStateClass import SessionState
+
+# main imports the app modules by their top-level names, so compare against the same ones
+VoteParser = main.VoteParser
+VoteOptions = main.VoteOptions
+
+
+class TestVoteParserResolution(unittest.TestCase):
+    def setUp(self):
+        self.parser = VoteParser("RESOLUTION")
+
+    def test_whole_words_only(self):
+        self.assertEqual(self.parser.get_vote("yes"), VoteOptions.YES)
+        self.assertEqual(self.parser.get_vote("I vote YES!"), VoteOptions.YES)
+        self.assertEqual(self.parser.get_vote("No."), VoteOptions.NO)
+        self.assertEqual(self.parser.get_vote("  abstain  "), VoteOptions.ABSTAIN)
+        self.assertEqual(self.parser.get_vote("Cause"), VoteOptions.CAUSE)
+        self.assertIsNone(self.parser.get_vote("I know"))
+        self.assertIsNone(self.parser.get_vote("not sure"))
+        self.assertIsNone(self.parser.get_vote("yess"))
+        self.assertIsNone(self.parser.get_vote(""))
+
+    def test_nope_is_not_a_no(self):
+        self.assertEqual(self.parser.get_vote("nope, yes"), VoteOptions.YES)
+
+    def test_repeated_option_is_not_ambiguous(self):
+        self.assertEqual(self.parser.parse("yes yes YES"), [VoteOptions.YES])
+
+    def test_two_options_are_ambiguous(self):
+        self.assertEqual(self.parser.parse("yes no"), [VoteOptions.YES, VoteOptions.NO])
+        self.assertIsNone(self.parser.get_vote("yes no"))
+
+    def test_cause_wins_over_the_other_options(self):
+        for message in ("abstain for cause", "Abstain - cause", "no cause", "I abstain for cause"):
+            self.assertEqual(self.parser.parse(message), [VoteOptions.CAUSE])
+            self.assertEqual(self.parser.get_vote(message), VoteOptions.CAUSE)
+
+
+class TestVoteParserElection(unittest.TestCase):
+    candidates = ["Alice Smith", "Bob Johnson", "Charlie Brown", "José Álvarez", "Alice Smithers"]
+
+    def test_exact_name_ignoring_case_spacing_punctuation_and_accents(self):
+        parser = VoteParser("ELECTION", self.candidates)
+        self.assertEqual(parser.get_vote("alice smith"), "Alice Smith")
+        self.assertEqual(parser.get_vote("  ALICE   SMITH. "), "Alice Smith")
+        self.assertEqual(parser.get_vote("Bob-Johnson!"), "Bob Johnson")
+        self.assertEqual(parser.get_vote("jose alvarez"), "José Álvarez")
+        self.assertIsNone(parser.get_vote("Alice"))
+        self.assertIsNone(parser.get_vote("Alice Smth"))
+
+    def test_unique_prefix(self):
+        parser = VoteParser("ELECTION", self.candidates, prefix_matching=True)
+        self.assertEqual(parser.get_vote("bob"), "Bob Johnson")
+        self.assertEqual(parser.get_vote("Charlie"), "Charlie Brown")
+        # Whole words only
+        self.assertIsNone(parser.get_vote("bo"))
+        # Two candidates start with Alice
+        self.assertEqual(parser.parse("alice"), ["Alice Smith", "Alice Smithers"])
+        self.assertIsNone(parser.get_vote("alice"))
+
+    def test_small_edit_distance(self):
+        parser = VoteParser("ELECTION", self.candidates, max_edit_distance=1)
+        self.assertEqual(parser.get_vote("Charlie Brwon"), "Charlie Brown")
+        self.assertEqual(parser.get_vote("Bob Jonson"), "Bob Johnson")
+        self.assertIsNone(parser.get_vote("Bob Jnsn"))
+        # An exact match always beats a near one
+        self.assertEqual(parser.get_vote("Alice Smith"), "Alice Smith")
+
+    def test_nearest_ties_are_ambiguous(self):
+        parser = VoteParser("ELECTION", ["Ann Lee", "Ann Lea"], max_edit_distance=1)
+        self.assertEqual(parser.parse("Ann Leo"), ["Ann Lea", "Ann Lee"])
+        self.assertIsNone(parser.get_vote("Ann Leo"))
+
+    def test_candidates_with_the_same_normalized_name_are_ambiguous(self):
+        parser = VoteParser("ELECTION", ["Pat Kim", "pat kim."])
+        self.assertEqual(parser.parse("PAT KIM"), ["Pat Kim", "pat kim."])
+
+    def test_edit_distance(self):
+        self.assertEqual(VoteParser.edit_distance("kitten", "sitting", 5), 3)
+        self.assertEqual(VoteParser.edit_distance("brwon", "brown", 2), 1)
+        self.assertEqual(VoteParser.edit_distance("kitten", "sitting", 1), 2)
+
+
+class TestVoteParserSessions(unittest.TestCase):
+    def test_compiled_once_per_session(self):
+        first = VoteParser.for_session("ELECTION", ["Alice Smith", "Bob Johnson"])
+        self.assertIs(VoteParser.for_session("ELECTION", ["Alice Smith", "Bob Johnson"]), first)
+        self.assertIsNot(VoteParser.for_session("ELECTION", ["Alice Smith"]), first)
+
+    def test_parse_incoming_text_reports_ambiguous_votes(self):
+        persister = MagicMock()
+        persister.get_session_state.return_value = SessionState(current_vote_name="Budget", currently_in_a_voting_session=True)
+        persister.get_members.return_value = {"+1": main.Voter("Test User", "+1")}
+        with patch('app.main.persister', new=persister), patch('app.main.votelogger', new=MagicMock()):
+            response = main.parse_incoming_text("+1", "yes no", "cb_parser")
+
+        self.assertIn(main.AMBIGUOUS_VOTE_MESSAGE + "Yes, No", response)
+        persister.add_to_vote_log.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()